@@ -0,0 +1,411 @@
+"""Benchmark do pipeline com PDFs sintéticos no formato das listas da ANVISA
+
+Gera as listas A e B (incluídos e excluídos) em PDF, serve a página e os PDFs
+em um servidor HTTP local e mede cada etapa do scraper. O resultado sai em JSON
+para comparar versões:
+
+    python benchmark.py --pages 50 --output resultado.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import tempfile
+import threading
+import functools
+import http.server
+import importlib.util
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# O módulo principal tem hífen no nome e é carregado pelo caminho do arquivo
+MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webscraping-anvisa.py')
+spec = importlib.util.spec_from_file_location('webscraping_anvisa', MODULE_PATH)
+webscraping_anvisa = importlib.util.module_from_spec(spec)
+# Registrado em sys.modules para que os processos de extração encontrem o módulo
+sys.modules['webscraping_anvisa'] = webscraping_anvisa
+spec.loader.exec_module(webscraping_anvisa)
+
+
+# Cabeçalhos reais: 7 colunas para os incluídos e 8 para os excluídos
+INCLUDED_HEADER = ['FÁRMACO/\nASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO', 'CONCENTRAÇÃO',
+                   'FORMA\nFARMACÊUTICA', 'DATA\nINCLUSÃO']
+EXCLUDED_HEADER = ['FÁRMACO/\nASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO', 'CONCENTRAÇÃO',
+                   'FORMA\nFARMACÊUTICA', 'DATA DE\nEXCLUSÃO', 'MOTIVO DA\nEXCLUSÃO']
+
+DRUGS = ['paracetamol', 'dipirona sódica', 'amoxicilina +\nclavulanato de potássio', 'losartana potássica',
+         'cloridrato de metformina', 'hidroclorotiazida + losartana\npotássica', 'ibuprofeno', 'omeprazol']
+FORMS = ['COMPRIMIDO', 'COMPRIMIDO\nREVESTIDO', 'SOLUÇÃO ORAL', 'CÁPSULA DURA', 'SUSPENSÃO\nINJETÁVEL']
+DATES = ['12/11/2012', '12112012', '1/1/2023', '23/9/2014; 29/01/2016', '1.2.2023', '05.03.2019']
+REASONS = ['Cancelamento do\nregistro', 'Solicitação da\nempresa', 'Caducidade do registro']
+
+# Links como aparecem na página da ANVISA: (arquivo, texto do link, é excluído)
+LISTS = [
+    ('lista_a.pdf', 'Lista A', False),
+    ('lista_a_excluidos.pdf', 'Lista A - Medicamentos excluídos', True),
+    ('lista_b.pdf', 'Lista B', False),
+    ('lista_b_excluidos.pdf', 'Lista B - Medicamentos excluídos', True),
+]
+
+
+def pdf_text(text):
+    """Escapa o texto para um literal de string PDF"""
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def synthetic_rows(excluded, count, start, rnd):
+    """Linhas de dados aleatórias no formato da lista"""
+    rows = []
+    for number in range(start, start + count):
+        row = [rnd.choice(DRUGS), f'EMPRESA {rnd.randint(1, 40)} LTDA', f'MEDICAMENTO {number}',
+               f'1{number:08d}', f'{rnd.choice([5, 10, 20, 500])} mg', rnd.choice(FORMS), rnd.choice(DATES)]
+        if excluded:
+            row.append(rnd.choice(REASONS))
+        rows.append(row)
+    return rows
+
+
+def table_page(rows, width, x=20, y=805):
+    """Conteúdo de uma página com o título e a tabela (uma célula com borda por valor)"""
+    ops = ['BT /F1 9 Tf 20 815 Td (LISTA DE MEDICAMENTOS DE REFER\xcaNCIA) Tj ET']
+    for row in rows:
+        height = 8 + 8 * max(len(cell.split('\n')) for cell in row)
+        for column, cell in enumerate(row):
+            left = x + column * width
+            ops.append(f'{left:.2f} {y - height:.2f} {width:.2f} {height} re S')
+            for line_number, line in enumerate(cell.split('\n')):
+                ops.append(f'BT /F1 6 Tf {left + 2:.2f} {y - 9 - line_number * 8} Td ({pdf_text(line)}) Tj ET')
+        y -= height
+    return '\n'.join(ops).encode('cp1252')
+
+
+def make_pdf(path, excluded=False, pages=10, rows_per_page=25, seed=0, duplicate_header=False,
+             extra_pages=False):
+    """Gera um PDF com uma tabela por página e o cabeçalho repetido em todas as páginas
+    
+    O PDF é montado à mão (tabela com bordas e fonte Helvetica), sem depender de
+    bibliotecas de geração de PDF. Com duplicate_header o cabeçalho aparece duas
+    vezes na primeira página, como acontece em algumas versões da Lista B. Com
+    extra_pages o PDF ganha uma capa, uma página de notas com linha de assinatura
+    e uma página em branco, sem tabela.
+    """
+    rnd = random.Random(seed)
+    header = EXCLUDED_HEADER if excluded else INCLUDED_HEADER
+    width = 555 / len(header)
+
+    contents = []
+    for page in range(pages):
+        rows = [header] + synthetic_rows(excluded, rows_per_page, page * rows_per_page, rnd)
+        if duplicate_header and page == 0:
+            rows.insert(1, header)
+        contents.append(table_page(rows, width))
+    
+    if extra_pages:
+        contents.insert(0, b'BT /F1 16 Tf 60 600 Td (LISTA DE MEDICAMENTOS DE REFER\xcaNCIA) Tj ET\n'
+                           b'BT /F1 10 Tf 60 570 Td (Ger\xeancia-Geral de Medicamentos) Tj ET')
+        contents.append(b'BT /F1 9 Tf 20 815 Td (Notas: lista atualizada conforme RDC n\xba 35/2012.) Tj ET\n'
+                        b'20 100 m 200 100 l S\n'
+                        b'BT /F1 9 Tf 20 88 Td (Assinatura) Tj ET')
+        contents.append(b'')
+    write_pdf(path, contents)
+
+
+def write_pdf(path, contents):
+    """Grava um PDF com uma página A4 por conteúdo, todas com a fonte Helvetica em /F1"""
+    pages = len(contents)
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join(f'{4 + 2 * i} 0 R' for i in range(pages)), pages)).encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    for i, content in enumerate(contents):
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'.encode())
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+
+    data = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        data += b'%010d 00000 n \n' % offset
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class BenchmarkServer:
+    """Servidor HTTP local com a página das listas e os PDFs sintéticos"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        handler = functools.partial(QuietHandler, directory=directory)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def write_index(self):
+        """Grava a página principal com os links absolutos para os PDFs"""
+        links = ''.join(f'<li><a href="{self.base_url}/{filename}">{text}</a></li>'
+                        for filename, text, _ in LISTS)
+        with open(os.path.join(self.directory, 'index.html'), 'w', encoding='utf-8') as f:
+            f.write(f'<html><head><meta charset="utf-8"></head><body><ul>{links}</ul></body></html>')
+        return f'{self.base_url}/index.html'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def peak_rss_mb(who):
+    """Pico de memória residente em MB (None onde resource não existe)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss vem em bytes no macOS e em KB no Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_once(index_url, output_dir, workers, engine='extract_table'):
+    """Executa o pipeline uma vez, medindo o tempo de cada etapa"""
+    scraper = webscraping_anvisa.ANVISAReferenceDrugsScraper(index_url, extraction_workers=workers,
+                                                             extraction_engine=engine)
+    stages = dict.fromkeys(['fetch_page', 'extract_pdf_links', 'download_pdf', 'extract_table_from_pdf',
+                            'process_dataframe', 'combine_dataframes', 'write_csv'], 0.0)
+
+    def timed(stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        stages[stage] += time.perf_counter() - start
+        return result
+
+    html_content = timed('fetch_page', scraper.fetch_page, index_url)
+    pdf_links = timed('extract_pdf_links', scraper.extract_pdf_links, html_content)
+
+    pages = 0
+    rows = 0
+    dataframes = {}
+    for pdf_type, pdf_url in pdf_links.items():
+        pdf_content = timed('download_pdf', scraper.download_pdf, pdf_url)
+        with scraper.open_pdf(pdf_content) as pdf:
+            pages += len(pdf.pages)
+        pdf_content.seek(0)
+
+        source_list = scraper.find_list(pdf_type)
+        header_row, data = timed('extract_table_from_pdf', scraper.extract_table_from_pdf, pdf_content,
+                                 source_list.schema)
+        rows += len(data)
+
+        df = webscraping_anvisa.pd.DataFrame(data, columns=header_row)
+        dataframes[pdf_type] = timed('process_dataframe', scraper.process_dataframe, df, source_list)
+
+    for name, lista_a, lista_b, _ in scraper.combined_outputs:
+        combined = timed('combine_dataframes', scraper.combine_dataframes,
+                         dataframes[lista_a], dataframes[lista_b], scraper.find_list(lista_b).schema)
+        timed('write_csv', combined.to_csv, os.path.join(output_dir, f'{name}.csv'),
+              index=False, encoding='utf-8-sig')
+    for name, df in dataframes.items():
+        timed('write_csv', df.to_csv, os.path.join(output_dir, f'{name}.csv'), index=False, encoding='utf-8-sig')
+
+    skipped = sum(value for (name, _), value in scraper.metrics.counters.items() if name == 'pages_skipped')
+    return stages, pages, rows, skipped
+
+
+def run_benchmark(pages=20, rows_per_page=25, workers=1, repeat=3, seed=0, engine='extract_table',
+                  extra_pages=False):
+    """Gera os PDFs, sobe o servidor local e retorna o relatório (melhor tempo de cada etapa)"""
+    with tempfile.TemporaryDirectory(prefix='anvisa_bench_') as directory:
+        for number, (filename, _, excluded) in enumerate(LISTS):
+            make_pdf(os.path.join(directory, filename), excluded, pages, rows_per_page, seed + number,
+                     duplicate_header=filename.startswith('lista_b'), extra_pages=extra_pages)
+
+        output_dir = os.path.join(directory, 'saida')
+        os.makedirs(output_dir)
+        with BenchmarkServer(directory) as server:
+            index_url = server.write_index()
+            runs = [run_once(index_url, output_dir, workers, engine) for _ in range(repeat)]
+
+    stages = {stage: round(min(run[0][stage] for run in runs), 4) for stage in runs[0][0]}
+    _, total_pages, total_rows, skipped = runs[0]
+    total = sum(stages.values())
+    return {
+        'timestamp': webscraping_anvisa.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': {'pages_per_pdf': pages, 'rows_per_page': rows_per_page, 'workers': workers,
+                   'repeat': repeat, 'seed': seed, 'engine': engine, 'extra_pages': extra_pages},
+        'pages': total_pages,
+        'pages_skipped': skipped,
+        'rows': total_rows,
+        'stages_sec': stages,
+        'total_sec': round(total, 4),
+        'pages_per_sec': round(total_pages / stages['extract_table_from_pdf'], 1),
+        'rows_per_sec': round(total_rows / total, 1),
+        'peak_rss_mb': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_rss_children_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+
+# Nomes sintéticos de fármacos para o catálogo: sílabas + sufixo, com sal e associações
+SYLLABLES = ['ba', 'ce', 'di', 'fo', 'gu', 'la', 'me', 'ni', 'po', 'ru', 'sa', 'te', 'vi', 'xo', 'zu',
+             'tra', 'pre', 'clo', 'fen', 'mol']
+SUFFIXES = ['ina', 'ol', 'ona', 'ato', 'ano', 'ida', 'ema', 'ex']
+SALT_FORMS = [('cloridrato de {}', '{} cloridrato'), ('{} sódica', '{} sodica'), ('{} potássica', '{} potassica'),
+              ('maleato de {}', 'MALEATO {}'), ('{} monoidratada', '{}'), ('{}', '{}')]
+CATALOG_FORMS = {'COMPRIMIDO': 'COMP', 'COMPRIMIDO\nREVESTIDO': 'COMP REV', 'SOLUÇÃO ORAL': 'SOL OR',
+                 'CÁPSULA DURA': 'CAPS DURA', 'SUSPENSÃO\nINJETÁVEL': 'SUSP INJ'}
+
+
+def synthetic_reference(count, rnd):
+    """Registros de referência com fármacos, sais, associações, concentrações e formas variados"""
+    names = sorted({''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 3))) + rnd.choice(SUFFIXES)
+                    for _ in range(count // 3)})
+    rows = []
+    for number in range(count):
+        components = rnd.sample(range(len(SALT_FORMS)), rnd.choice([1, 1, 1, 2]))
+        drugs = [(rnd.choice(names), salt) for salt in components]
+        strengths = [rnd.choice([5, 10, 20, 25, 50, 100, 250, 500]) for _ in drugs]
+        rows.append({'FÁRMACO': ' + '.join(SALT_FORMS[salt][0].format(name) for name, salt in drugs),
+                     'DETENTOR': f'EMPRESA {rnd.randint(1, 40)} LTDA', 'MEDICAMENTO': f'MEDICAMENTO {number}',
+                     'REGISTRO': f'1{number:08d}', 'CONCENTRAÇÃO': ' + '.join(f'{value} mg' for value in strengths),
+                     'FORMA FARMACÊUTICA': rnd.choice(list(CATALOG_FORMS)), 'DATA INCLUSÃO': '01.01.2020',
+                     '_drugs': drugs, '_strengths': strengths})
+    return rows
+
+
+def catalog_item(row, rnd):
+    """Item de catálogo escrito como nos cadastros: maiúsculas, sem acento, sal depois do nome, ordem trocada"""
+    parts = list(zip(row['_drugs'], row['_strengths']))
+    rnd.shuffle(parts)
+    farmaco = rnd.choice([' + ', '/', '+']).join(SALT_FORMS[salt][1].format(name).upper() for (name, salt), _ in parts)
+    concentracao = '+'.join(rnd.choice([f'{value}MG', f'{value} mg', f'{value / 1000:g} g']) for _, value in parts)
+    forma = row['FORMA FARMACÊUTICA']
+    return {'FÁRMACO': farmaco, 'CONCENTRAÇÃO': concentracao,
+            'FORMA FARMACÊUTICA': rnd.choice([forma.replace('\n', ' '), CATALOG_FORMS[forma]])}
+
+
+def run_matching_benchmark(skus=300000, references=5000, workers=1, seed=0, distinct=0.2):
+    """Associa um catálogo sintético às listas e mede o tempo, a taxa de acerto e os falsos positivos
+    
+    distinct é a fração de itens distintos do catálogo (os demais repetem itens já vistos); 10%
+    dos itens distintos são fármacos que não existem nas listas.
+    """
+    pd = webscraping_anvisa.pd
+    rnd = random.Random(seed)
+    reference = synthetic_reference(references, rnd)
+    frame = pd.DataFrame([{key: value for key, value in row.items() if not key.startswith('_')} for row in reference])
+    
+    # Itens distintos: variações dos registros (com a linha de origem) e fármacos inexistentes (None)
+    items = []
+    for _ in range(max(1, int(skus * distinct))):
+        if rnd.random() < 0.1:
+            items.append((None, {'FÁRMACO': f'INEXISTENTE {rnd.randint(1, 10 ** 6)}', 'CONCENTRAÇÃO': '10MG',
+                                 'FORMA FARMACÊUTICA': 'COMP'}))
+        else:
+            row = rnd.choice(reference)
+            items.append((row, catalog_item(row, rnd)))
+    sample = [rnd.choice(items) for _ in range(skus)]
+    catalog = pd.DataFrame([item for _, item in sample])
+    
+    start = time.perf_counter()
+    lookup = webscraping_anvisa.ReferenceLookup({'medicamentos_referencia_incluidos': frame})
+    matcher = webscraping_anvisa.CatalogMatcher(lookup)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    result = matcher.match_frame(catalog, workers=workers)
+    match_seconds = time.perf_counter() - start
+    
+    # Acerto: o registro associado tem o mesmo fármaco, concentração e forma canônicos da origem
+    def group_key(farmaco, concentracao, forma):
+        return (matcher.canonical_ingredients(farmaco)[0], matcher.parse_strengths(concentracao),
+                matcher.canonical_form(forma))
+    
+    correct = missed = false_positives = 0
+    for (row, _), found in zip(sample, result[['FÁRMACO REFERÊNCIA', 'CONCENTRAÇÃO REFERÊNCIA',
+                                               'FORMA FARMACÊUTICA REFERÊNCIA']].itertuples(index=False)):
+        if row is None:
+            false_positives += bool(found[0])
+        elif not found[0]:
+            missed += 1
+        elif group_key(*found) == group_key(row['FÁRMACO'], row['CONCENTRAÇÃO'], row['FORMA FARMACÊUTICA']):
+            correct += 1
+    
+    # Estimativa da comparação aninhada (difflib contra todos os registros) por uma amostra
+    import difflib
+    texts = [' '.join((row['FÁRMACO'], row['CONCENTRAÇÃO'], row['FORMA FARMACÊUTICA'])).lower() for row in reference]
+    probe = [' '.join(item.values()).lower() for _, item in items[:20]]
+    start = time.perf_counter()
+    for text in probe:
+        max(difflib.SequenceMatcher(None, text, other).ratio() for other in texts)
+    nested_seconds = (time.perf_counter() - start) / len(probe) * skus
+    
+    return {
+        'timestamp': webscraping_anvisa.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': {'skus': skus, 'references': references, 'workers': workers, 'seed': seed, 'distinct': distinct},
+        'groups': len(matcher.groups),
+        'build_sec': round(build_seconds, 3),
+        'match_sec': round(match_seconds, 3),
+        'skus_per_sec': round(skus / match_seconds, 1),
+        'correct': correct,
+        'missed': missed,
+        'false_positives': false_positives,
+        'nested_difflib_estimate_sec': round(nested_seconds, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20, help='páginas por PDF (padrão: 20)')
+    parser.add_argument('--rows-per-page', type=int, default=25, help='linhas de dados por página (padrão: 25)')
+    parser.add_argument('--workers', type=int, default=1, help='processos de extração (0 = um por núcleo)')
+    parser.add_argument('--repeat', type=int, default=3, help='repetições; vale o melhor tempo de cada etapa')
+    parser.add_argument('--seed', type=int, default=0, help='semente dos dados sintéticos')
+    parser.add_argument('--engine', choices=['extract_table', 'template'], default='extract_table',
+                        help='motor de extração das páginas (padrão: extract_table)')
+    parser.add_argument('--extra-pages', action='store_true',
+                        help='acrescenta capa, notas e página em branco (sem tabela) a cada PDF')
+    parser.add_argument('--catalog', type=int, metavar='SKUS',
+                        help='mede a associação de um catálogo sintético com SKUS itens em vez do pipeline')
+    parser.add_argument('--output', help='grava o JSON neste arquivo além de imprimir')
+    parser.add_argument('--verbose', action='store_true', help='mostra o log do scraper')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.catalog:
+        report = run_matching_benchmark(args.catalog, workers=args.workers, seed=args.seed)
+    else:
+        report = run_benchmark(args.pages, args.rows_per_page, args.workers, args.repeat, args.seed, args.engine,
+                               args.extra_pages)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return report
+
+
+if __name__ == '__main__':
+    main()
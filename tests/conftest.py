@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# benchmark.py carrega o módulo principal (nome com hífen) e gera os PDFs sintéticos
+import benchmark  # noqa: E402
+
+anvisa_module = benchmark.webscraping_anvisa
+
+
+@pytest.fixture
+def anvisa():
+    return anvisa_module
+
+
+@pytest.fixture(scope='session')
+def pdf_dir(tmp_path_factory):
+    """PDFs sintéticos das quatro listas (3 páginas de 10 linhas cada)"""
+    directory = tmp_path_factory.mktemp('pdfs')
+    for number, (filename, _, excluded) in enumerate(benchmark.LISTS):
+        benchmark.make_pdf(str(directory / filename), excluded, pages=3, rows_per_page=10, seed=number,
+                           duplicate_header=filename.startswith('lista_b'))
+    return directory
+
+
+@pytest.fixture
+def server(pdf_dir):
+    """Servidor local com a página das listas; devolve a URL da página"""
+    with benchmark.BenchmarkServer(str(pdf_dir)) as server:
+        yield server.write_index()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Executa o teste em um diretório vazio (run() grava no diretório atual)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,42 @@
+import shutil
+
+import pytest
+
+
+def test_interrupted_backfill_resumes_without_reprocessing(anvisa, pdf_dir, tmp_path):
+    documents = tmp_path / 'pdfs'
+    documents.mkdir()
+    for day in range(1, 5):
+        shutil.copy(pdf_dir / 'lista_a.pdf', documents / f'lista_a_2023-01-0{day}.pdf')
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None)
+    backfill = anvisa.Backfill(scraper, str(tmp_path / 'backfill'), workers=1)
+    items = backfill.scan_directory(str(documents))
+
+    processed = []
+    process_document = backfill.process_document
+
+    def interrupted(item):
+        # Ctrl+C no meio do terceiro documento
+        if len(processed) == 2:
+            raise KeyboardInterrupt
+        processed.append(item['source'])
+        return process_document(item)
+
+    backfill.process_document = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        backfill.run(items)
+    assert sorted(backfill.load_checkpoint()) == processed
+
+    resumed = []
+
+    def recording(item):
+        resumed.append(item['source'])
+        return process_document(item)
+
+    backfill.process_document = recording
+    checkpoint = backfill.run(items)
+
+    # Cada versão foi concluída exatamente uma vez entre as duas execuções
+    assert sorted(processed + resumed) == sorted(item['source'] for item in items)
+    assert all(checkpoint[item['source']]['status'] == 'ok' for item in items)
+    assert sorted(entry['versao'] for entry in checkpoint.values()) == [f'2023-01-0{day}' for day in range(1, 5)]
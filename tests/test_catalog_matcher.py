@@ -0,0 +1,81 @@
+import pytest
+
+import benchmark
+
+REFERENCE = [
+    # FÁRMACO, REGISTRO, CONCENTRAÇÃO, FORMA FARMACÊUTICA
+    ('CLORIDRATO DE METFORMINA', '100', '500 MG', 'COMPRIMIDO'),
+    ('AMOXICILINA + CLAVULANATO DE POTÁSSIO', '200', '500 MG + 125 MG', 'COMPRIMIDO REVESTIDO'),
+    ('AMOXICILINA', '300', '250 mg/5 mL', 'PÓ PARA SUSPENSÃO ORAL'),
+    ('ALFAEPOETINA', '400', '1000 UI', 'SOLUÇÃO INJETÁVEL'),
+    ('PARACETAMOL', '500', '500 MG', 'COMPRIMIDO'),
+    ('ÁCIDO ACETILSALICÍLICO', '600', '100 MG', 'COMPRIMIDO'),
+]
+
+
+@pytest.fixture(scope='module')
+def matcher():
+    anvisa = benchmark.webscraping_anvisa
+    frame = anvisa.pd.DataFrame(REFERENCE, columns=['FÁRMACO', 'REGISTRO', 'CONCENTRAÇÃO', 'FORMA FARMACÊUTICA'])
+    lookup = anvisa.ReferenceLookup({'medicamentos_referencia_incluidos': frame})
+    return anvisa.CatalogMatcher(lookup)
+
+
+def registro(matcher, found):
+    return matcher.lookup.records[found[0]][4] if found else None
+
+
+@pytest.mark.parametrize('farmaco, concentracao, forma, expected', [
+    # Sal e contraíon ignorados; o sal idêntico só desempata
+    ('metformina', '500mg', 'comp', '100'),
+    ('METFORMINA CLORIDRATO', '500 MG', 'COMPRIMIDO', '100'),
+    # Associação em outra ordem, com outro separador e forma abreviada
+    ('clavulanato de potássio / amoxicilina', '125 mg + 500 mg', 'COMP REV', '200'),
+    # Unidades convertidas
+    ('amoxicilina', '50 mg/mL', 'po para susp oral', '300'),
+    ('ALFAEPOETINA', '1.000 UI', 'SOL INJ', '400'),
+    ('paracetamol', '0,5 g', 'comprimido', '500'),
+])
+def test_readme_examples_match_exactly(matcher, farmaco, concentracao, forma, expected):
+    found = matcher.match(farmaco, concentracao, forma)
+    assert registro(matcher, found) == expected
+    assert found[2] == 'exato'
+
+
+def test_identical_salt_scores_higher(matcher):
+    assert matcher.match('METFORMINA CLORIDRATO', '500 MG', 'COMPRIMIDO')[1] == 1.0
+    assert matcher.match('metformina', '500 MG', 'COMPRIMIDO')[1] < 1.0
+
+
+def test_different_concentration_does_not_match(matcher):
+    assert matcher.match('CLORIDRATO DE METFORMINA', '850 MG', 'COMPRIMIDO') is None
+
+
+def test_shared_common_token_does_not_match(matcher):
+    # "ácido" é o único token em comum com o ácido acetilsalicílico
+    assert matcher.match('ÁCIDO FÓLICO', '100 MG', 'COMPRIMIDO') is None
+
+
+def test_min_score_cutoff(matcher, anvisa):
+    # Mesma forma base: associação aproximada, descartada com um min_score maior
+    found = matcher.match('PARACETAMOL', '500 MG', 'COMPRIMIDO REVESTIDO')
+    assert registro(matcher, found) == '500'
+    assert found[2] == 'aproximado'
+    strict = anvisa.CatalogMatcher(matcher.lookup, min_score=found[1] + 0.01)
+    assert strict.match('PARACETAMOL', '500 MG', 'COMPRIMIDO REVESTIDO') is None
+
+
+def test_match_frame_with_workers(matcher, anvisa):
+    catalog = anvisa.pd.DataFrame({
+        'PRINCIPIO ATIVO': ['metformina', 'ÁCIDO FÓLICO', 'amoxicilina + clavulanato de potássio',
+                            'ALFAEPOETINA', 'metformina', 'PARACETAMOL'],
+        'DOSAGEM': ['500mg', '100 MG', '500 mg + 125 mg', '1.000 UI', '500mg', '0,5 g'],
+        'APRESENTACAO': ['comp', 'COMPRIMIDO', 'COMP REV', 'SOL INJ', 'comp', 'COMPRIMIDO'],
+    })
+    kwargs = dict(farmaco='PRINCIPIO ATIVO', concentracao='DOSAGEM', forma='APRESENTACAO', batch_size=2)
+    serial = matcher.match_frame(catalog, workers=1, **kwargs)
+    assert serial['REGISTRO REFERÊNCIA'].tolist() == ['100', '', '200', '400', '100', '500']
+    assert serial['NÍVEL'].tolist() == ['exato', '', 'exato', 'exato', 'exato', 'exato']
+    assert serial['SITUAÇÃO REFERÊNCIA'].tolist()[0] == 'incluído'
+    parallel = matcher.match_frame(catalog, workers=2, **kwargs)
+    assert parallel.equals(serial)
@@ -0,0 +1,13 @@
+import pytest
+
+
+def test_formats_rejects_unknown_format(anvisa, capsys):
+    parser = anvisa.build_parser()
+    assert parser.parse_args(['run', '--formats', 'csv,parquet']).formats == ['csv', 'parquet']
+    with pytest.raises(SystemExit):
+        parser.parse_args(['run', '--formats', 'csv,xls'])
+    assert 'formatos inválidos' in capsys.readouterr().err
+
+
+def test_selftest_passes(anvisa):
+    assert anvisa.test_date_normalization()
@@ -0,0 +1,127 @@
+import hashlib
+import http.server
+import threading
+
+import pytest
+import requests
+
+DATA = bytes(range(256)) * 400
+NEW_DATA = DATA[::-1]
+
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """Responde cada GET conforme o modo do servidor e registra os headers recebidos"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=b'', etag=None, headers=()):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def truncated(self, data, etag):
+        """Anuncia o corpo inteiro, envia um terço e derruba a conexão"""
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data[:len(data) // 3])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def resume(self, data, etag):
+        """206 a partir do Range pedido se o If-Range coincidir; senão o corpo inteiro"""
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range') == etag:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            self.send(206, data[start:], etag, [('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')])
+        else:
+            self.send(200, data, etag)
+
+    def do_GET(self):
+        requests_seen = self.server.requests
+        requests_seen.append({'Range': self.headers.get('Range'), 'If-Range': self.headers.get('If-Range')})
+        number = len(requests_seen)
+        mode = self.server.mode
+        if mode == 'flaky':
+            # 503, corpo interrompido e depois a retomada
+            if number == 1:
+                self.send(503, headers=[('Retry-After', '0')])
+            elif number == 2:
+                self.truncated(DATA, '"v1"')
+            else:
+                self.resume(DATA, '"v1"')
+        elif mode == 'changed':
+            # O arquivo muda no servidor entre a interrupção e a retomada
+            if number == 1:
+                self.truncated(DATA, '"v1"')
+            else:
+                self.resume(NEW_DATA, '"v2"')
+        else:
+            self.send(500)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(mode):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        server.mode = mode
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f'http://127.0.0.1:{server.server_address[1]}/lista.pdf'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def downloader(anvisa):
+    session = requests.Session()
+    yield anvisa.Downloader(session, retries=3, backoff=0.0, chunk_size=4096)
+    session.close()
+
+
+def test_resumes_after_503_and_truncated_body(serve, downloader, tmp_path):
+    server, url = serve('flaky')
+    path = tmp_path / 'lista.pdf'
+    result = downloader.fetch(url, path=str(path))
+
+    assert path.read_bytes() == DATA
+    assert result['size'] == len(DATA)
+    assert result['sha256'] == hashlib.sha256(DATA).hexdigest()
+    assert result['attempts'] == 3
+    # A terceira requisição retoma do byte recebido, condicionada ao mesmo ETag
+    assert server.requests[1] == {'Range': None, 'If-Range': None}
+    start = int(server.requests[2]['Range'].split('=')[1].rstrip('-'))
+    assert 0 < start <= len(DATA) // 3
+    assert server.requests[2]['If-Range'] == '"v1"'
+
+
+def test_restarts_from_zero_when_if_range_does_not_match(serve, downloader):
+    server, url = serve('changed')
+    result = downloader.fetch(url)
+
+    assert server.requests[1]['If-Range'] == '"v1"'
+    # O servidor ignorou o Range: nada do arquivo antigo fica no resultado
+    assert result['content'] == NEW_DATA
+    assert result['sha256'] == hashlib.sha256(NEW_DATA).hexdigest()
+    assert result['headers']['ETag'] == '"v2"'
+
+
+def test_gives_up_after_retries(anvisa, serve, downloader):
+    server, url = serve('down')
+    with pytest.raises(anvisa.TransientDownloadError):
+        downloader.fetch(url)
+    assert len(server.requests) == downloader.retries + 1
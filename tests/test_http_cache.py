@@ -0,0 +1,72 @@
+import http.server
+import os
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def not_modified_url():
+    """Servidor que responde 304 a qualquer GET, mesmo sem cabeçalhos condicionais"""
+
+    class NotModifiedHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(304)
+            self.end_headers()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), NotModifiedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/lista.pdf'
+    server.shutdown()
+    server.server_close()
+
+
+def test_evicted_body_after_304_is_downloaded_again(anvisa, server, pdf_dir, tmp_path):
+    """Se a cópia sai do cache entre o 304 e a cópia, o PDF é baixado de novo sem cabeçalhos condicionais"""
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, cache_dir=str(tmp_path / 'cache'))
+    url = scraper.find_pdf_links()['lista_a']
+    path = str(tmp_path / 'lista_a.pdf')
+    scraper.get_to_file(url, path)
+
+    fetch = scraper.downloader.fetch
+    requests_headers = []
+
+    def evicting_fetch(url, headers=None, path=None):
+        requests_headers.append(headers or {})
+        result = fetch(url, headers=headers, path=path)
+        if result['status'] == 304:
+            os.remove(scraper.http_cache.paths(url)[0])
+        return result
+
+    scraper.downloader.fetch = evicting_fetch
+    scraper.get_to_file(url, path)
+
+    with open(path, 'rb') as f, open(pdf_dir / 'lista_a.pdf', 'rb') as original:
+        assert f.read() == original.read()
+    assert requests_headers[0] and not requests_headers[1]
+    assert [d['cached'] for d in scraper.metrics.downloads if d['url'] == url] == [False, False]
+    assert os.path.exists(scraper.http_cache.paths(url)[0])
+
+
+def test_cached_body_is_reused_on_304(anvisa, server, pdf_dir, tmp_path):
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, cache_dir=str(tmp_path / 'cache'))
+    url = scraper.find_pdf_links()['lista_a']
+    path = str(tmp_path / 'lista_a.pdf')
+    scraper.get_to_file(url, path)
+    os.remove(path)
+    scraper.get_to_file(url, path)
+
+    with open(path, 'rb') as f, open(pdf_dir / 'lista_a.pdf', 'rb') as original:
+        assert f.read() == original.read()
+    assert [d['cached'] for d in scraper.metrics.downloads if d['url'] == url] == [False, True]
+
+
+def test_304_without_cached_copy_is_an_error(anvisa, not_modified_url):
+    scraper = anvisa.ANVISAReferenceDrugsScraper(not_modified_url)
+    with pytest.raises(RuntimeError, match='304'):
+        scraper.get(not_modified_url)
+    assert scraper.fetch_page(not_modified_url) is None
+    assert scraper.download_pdf_to_file(not_modified_url) is None
@@ -0,0 +1,12 @@
+import pdfplumber
+
+
+def test_page_cache_key_depends_on_engine(anvisa, pdf_dir, tmp_path):
+    cache = anvisa.PageTableCache(str(tmp_path / 'paginas'))
+    keys = set()
+    with pdfplumber.open(str(pdf_dir / 'lista_a.pdf')) as pdf:
+        for engine in ('extract_table', 'template'):
+            scraper = anvisa.ANVISAReferenceDrugsScraper(None, extraction_engine=engine)
+            keys.add(cache.key(pdf.pages[0], scraper.extraction_settings()))
+    # Linhas extraídas por um motor não são reaproveitadas pelo outro
+    assert len(keys) == 2
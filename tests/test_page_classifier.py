@@ -0,0 +1,108 @@
+"""Regressão do PageClassifier: página com linhas de tabela nunca é pulada"""
+import pdfplumber
+import pytest
+
+import benchmark
+
+
+def grid(cells, text=lambda x, y, value: b'BT /F1 8 Tf %d %d Td (%s) Tj ET' % (x, y, value),
+         border=lambda x, y: b'%d %d 100 20 re S' % (x, y)):
+    """Tabela de uma linha com uma célula por valor: (bordas, texto) como listas de operadores"""
+    borders = [border(40 + 100 * column, 700) for column in range(len(cells))]
+    texts = [text(44 + 100 * column, 706, value) for column, value in enumerate(cells)]
+    return borders, texts
+
+
+def write_pdf(path, pages):
+    """PDF mínimo: cada página é (streams de conteúdo, stream do Form XObject /X1 ou None)"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    kids = []
+    for streams, xobject in pages:
+        page_number = len(objects) + 1
+        kids.append(page_number)
+        objects.append(None)
+        contents = []
+        for stream in streams:
+            contents.append(len(objects) + 1)
+            stream += b'\n'
+            objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        resources = b'/Font << /F1 3 0 R >>'
+        if xobject is not None:
+            xobject += b'\n'
+            resources += b' /XObject << /X1 %d 0 R >>' % (len(objects) + 1)
+            objects.append(b'<< /Type /XObject /Subtype /Form /BBox [0 0 595 842] '
+                           b'/Resources << /Font << /F1 3 0 R >> >> /Length %d >>\nstream\n%s\nendstream'
+                           % (len(xobject), xobject))
+        objects[page_number - 1] = (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << %s >> /Contents [%s] >>'
+            % (resources, b' '.join(b'%d 0 R' % number for number in contents)))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % number for number in kids), len(kids))
+
+    data = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    path.write_bytes(bytes(data))
+
+
+CELLS = [b'dipirona', b'EMPRESA A', b'100']
+BORDERS, TEXTS = grid(CELLS)
+LINE_BORDERS, _ = grid(CELLS, border=lambda x, y: b'%d %d m %d %d l %d %d l %d %d l h S' % (
+    x, y, x + 100, y, x + 100, y + 20, x, y + 20))
+_, TJ_TEXTS = grid(CELLS, text=lambda x, y, value: b'BT/F1 8 Tf %d %d Td[(%s)]TJ ET' % (x, y, value))
+_, QUOTE_TEXTS = grid(CELLS, text=lambda x, y, value: b"BT /F1 8 Tf 10 TL %d %d Td (%s)' ET" % (x, y + 16, value))
+
+TABLE_PAGES = {
+    'bordas re e Tj': ([b'\n'.join(BORDERS + TEXTS)], None),
+    'bordas por linhas (m/l)': ([b'\n'.join(LINE_BORDERS + TEXTS)], None),
+    'texto em TJ sem espaços': ([b'\n'.join(BORDERS + TJ_TEXTS)], None),
+    "texto com '": ([b'\n'.join(BORDERS + QUOTE_TEXTS)], None),
+    'texto e bordas em streams separados': ([b'\n'.join(TEXTS), b'\n'.join(BORDERS)], None),
+    'tabela em Form XObject': ([b'/X1 Do'], b'\n'.join(BORDERS + TEXTS)),
+    'bordas em Form XObject': ([b'\n'.join(TEXTS) + b'\n/X1 Do'], b'\n'.join(BORDERS)),
+}
+
+
+@pytest.fixture(scope='module')
+def fixture_pdf(tmp_path_factory):
+    path = tmp_path_factory.mktemp('classificador') / 'paginas.pdf'
+    write_pdf(path, list(TABLE_PAGES.values()) + [([TEXTS[0]], None), ([b''], None), ([BORDERS[0]], None)])
+    return path
+
+
+@pytest.mark.parametrize('number, name', list(enumerate(TABLE_PAGES)))
+def test_table_page_is_never_skipped(anvisa, fixture_pdf, number, name):
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None)
+    with pdfplumber.open(str(fixture_pdf)) as pdf:
+        page = pdf.pages[number]
+        # A página realmente tem linhas: pulá-la perderia registros
+        assert scraper.extract_page_rows(page)
+        assert anvisa.PageClassifier().skip_reason(page) is None
+
+
+def test_pages_without_table_are_skipped(anvisa, fixture_pdf):
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None)
+    with pdfplumber.open(str(fixture_pdf)) as pdf:
+        pages = pdf.pages[len(TABLE_PAGES):]
+        assert [anvisa.PageClassifier().skip_reason(page) for page in pages] == [
+            'sem bordas', 'sem texto', 'sem texto']
+        assert not any(scraper.extract_page_rows(page) for page in pages)
+
+
+def test_no_skipped_page_has_rows(anvisa, tmp_path):
+    """Todas as páginas das listas sintéticas, com capa, notas e página em branco"""
+    path = tmp_path / 'lista.pdf'
+    benchmark.make_pdf(str(path), pages=3, rows_per_page=5, extra_pages=True)
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None)
+    classifier = anvisa.PageClassifier()
+    with pdfplumber.open(str(path)) as pdf:
+        skipped = [page for page in pdf.pages if classifier.skip_reason(page)]
+        assert [page.page_number for page in skipped] == [1, len(pdf.pages)]
+        assert not any(scraper.extract_page_rows(page) for page in skipped)
@@ -0,0 +1,43 @@
+def test_extraction_workers_split_between_lists(anvisa, server, workdir):
+    """As listas extraídas ao mesmo tempo dividem os processos de extração"""
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, extraction_workers=6)
+    used = []
+    iter_page_rows = scraper.iter_page_rows
+
+    def recording(pdf_file, schema, workers=None):
+        used.append(workers)
+        return iter_page_rows(pdf_file, schema, workers=1)
+
+    scraper.iter_page_rows = recording
+    scraper.run()
+    assert sorted(used) == [1, 1, 2, 2]
+    assert (workdir / 'lista_a.csv').exists()
+
+
+def test_profiled_run_never_overlaps_profilers(anvisa, server, workdir, monkeypatch):
+    """Como no Python 3.12+, um segundo cProfile ativo ao mesmo tempo levanta ValueError"""
+    import cProfile
+    import threading
+
+    active = []
+    lock = threading.Lock()
+
+    class StrictProfile(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            with lock:
+                if active:
+                    raise ValueError('Another profiling tool is already active')
+                active.append(self)
+            super().enable(*args, **kwargs)
+
+        def disable(self):
+            super().disable()
+            with lock:
+                # pstats chama disable() de novo ao ler o perfil
+                if self in active:
+                    active.remove(self)
+
+    monkeypatch.setattr(cProfile, 'Profile', StrictProfile)
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, profiler='cprofile')
+    assert scraper.run()
+    assert (workdir / 'perfil_extracao.prof').exists()
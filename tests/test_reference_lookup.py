@@ -0,0 +1,86 @@
+import pytest
+
+INCLUDED = [
+    ('Dipirona Sódica', '1.0235.0001', '500 MG'),
+    ('DIPIRONA SÓDICA', '1.0235.0002', '1 G'),
+    ('DICLOFENACO POTÁSSICO', '1.0100.0001', '50 MG'),
+    ('LOSARTANA POTÁSSICA + HIDROCLOROTIAZIDA', '1.0300.0001', '50 MG + 12,5 MG'),
+    ('AMOXICILINA + CLAVULANATO DE POTÁSSIO', '1.0400.0001', '500 MG + 125 MG'),
+]
+EXCLUDED = [
+    ('DIPIRONA SÓDICA', '1.0235.0002', '1 G'),
+    ('ÉTER ETÍLICO', '1.0500.0001', '100 ML'),
+]
+COLUMNS = ['FÁRMACO', 'REGISTRO', 'CONCENTRAÇÃO']
+
+
+@pytest.fixture
+def lookup(anvisa):
+    frames = {'medicamentos_referencia_incluidos': anvisa.pd.DataFrame(INCLUDED, columns=COLUMNS),
+              'medicamentos_referencia_excluidos': anvisa.pd.DataFrame(EXCLUDED, columns=COLUMNS)}
+    return anvisa.ReferenceLookup(frames)
+
+
+def farmacos(records):
+    return [record['FÁRMACO'] for record in records]
+
+
+def answers(lookup):
+    """Respostas de todas as consultas, para comparar índices construídos e carregados"""
+    return [
+        lookup.status('1.0235.0002'), lookup.status('10500 0001'), lookup.lookup('102350001'),
+        lookup.search_farmaco('dip'), lookup.search_farmaco('ETER'), lookup.search_farmaco('di', limit=2),
+        lookup.match_association('hidroclorotiazida + losartana potassica'),
+        lookup.match_association('clavulanato de potássio', partial=True),
+    ]
+
+
+@pytest.mark.parametrize('registro', ['1.0235.0001', '102350001', ' 1-0235-0001 '])
+def test_status_ignores_punctuation(lookup, registro):
+    assert lookup.status(registro) == 'incluído'
+    assert lookup.is_reference(registro)
+
+
+def test_status_prefers_included_presentation(lookup):
+    # Apresentação presente nas duas listas conta como vigente; só nos excluídos, como excluída
+    assert lookup.status('1.0235.0002') == 'incluído'
+    assert lookup.status('1.0500.0001') == 'excluído'
+    assert lookup.status('9.9999.9999') is None
+    assert not lookup.is_reference('1.0500.0001')
+
+
+def test_search_farmaco_prefix(lookup):
+    # Sem acentos nem diferença de maiúsculas, em ordem alfabética
+    assert farmacos(lookup.search_farmaco('ÉTER')) == ['ÉTER ETÍLICO']
+    assert farmacos(lookup.search_farmaco('dipirona sod')) == [
+        'Dipirona Sódica', 'DIPIRONA SÓDICA', 'DIPIRONA SÓDICA']
+    assert farmacos(lookup.search_farmaco('di', limit=2)) == ['DICLOFENACO POTÁSSICO', 'Dipirona Sódica']
+    assert lookup.search_farmaco('xarope') == []
+
+
+def test_match_association_any_order(lookup):
+    found = lookup.match_association('HIDROCLOROTIAZIDA + losartana potássica')
+    assert [record['REGISTRO'] for record in found] == ['1.0300.0001']
+    assert lookup.match_association('losartana potássica') == []
+    partial = lookup.match_association('Losartana Potássica', partial=True)
+    assert [record['REGISTRO'] for record in partial] == ['1.0300.0001']
+
+
+def test_snapshot_round_trip(anvisa, lookup, tmp_path, monkeypatch):
+    path = tmp_path / 'referencia.json'
+    lookup.save(str(path))
+    expected = answers(lookup)
+
+    # O snapshot traz os índices prontos: build() não pode ser chamado
+    monkeypatch.setattr(anvisa.ReferenceLookup, 'build', lambda self: pytest.fail('índice reconstruído'))
+    loaded = anvisa.ReferenceLookup().load(str(path))
+    assert answers(loaded) == expected
+    assert not (tmp_path / 'referencia.json.tmp').exists()
+
+
+def test_incompatible_snapshot_is_rejected(anvisa, lookup, tmp_path):
+    path = tmp_path / 'referencia.json'
+    lookup.SNAPSHOT_VERSION = 0
+    lookup.save(str(path))
+    with pytest.raises(ValueError):
+        anvisa.ReferenceLookup().load(str(path))
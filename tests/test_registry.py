@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('lista_b_excluidos.pdf', 'lista_b_excluidos'),
+    ('Lista-A Excluídos 2023-05.pdf', 'lista_a_excluidos'),
+    ('lista_a_medicamentos_excluidos.pdf', 'lista_a_excluidos'),
+    ('LISTA B - maio de 2023.pdf', 'lista_b'),
+    ('lista_anvisa.pdf', None),
+    ('relatorio.pdf', None),
+])
+def test_find_list_for_file(anvisa, filename, expected):
+    source_list = anvisa.find_list_for_file(filename)
+    assert (source_list.name if source_list else None) == expected
+
+
+@pytest.fixture
+def extra_source(anvisa, monkeypatch):
+    """Fonte registrada só durante o teste, sem nenhuma alteração no código"""
+    monkeypatch.setattr(anvisa, 'SOURCES', dict(anvisa.SOURCES))
+    return anvisa.register_source(anvisa.Source('genericos', 'http://127.0.0.1/genericos', [
+        anvisa.SourceList('genericos_vigentes', anvisa.REFERENCE_INCLUDED, ('genéricos',), ('cancelados',),
+                          label='Genéricos'),
+        anvisa.SourceList('genericos_cancelados', anvisa.REFERENCE_EXCLUDED, ('genéricos', 'cancelados'),
+                          label='Genéricos cancelados', excluded=True),
+    ]))
+
+
+def test_new_source_needs_no_code_changes(anvisa, extra_source):
+    assert anvisa.find_list_for_file('genericos-cancelados-2024.pdf').name == 'genericos_cancelados'
+    frame = anvisa.pd.DataFrame({'FÁRMACO': ['dipirona'], 'REGISTRO': ['100']})
+    lookup = anvisa.ReferenceLookup({'genericos_vigentes': frame, 'genericos_cancelados': frame})
+    assert sorted(record[0] for record in lookup.records) == ['excluído', 'incluído']
+
+
+def test_status_follows_registry_flag(anvisa):
+    frame = anvisa.pd.DataFrame({'FÁRMACO': ['dipirona'], 'REGISTRO': ['100']})
+    lookup = anvisa.ReferenceLookup({'medicamentos_referencia_excluidos': frame, 'lista_b': frame})
+    assert [record[0] for record in lookup.records] == ['excluído', 'incluído']
@@ -0,0 +1,31 @@
+import json
+
+COLUMNS = ['FÁRMACO', 'REGISTRO', 'CONCENTRAÇÃO', 'FORMA FARMACÊUTICA']
+ROWS = [
+    ['dipirona', '100', '500 mg', 'comprimido'],
+    ['paracetamol', '200', '750 mg', 'comprimido'],
+]
+
+
+def run(anvisa, directory, included, excluded):
+    diff = anvisa.SnapshotDiff(str(directory))
+    diff.compare('incluidos', COLUMNS, included)
+    diff.compare('excluidos', COLUMNS + ['MOTIVO'], excluded)
+    return diff.save('incluidos', 'excluidos')
+
+
+def test_unchanged_run_writes_no_changeset(anvisa, tmp_path):
+    assert run(anvisa, tmp_path, ROWS, []) is None
+    assert run(anvisa, tmp_path, ROWS, []) is None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['index.json']
+
+
+def test_removed_record_pairs_with_new_exclusion(anvisa, tmp_path):
+    run(anvisa, tmp_path, ROWS, [])
+    path = run(anvisa, tmp_path, ROWS[:1], [ROWS[1] + ['cancelado']])
+    with open(path, encoding='utf-8') as f:
+        changeset = json.load(f)
+    assert changeset['moved_to_excluded'] == [dict(zip(COLUMNS + ['MOTIVO'], ROWS[1] + ['cancelado']))]
+    # O registro movido não aparece também como removido e adicionado
+    assert changeset['incluidos'] == {'added': [], 'modified': [], 'removed': []}
+    assert changeset['excluidos'] == {'added': [], 'modified': [], 'removed': []}
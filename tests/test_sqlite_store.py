@@ -0,0 +1,52 @@
+import pytest
+
+COLUMNS = ['FÁRMACO', 'DETENTOR', 'REGISTRO', 'CONCENTRAÇÃO', 'FORMA FARMACÊUTICA', 'DATA INCLUSÃO']
+ROWS = [
+    ['dipirona', 'EMPRESA A', '100', '500 mg', 'comprimido', '12.11.2012'],
+    ['paracetamol', 'EMPRESA B', '200', '750 mg', 'comprimido', '01.02.2015'],
+]
+
+
+@pytest.fixture
+def store(anvisa, tmp_path):
+    store = anvisa.SQLiteStore(str(tmp_path / 'listas.db'))
+    yield store
+    store.close()
+
+
+def history(store):
+    return store.connection.execute("SELECT registro, detentor, desde, ate FROM historico ORDER BY rowid").fetchall()
+
+
+def test_unchanged_run_adds_no_history(store):
+    store.save_run([('incluidos', COLUMNS, ROWS)])
+    before = history(store)
+    run_id = store.save_run([('incluidos', COLUMNS, ROWS)])
+
+    assert history(store) == before
+    last = store.runs()[0]
+    assert last['id'] == run_id
+    assert (last['registros'], last['inseridos'], last['alterados'], last['removidos']) == (2, 0, 0, 0)
+
+
+def test_modified_record_closes_previous_version(store):
+    first = store.save_run([('incluidos', COLUMNS, ROWS)])
+    changed = [ROWS[0][:1] + ['EMPRESA C'] + ROWS[0][2:], ROWS[1]]
+    second = store.save_run([('incluidos', COLUMNS, changed)])
+
+    assert [tuple(row) for row in history(store) if row['registro'] == '100'] == [
+        ('100', 'EMPRESA A', first, second),
+        ('100', 'EMPRESA C', second, None),
+    ]
+    assert store.runs()[0]['alterados'] == 1
+    assert [row['detentor'] for row in store.lookup(registro='100')] == ['EMPRESA C']
+
+
+def test_removed_record_leaves_current_state(store):
+    first = store.save_run([('incluidos', COLUMNS, ROWS)])
+    second = store.save_run([('incluidos', COLUMNS, ROWS[:1])])
+
+    assert store.lookup(registro='200') == []
+    assert [tuple(row) for row in history(store) if row['registro'] == '200'] == [
+        ('200', 'EMPRESA B', first, second)]
+    assert store.runs()[0]['removidos'] == 1
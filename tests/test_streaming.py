@@ -0,0 +1,25 @@
+def test_failed_extraction_keeps_previous_csv(anvisa, server, workdir):
+    """Uma falha no meio da extração não substitui o CSV da execução anterior"""
+    (workdir / 'lista_a.csv').write_text('anterior\n')
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, streaming=True)
+    pdf_links = scraper.find_pdf_links()
+    extract_page_rows = scraper.extract_page_rows
+
+    def failing(page, template=None):
+        if page.page_number == 2:
+            raise RuntimeError('falha na página 2')
+        return extract_page_rows(page, template)
+
+    scraper.extract_page_rows = failing
+    assert scraper.stream_pdf('lista_a', pdf_links['lista_a']) is None
+    assert (workdir / 'lista_a.csv').read_text() == 'anterior\n'
+    assert sorted(path.name for path in workdir.iterdir()) == ['lista_a.csv']
+
+
+def test_streamed_csv_replaces_previous(anvisa, server, workdir):
+    (workdir / 'lista_a.csv').write_text('anterior\n')
+    scraper = anvisa.ANVISAReferenceDrugsScraper(server, streaming=True)
+    pdf_links = scraper.find_pdf_links()
+    assert scraper.stream_pdf('lista_a', pdf_links['lista_a']) == 30
+    assert len((workdir / 'lista_a.csv').read_text(encoding='utf-8-sig').splitlines()) == 31
+    assert not (workdir / 'lista_a.csv.tmp').exists()
@@ -0,0 +1,69 @@
+"""O motor 'template' produz as mesmas linhas que page.extract_table()"""
+import random
+
+import pdfplumber
+import pytest
+
+import benchmark
+
+WIDTH = 555 / len(benchmark.INCLUDED_HEADER)
+
+
+def rows(count, start, seed=0):
+    return benchmark.synthetic_rows(False, count, start, random.Random(seed))
+
+
+def compare(anvisa, path, schema):
+    """Extrai cada página pelos dois motores e devolve os caminhos usados pelo modelo"""
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None, extraction_engine='template')
+    template = scraper.table_template(schema)
+    modes = []
+    with pdfplumber.open(str(path)) as pdf:
+        for page in pdf.pages:
+            assert template.extract_table(page) == page.extract_table(), f'página {page.page_number}'
+            modes.append(template.mode)
+    with pdfplumber.open(str(path)) as pdf:
+        for page in pdf.pages:
+            assert scraper.extract_page_rows(page, template) == scraper.extract_page_rows(page)
+    return modes
+
+
+@pytest.mark.parametrize('filename', [filename for filename, _, _ in benchmark.LISTS])
+def test_template_rows_match_extract_table(anvisa, pdf_dir, filename):
+    schema = anvisa.find_list(filename[:-len('.pdf')]).schema
+    assert compare(anvisa, pdf_dir / filename, schema) == ['aprendizado', 'modelo', 'modelo']
+
+
+@pytest.fixture
+def fallback_pdf(tmp_path):
+    """Página de aprendizado, uma página no modelo e três que precisam voltar ao pdfplumber"""
+    table = [benchmark.INCLUDED_HEADER] + rows(5, 0)
+    pages = [benchmark.table_page(table, WIDTH),
+             benchmark.table_page([benchmark.INCLUDED_HEADER] + rows(5, 5), WIDTH)]
+    # Caractere com o centro sobre a segunda borda vertical ('I' de 6 pt tem 1,668 pt de largura)
+    border = 20 + WIDTH
+    pages.append(benchmark.table_page(table, WIDTH) + f'\nBT /F1 6 Tf {border - 0.834:.3f} 780 Td (I) Tj ET'.encode())
+    # Traço parcial dentro de uma célula (o pdfminer ignora o último operador sem espaço depois dele)
+    pages.append(benchmark.table_page(table, WIDTH) + b'\n30 770 m 60 770 l S\n')
+    # Linha diagonal
+    pages.append(benchmark.table_page(table, WIDTH) + b'\n30 760 m 60 775 l S\n')
+    path = tmp_path / 'lista_a.pdf'
+    benchmark.write_pdf(str(path), pages)
+    return path
+
+
+def test_pages_off_the_grid_fall_back(anvisa, fallback_pdf):
+    modes = compare(anvisa, fallback_pdf, anvisa.REFERENCE_INCLUDED)
+    assert modes == ['aprendizado', 'modelo', 'fallback', 'fallback', 'fallback']
+
+
+def test_template_counters(anvisa, fallback_pdf):
+    scraper = anvisa.ANVISAReferenceDrugsScraper(None, extraction_engine='template', page_filter=False)
+    baseline = anvisa.ANVISAReferenceDrugsScraper(None, page_filter=False)
+    assert (scraper.extract_table_from_pdf(str(fallback_pdf), anvisa.REFERENCE_INCLUDED, workers=1)
+            == baseline.extract_table_from_pdf(str(fallback_pdf), anvisa.REFERENCE_INCLUDED, workers=1))
+    counters = {}
+    for (name, _), value in scraper.metrics.counters.items():
+        counters[name] = counters.get(name, 0) + value
+    assert counters['template_pages'] == 1
+    assert counters['template_fallbacks'] == 3
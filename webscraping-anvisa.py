@@ -1,39 +1,2017 @@
 import os
 import re
-import pandas as pd
-import requests
-import pdfplumber
+import sys
+import csv
+import json
+import mmap
+import time
+import random
+import shutil
+import signal
+import sqlite3
+import bisect
+import hashlib
+import tempfile
+import threading
+import argparse
+import importlib
+import unicodedata
 from io import BytesIO
-from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urlsplit
+from contextlib import contextmanager
 from datetime import datetime
 import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+class LazyModule:
+    """Módulo importado só no primeiro acesso a um atributo
+    
+    pandas, pdfplumber, requests e BeautifulSoup levam mais de um segundo para importar;
+    assim subcomandos como `links` não pagam pelo que não usam.
+    """
+    
+    def __init__(self, name):
+        self.module_name = name
+    
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self.module_name), attr)
+        # Os próximos acessos ao mesmo atributo não passam mais por __getattr__
+        setattr(self, attr, value)
+        return value
+
+
+# Bibliotecas pesadas, carregadas sob demanda
+pd = LazyModule('pandas')
+requests = LazyModule('requests')
+pdfplumber = LazyModule('pdfplumber')
+pdftypes = LazyModule('pdfminer.pdftypes')
+pdfminer_layout = LazyModule('pdfminer.layout')
+bs4 = LazyModule('bs4')
+
+class HTTPCache:
+    """Cache em disco de respostas HTTP, revalidado com ETag/Last-Modified"""
+    
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def paths(self, url):
+        """Retorna os caminhos do corpo e dos metadados de uma URL"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+    
+    def load_meta(self, url):
+        """Retorna os metadados da cópia em cache, ou None se ela estiver incompleta"""
+        body_path, meta_path = self.paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if os.path.getsize(body_path) != meta.get('size'):
+                return None
+        except (OSError, ValueError):
+            return None
+        return meta
+    
+    def load(self, url):
+        """Retorna (metadados, corpo) da cópia em cache, ou None"""
+        meta = self.load_meta(url)
+        if meta is None:
+            return None
+        try:
+            with open(self.paths(url)[0], 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        if len(body) != meta.get('size'):
+            return None
+        return meta, body
+    
+    def copy_body(self, url, path, size):
+        """Copia em blocos o corpo em cache para o arquivo indicado; False se a cópia não existe mais
+        
+        A cópia é feita sob o lock para que evict() de outra thread não apague o corpo no meio dela.
+        """
+        with self.lock:
+            try:
+                with open(self.paths(url)[0], 'rb') as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            except FileNotFoundError:
+                return False
+        return os.path.getsize(path) == size
+    
+    def conditional_headers(self, meta):
+        """Monta os cabeçalhos da requisição condicional"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+    
+    def write_file(self, path, data):
+        """Grava um arquivo de forma atômica"""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def store(self, url, headers, body=None, path=None):
+        """Armazena o corpo (bytes ou arquivo) se a resposta tiver validadores e aplica o limite de tamanho"""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        
+        body_path, meta_path = self.paths(url)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'size': len(body) if path is None else os.path.getsize(path),
+            'last_used': time.time(),
+        }
+        with self.lock:
+            if path is None:
+                self.write_file(body_path, body)
+            else:
+                tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, body_path)
+            self.write_file(meta_path, json.dumps(meta).encode('utf-8'))
+            self.evict()
+    
+    def touch(self, url, meta):
+        """Marca a entrada como usada agora (base da remoção LRU)"""
+        meta['last_used'] = time.time()
+        body_path, meta_path = self.paths(url)
+        with self.lock:
+            # A entrada pode ter sido removida por outro download nesse meio tempo
+            if os.path.exists(body_path):
+                self.write_file(meta_path, json.dumps(meta).encode('utf-8'))
+    
+    def evict(self):
+        """Remove as entradas usadas há mais tempo até caber em max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta.get('last_used', 0), meta.get('size', 0), meta_path))
+            total += meta.get('size', 0)
+        
+        for _, size, meta_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (meta_path, meta_path[:-len('.json')] + '.body'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            logging.debug(f"Removido do cache HTTP: {meta_path}")
+
+
+class PageTableCache:
+    """Cache em disco das linhas limpas de cada página, endereçado pelo conteúdo da página"""
+    
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                               if entry.name.endswith('.json'))
+    
+    def digest_object(self, obj, digest, depth=0):
+        """Acumula no hash um objeto PDF, resolvendo referências e streams"""
+        if depth > 8:
+            return
+        if isinstance(obj, pdftypes.PDFObjRef):
+            obj = obj.resolve()
+        if isinstance(obj, pdftypes.PDFStream):
+            digest.update(obj.get_data())
+            obj = obj.attrs
+        if isinstance(obj, dict):
+            for name in sorted(obj, key=str):
+                digest.update(str(name).encode('utf-8'))
+                self.digest_object(obj[name], digest, depth + 1)
+        elif isinstance(obj, (list, tuple)):
+            for item in obj:
+                self.digest_object(item, digest, depth + 1)
+        else:
+            digest.update(repr(obj).encode('utf-8'))
+    
+    def key(self, page, settings):
+        """Chave da página: hash dos streams de conteúdo, geometria, fontes e configurações"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        page_obj = page.page_obj
+        digest.update(repr((page_obj.mediabox, page_obj.cropbox, page_obj.rotate)).encode('utf-8'))
+        for stream in page_obj.contents:
+            self.digest_object(stream, digest)
+        # As fontes definem o texto produzido pelos mesmos operadores de conteúdo
+        resources = page_obj.resources or {}
+        if isinstance(resources, dict):
+            self.digest_object(resources.get('Font'), digest)
+        return digest.hexdigest()
+    
+    def path(self, key):
+        """Caminho do arquivo da entrada"""
+        return os.path.join(self.directory, key + '.json')
+    
+    def get(self, key):
+        """Retorna as linhas da página em cache, ou None"""
+        path = self.path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                rows = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return rows
+    
+    def put(self, key, rows):
+        """Armazena as linhas da página e aplica o limite de tamanho"""
+        data = json.dumps(rows, ensure_ascii=False).encode('utf-8')
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data) - previous
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+    
+    def evict(self):
+        """Remove as páginas usadas há mais tempo até caber em max_bytes"""
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+    
+    def stats(self):
+        """Retorna os contadores de acertos e falhas"""
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.total_bytes}
+
+
+class PageClassifier:
+    """Descarta, pelo fluxo de conteúdo, as páginas que não podem ter linhas de tabela
+    
+    extract_table() só devolve linhas com texto se a página tiver caracteres (operadores
+    Tj, TJ, ' e ") e bordas (construção de caminhos: re, l, c, v, y). Sem um dos dois a
+    tabela não existe ou só tem células vazias, descartadas por extract_page_rows. Os
+    operadores são procurados no conteúdo sem interpretá-lo: um operador dentro de uma
+    string torna a página candidata, nunca o contrário. Páginas com XObjects (Do) sempre
+    seguem para a extração.
+    """
+    DELIMITER = rb'[\s()<>\[\]{}/%]'
+    
+    def __init__(self):
+        self.xobject = self.operators(rb'Do')
+        self.text = self.operators(rb'Tj', rb'TJ', rb"'", rb'"')
+        self.path = self.operators(rb're', rb'l', rb'c', rb'v', rb'y')
+    
+    def operators(self, *names):
+        """Regex dos operadores delimitados (início/fim do conteúdo ou delimitador PDF)"""
+        alternatives = b'|'.join(re.escape(name) for name in names)
+        return re.compile(rb'(?<!(?!' + self.DELIMITER + rb').)(?:' + alternatives +
+                          rb')(?!(?!' + self.DELIMITER + rb').)', re.DOTALL)
+    
+    def content(self, page):
+        """Conteúdo decodificado da página (todos os streams concatenados)"""
+        data = []
+        for stream in page.page_obj.contents:
+            stream = pdftypes.resolve1(stream)
+            if isinstance(stream, pdftypes.PDFStream):
+                data.append(stream.get_data())
+        return b'\n'.join(data)
+    
+    def skip_reason(self, page):
+        """Motivo para pular a página, ou None se ela pode ter linhas de tabela"""
+        data = self.content(page)
+        if self.xobject.search(data):
+            return None
+        if not self.text.search(data):
+            return 'sem texto'
+        if not self.path.search(data):
+            return 'sem bordas'
+        return None
+
+
+class RunMetrics:
+    """Tempos por etapa e por página, downloads e contadores de uma execução
+    
+    Cada medida leva a fonte corrente da thread (ex.: 'lista_a'), definida com source().
+    O relatório sai em JSON ou no formato textfile do Prometheus.
+    """
+    
+    # Limites (segundos) do histograma de extração por página
+    PAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        """Zera as medidas (início de uma nova execução)"""
+        self.started = time.time()
+        self.finished = None
+        # (etapa, fonte) -> [chamadas, segundos, maior duração]
+        self.stages = {}
+        # (contador, fonte) -> valor
+        self.counters = {}
+        self.downloads = []
+        # (fonte, página, segundos)
+        self.pages = []
+    
+    @contextmanager
+    def source(self, name):
+        """Define a fonte das medidas feitas nesta thread dentro do bloco"""
+        previous = getattr(self.local, 'source', '')
+        self.local.source = name
+        try:
+            yield
+        finally:
+            self.local.source = previous
+    
+    def current_source(self):
+        return getattr(self.local, 'source', '')
+    
+    @contextmanager
+    def timer(self, stage):
+        """Mede a duração do bloco como uma chamada da etapa"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def observe(self, stage, seconds, calls=1):
+        """Soma uma duração à etapa"""
+        key = (stage, self.current_source())
+        with self.lock:
+            entry = self.stages.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds / calls if calls else seconds)
+    
+    def increment(self, name, amount=1):
+        """Soma ao contador"""
+        key = (name, self.current_source())
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+    
+    def record_download(self, url, size, seconds, cached=False, sha256=None):
+        """Registra um GET: bytes recebidos (ou lidos do cache), duração, se veio do cache e o SHA-256"""
+        with self.lock:
+            self.downloads.append({'source': self.current_source(), 'url': url, 'bytes': size,
+                                   'seconds': round(seconds, 6), 'cached': cached, 'sha256': sha256})
+    
+    def record_page(self, page_number, seconds):
+        """Registra o tempo de extract_table de uma página"""
+        with self.lock:
+            self.pages.append((self.current_source(), page_number, seconds))
+    
+    def finish(self):
+        self.finished = time.time()
+    
+    def report(self):
+        """Relatório da execução como dicionário"""
+        with self.lock:
+            stages = [{'stage': stage, 'source': source, 'calls': calls, 'seconds': round(total, 6),
+                       'max_seconds': round(longest, 6)}
+                      for (stage, source), (calls, total, longest) in sorted(self.stages.items())]
+            counters = [{'name': name, 'source': source, 'value': value}
+                        for (name, source), value in sorted(self.counters.items())]
+            pages = [{'source': source, 'page': page, 'seconds': round(seconds, 6)}
+                     for source, page, seconds in self.pages]
+            downloads = list(self.downloads)
+        finished = self.finished or time.time()
+        return {
+            'started_at': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'duration_seconds': round(finished - self.started, 3),
+            'stages': stages,
+            'counters': counters,
+            'downloads': downloads,
+            'pages': pages,
+        }
+    
+    def write_json(self, path):
+        """Grava o relatório em JSON"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    
+    def prometheus_labels(self, **labels):
+        """Formata os rótulos de uma amostra, escapando os valores"""
+        values = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for name, value in labels.items())
+        return '{' + values + '}'
+    
+    def prometheus_lines(self, prefix='anvisa'):
+        """Linhas no formato de exposição de texto do Prometheus"""
+        report = self.report()
+        lines = [
+            f'# HELP {prefix}_run_start_timestamp_seconds Início da última execução.',
+            f'# TYPE {prefix}_run_start_timestamp_seconds gauge',
+            f'{prefix}_run_start_timestamp_seconds {self.started:.3f}',
+            f'# HELP {prefix}_run_duration_seconds Duração da última execução.',
+            f'# TYPE {prefix}_run_duration_seconds gauge',
+            f'{prefix}_run_duration_seconds {report["duration_seconds"]}',
+        ]
+        
+        for metric, field, help_text in (('stage_seconds', 'seconds', 'Tempo total por etapa.'),
+                                         ('stage_calls', 'calls', 'Chamadas por etapa.'),
+                                         ('stage_max_seconds', 'max_seconds', 'Maior duração de uma chamada da etapa.')):
+            lines.append(f'# HELP {prefix}_{metric} {help_text}')
+            lines.append(f'# TYPE {prefix}_{metric} gauge')
+            for stage in report['stages']:
+                labels = self.prometheus_labels(stage=stage['stage'], source=stage['source'])
+                lines.append(f'{prefix}_{metric}{labels} {stage[field]}')
+        
+        for counter in report['counters']:
+            name = f"{prefix}_{counter['name']}"
+            if not any(line.startswith(f'# TYPE {name} ') for line in lines):
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f"{name}{self.prometheus_labels(source=counter['source'])} {counter['value']}")
+        
+        downloads = {}
+        for download in report['downloads']:
+            totals = downloads.setdefault(download['source'], [0, 0.0, 0])
+            totals[0] += download['bytes']
+            totals[1] += download['seconds']
+            totals[2] += download['cached']
+        for metric, position in (('download_bytes', 0), ('download_seconds', 1), ('download_cached', 2)):
+            lines.append(f'# TYPE {prefix}_{metric} gauge')
+            for source, totals in sorted(downloads.items()):
+                lines.append(f'{prefix}_{metric}{self.prometheus_labels(source=source)} {totals[position]}')
+        
+        # Histograma do tempo de extração por página, por fonte
+        lines.append(f'# HELP {prefix}_page_extract_seconds Tempo de extract_table por página.')
+        lines.append(f'# TYPE {prefix}_page_extract_seconds histogram')
+        by_source = {}
+        for page in report['pages']:
+            by_source.setdefault(page['source'], []).append(page['seconds'])
+        for source, durations in sorted(by_source.items()):
+            for bound in self.PAGE_BUCKETS:
+                count = sum(1 for seconds in durations if seconds <= bound)
+                lines.append(f'{prefix}_page_extract_seconds_bucket{self.prometheus_labels(source=source, le=bound)} {count}')
+            lines.append(f'{prefix}_page_extract_seconds_bucket{self.prometheus_labels(source=source, le="+Inf")} {len(durations)}')
+            lines.append(f'{prefix}_page_extract_seconds_sum{self.prometheus_labels(source=source)} {sum(durations):.6f}')
+            lines.append(f'{prefix}_page_extract_seconds_count{self.prometheus_labels(source=source)} {len(durations)}')
+        return lines
+    
+    def write_prometheus(self, path, prefix='anvisa'):
+        """Grava o arquivo .prom para o textfile collector do node_exporter (troca atômica)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write('\n'.join(self.prometheus_lines(prefix)) + '\n')
+        os.replace(tmp_path, path)
+
+
+class TransientDownloadError(Exception):
+    """Falha temporária de download (status 429/5xx ou corpo incompleto), que vale nova tentativa"""
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Downloader:
+    """GETs com novas tentativas, retomada por Range, SHA-256 durante a transferência e limite por host
+    
+    Falhas de conexão, timeouts, corpos incompletos e respostas 429/5xx repetem com backoff
+    exponencial (ou o Retry-After do servidor). Um download interrompido continua do byte
+    em que parou com `Range` + `If-Range`; se o servidor não aceitar, recomeça do zero.
+    """
+    
+    # Respostas que valem nova tentativa
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    
+    def __init__(self, session, retries=4, backoff=1.0, max_backoff=30.0, timeout=(10, 30),
+                 min_interval=0.0, chunk_size=64 * 1024):
+        self.session = session
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # (conexão, leitura): o timeout de leitura vale para cada bloco, não para o download inteiro
+        self.timeout = timeout
+        # Intervalo mínimo entre requisições ao mesmo host (0 = sem limite)
+        self.min_interval = min_interval
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        # host -> instante (time.monotonic) liberado para a próxima requisição
+        self.next_request = {}
+    
+    def transient_errors(self):
+        return (TransientDownloadError, requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError)
+    
+    def wait_turn(self, url):
+        """Aguarda a vez do host, respeitando min_interval entre requisições"""
+        if not self.min_interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            ready = max(now, self.next_request.get(host, 0.0))
+            self.next_request[host] = ready + self.min_interval
+        if ready > now:
+            time.sleep(ready - now)
+    
+    def retry_delay(self, attempt, error):
+        """Espera antes da próxima tentativa: Retry-After do servidor ou backoff exponencial com jitter"""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.8, 1.2)
+    
+    def check_status(self, response):
+        """Levanta TransientDownloadError para 429/5xx e HTTPError para os demais erros"""
+        if response.status_code in self.RETRY_STATUS:
+            retry_after = response.headers.get('Retry-After')
+            raise TransientDownloadError(f"HTTP {response.status_code}",
+                                         float(retry_after) if retry_after and retry_after.isdigit() else None)
+        response.raise_for_status()
+    
+    def head(self, url):
+        """HEAD com as mesmas novas tentativas do GET; retorna a resposta"""
+        for attempt in range(self.retries + 1):
+            self.wait_turn(url)
+            try:
+                response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+                if response.status_code not in (405, 501):
+                    self.check_status(response)
+                return response
+            except self.transient_errors() as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay(attempt, e)
+                logging.warning(f"Falha temporária no HEAD de {url} ({e}); nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
+    
+    def fetch(self, url, headers=None, path=None):
+        """GET com novas tentativas; o corpo vai para path (se informado) ou para a memória
+        
+        Retorna um dicionário com status, headers (da resposta completa), content (None com
+        path ou 304), size, sha256 e attempts.
+        """
+        headers = dict(headers or {})
+        sink = open(path, 'wb') if path else BytesIO()
+        digest = hashlib.sha256()
+        received = 0
+        first_headers = None
+        try:
+            for attempt in range(self.retries + 1):
+                request_headers = dict(headers)
+                if received:
+                    # Retomar do byte já recebido, desde que o arquivo no servidor seja o mesmo
+                    request_headers.pop('If-None-Match', None)
+                    request_headers.pop('If-Modified-Since', None)
+                    request_headers['Range'] = f'bytes={received}-'
+                    validator = first_headers.get('ETag') or first_headers.get('Last-Modified')
+                    if validator:
+                        request_headers['If-Range'] = validator
+                
+                self.wait_turn(url)
+                try:
+                    with self.session.get(url, headers=request_headers, timeout=self.timeout, stream=True) as response:
+                        if response.status_code == 304:
+                            return {'status': 304, 'headers': response.headers, 'content': None, 'size': 0,
+                                    'sha256': None, 'attempts': attempt + 1}
+                        self.check_status(response)
+                        
+                        content_range = response.headers.get('Content-Range', '')
+                        if received and not (response.status_code == 206
+                                             and content_range.startswith(f'bytes {received}-')):
+                            # Range ignorado ou arquivo alterado no servidor: recomeçar do zero
+                            logging.info(f"{url}: servidor não retomou o download; recomeçando")
+                            sink.seek(0)
+                            sink.truncate()
+                            digest = hashlib.sha256()
+                            received = 0
+                        if not received:
+                            first_headers = response.headers
+                        
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            sink.write(chunk)
+                            digest.update(chunk)
+                            received += len(chunk)
+                        
+                        # Conexão encerrada antes do fim do corpo (só verificável sem compressão)
+                        length = first_headers.get('Content-Length')
+                        if (length and length.isdigit() and 'Content-Encoding' not in first_headers
+                                and received < int(length)):
+                            raise TransientDownloadError(f"corpo incompleto ({received} de {length} bytes)")
+                    
+                    return {'status': 200, 'headers': first_headers,
+                            'content': None if path else sink.getvalue(), 'size': received,
+                            'sha256': digest.hexdigest(), 'attempts': attempt + 1}
+                except self.transient_errors() as e:
+                    if attempt == self.retries:
+                        raise
+                    # Corpos comprimidos não podem ser retomados pelo deslocamento em bytes
+                    if received and first_headers is not None and 'Content-Encoding' in first_headers:
+                        sink.seek(0)
+                        sink.truncate()
+                        digest = hashlib.sha256()
+                        received = 0
+                    delay = self.retry_delay(attempt, e)
+                    resume = f", retomando do byte {received}" if received else ""
+                    logging.warning(f"Falha temporária em {url} ({e}); tentativa {attempt + 2} de "
+                                    f"{self.retries + 1} em {delay:.1f}s{resume}")
+                    time.sleep(delay)
+        finally:
+            sink.close()
+
+
+class RecordIndex:
+    """Identifica cada registro das listas por REGISTRO + CONCENTRAÇÃO + FORMA FARMACÊUTICA"""
+    
+    # Colunas que identificam um registro nas listas
+    KEY_COLUMNS = ('REGISTRO', 'CONCENTRAÇÃO', 'FORMA FARMACÊUTICA')
+    
+    def row_hash(self, values):
+        """Hash curto do conteúdo completo de uma linha"""
+        return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=8).hexdigest()
+    
+    def key_positions(self, columns, name):
+        """Posições das colunas-chave, ou None se alguma estiver ausente"""
+        try:
+            return [columns.index(col) for col in self.KEY_COLUMNS]
+        except ValueError:
+            logging.warning(f"Colunas-chave ausentes em '{name}'; lista ignorada")
+            return None
+    
+    def iter_records(self, positions, rows):
+        """Gera (chave, hash, valores) de cada linha, com os valores como texto"""
+        occurrences = {}
+        for row in rows:
+            values = ['' if value is None or pd.isna(value) else str(value) for value in row]
+            key = '\x1f'.join(values[position] for position in positions)
+            
+            # Chaves repetidas na mesma lista são numeradas pela ordem em que aparecem
+            count = occurrences.get(key, 0)
+            occurrences[key] = count + 1
+            if count:
+                key = f"{key}\x1f{count}"
+            
+            yield key, self.row_hash(values), values
+    
+    def record_key(self, key):
+        """Converte uma chave do índice nas colunas que a compõem (sem o número da ocorrência)"""
+        return dict(zip(self.KEY_COLUMNS, key.split('\x1f')))
+    
+    def base_key(self, key):
+        """Chave do índice sem o número da ocorrência"""
+        return '\x1f'.join(key.split('\x1f')[:len(self.KEY_COLUMNS)])
+
+
+class SnapshotDiff(RecordIndex):
+    """Compara a execução atual com a anterior por um índice compacto (chave do registro -> hash da linha)"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.json')
+        self.previous = self.load_index()
+        # Índices e diferenças desta execução, por nome do arquivo combinado
+        self.current = {}
+        self.changes = {}
+    
+    def load_index(self):
+        """Carrega o índice da execução anterior (None se não houver)"""
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def compare(self, name, columns, rows):
+        """Indexa as linhas de uma lista e registra o que mudou em relação ao índice anterior
+        
+        Cada linha é comparada com o índice anterior por busca no dicionário (O(n)),
+        sem juntar os dois conjuntos de dados.
+        """
+        positions = self.key_positions(columns, name)
+        if positions is None:
+            return
+        
+        previous = (self.previous or {}).get('lists', {}).get(name, {})
+        index = {}
+        added = {}
+        modified = []
+        
+        for key, digest, values in self.iter_records(positions, rows):
+            index[key] = digest
+            old_digest = previous.get(key)
+            if old_digest is None:
+                added[key] = dict(zip(columns, values))
+            elif old_digest != digest:
+                modified.append(dict(zip(columns, values)))
+        
+        self.current[name] = index
+        self.changes[name] = {
+            'added': added,
+            'modified': modified,
+            'removed': [key for key in previous if key not in index],
+        }
+    
+    def save(self, included, excluded):
+        """Grava o novo índice e, se algo mudou desde a execução anterior, o changeset; retorna seu caminho"""
+        generated_at = datetime.now().isoformat(timespec='seconds')
+        changeset_path = None
+        
+        if self.previous is None:
+            logging.info("Índice inicial criado; o changeset será gerado a partir da próxima execução")
+        elif not any(changes['added'] or changes['modified'] or changes['removed']
+                     for changes in self.changes.values()):
+            logging.info("Nenhuma alteração desde a execução anterior; changeset não gerado")
+        else:
+            # Registros que saíram dos incluídos e entraram nos excluídos
+            new_excluded = self.changes.get(excluded, {}).get('added', {})
+            new_excluded_keys = {}
+            for key in new_excluded:
+                new_excluded_keys.setdefault(self.base_key(key), key)
+            
+            moved = set()
+            moved_records = []
+            for key in self.changes.get(included, {}).get('removed', []):
+                excluded_key = new_excluded_keys.pop(self.base_key(key), None)
+                if excluded_key is not None:
+                    moved.add(key)
+                    moved_records.append(new_excluded.pop(excluded_key))
+            
+            changeset = {
+                'generated_at': generated_at,
+                'previous_run': self.previous.get('generated_at'),
+                'moved_to_excluded': moved_records,
+            }
+            for name, changes in self.changes.items():
+                changeset[name] = {
+                    'added': list(changes['added'].values()),
+                    'modified': changes['modified'],
+                    'removed': [self.record_key(key) for key in changes['removed'] if key not in moved],
+                }
+            
+            changeset_path = os.path.join(
+                self.directory, f"changeset_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+            with open(changeset_path, 'w', encoding='utf-8') as f:
+                json.dump(changeset, f, ensure_ascii=False, indent=1)
+            
+            summary = ', '.join(
+                f"{name}: +{len(changes['added'])} ~{len(changes['modified'])} -{len(changes['removed'])}"
+                for name, changes in changeset.items() if isinstance(changes, dict))
+            logging.info(f"Changeset '{changeset_path}' salvo ({summary}; "
+                         f"{len(changeset['moved_to_excluded'])} movidos para excluídos)")
+        
+        # Listas que não foram processadas nesta execução mantêm o índice anterior
+        lists = dict((self.previous or {}).get('lists', {}))
+        lists.update(self.current)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'generated_at': generated_at, 'lists': lists}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+        return changeset_path
+
+
+class SQLiteStore(RecordIndex):
+    """Armazena as listas em SQLite: estado atual, versões anteriores e histórico de execuções"""
+    
+    # Colunas padronizadas -> colunas das tabelas
+    COLUMNS = {
+        'FÁRMACO': 'farmaco',
+        'DETENTOR': 'detentor',
+        'MEDICAMENTO': 'medicamento',
+        'REGISTRO': 'registro',
+        'CONCENTRAÇÃO': 'concentracao',
+        'FORMA FARMACÊUTICA': 'forma_farmaceutica',
+        'DATA INCLUSÃO': 'data',
+        'DATA DE EXCLUSÃO': 'data',
+        'MOTIVO DA EXCLUSÃO': 'motivo',
+    }
+    FIELDS = ['farmaco', 'detentor', 'medicamento', 'registro', 'concentracao',
+              'forma_farmaceutica', 'data', 'data_iso', 'motivo']
+    
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.create_schema()
+    
+    def create_schema(self):
+        """Cria as tabelas e os índices, se ainda não existirem"""
+        fields = ', '.join(f'{field} TEXT' for field in self.FIELDS)
+        with self.connection:
+            self.connection.executescript(f"""
+                CREATE TABLE IF NOT EXISTS execucoes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    executado_em TEXT NOT NULL,
+                    registros INTEGER DEFAULT 0,
+                    inseridos INTEGER DEFAULT 0,
+                    alterados INTEGER DEFAULT 0,
+                    removidos INTEGER DEFAULT 0
+                );
+                -- Estado atual de cada lista
+                CREATE TABLE IF NOT EXISTS registros (
+                    lista TEXT NOT NULL, chave TEXT NOT NULL, hash TEXT NOT NULL, {fields},
+                    execucao INTEGER NOT NULL REFERENCES execucoes(id),
+                    PRIMARY KEY (lista, chave)
+                );
+                -- Todas as versões: válida de desde (inclusive) até ate (exclusive, NULL = vigente)
+                CREATE TABLE IF NOT EXISTS historico (
+                    lista TEXT NOT NULL, chave TEXT NOT NULL, hash TEXT NOT NULL, {fields},
+                    desde INTEGER NOT NULL REFERENCES execucoes(id),
+                    ate INTEGER REFERENCES execucoes(id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_registros_registro ON registros(registro);
+                CREATE INDEX IF NOT EXISTS idx_registros_farmaco ON registros(farmaco);
+                CREATE INDEX IF NOT EXISTS idx_registros_detentor ON registros(detentor);
+                CREATE INDEX IF NOT EXISTS idx_historico_chave ON historico(lista, chave, ate);
+                CREATE INDEX IF NOT EXISTS idx_historico_registro ON historico(registro, desde);
+                CREATE INDEX IF NOT EXISTS idx_historico_farmaco ON historico(farmaco, desde);
+                CREATE INDEX IF NOT EXISTS idx_historico_detentor ON historico(detentor, desde);
+            """)
+    
+    def record_fields(self, columns, values):
+        """Valores da linha na ordem de FIELDS (data_iso: data em AAAA-MM-DD, se válida)"""
+        record = dict.fromkeys(self.FIELDS)
+        for column, value in zip(columns, values):
+            field = self.COLUMNS.get(column)
+            if field:
+                record[field] = value
+        match = re.fullmatch(r'(\d{2})\.(\d{2})\.(\d{4})', record['data'] or '')
+        if match:
+            record['data_iso'] = f"{match.group(3)}-{match.group(2)}-{match.group(1)}"
+        return [record[field] for field in self.FIELDS]
+    
+    def save_run(self, lists):
+        """Aplica as linhas de cada lista (nome, colunas, linhas) em uma única transação
+        
+        Só as linhas novas ou alteradas (pelo hash) são gravadas, em lotes de
+        batch_size; as removidas saem do estado atual e têm a versão encerrada.
+        Retorna o id da execução.
+        """
+        fields = ', '.join(self.FIELDS)
+        placeholders = ', '.join('?' * (len(self.FIELDS) + 4))
+        updates = ', '.join(f'{field} = excluded.{field}' for field in ['hash'] + self.FIELDS + ['execucao'])
+        upsert_sql = (f"INSERT INTO registros (lista, chave, hash, {fields}, execucao) VALUES ({placeholders}) "
+                      f"ON CONFLICT (lista, chave) DO UPDATE SET {updates}")
+        history_sql = f"INSERT INTO historico (lista, chave, hash, {fields}, desde) VALUES ({placeholders})"
+        close_sql = "UPDATE historico SET ate = ? WHERE lista = ? AND chave = ? AND ate IS NULL"
+        
+        totals = {'registros': 0, 'inseridos': 0, 'alterados': 0, 'removidos': 0}
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO execucoes (executado_em) VALUES (?)",
+                (datetime.now().isoformat(timespec='seconds'),)).lastrowid
+            
+            def flush(batch, closed):
+                self.connection.executemany(close_sql, closed)
+                self.connection.executemany(upsert_sql, batch)
+                self.connection.executemany(history_sql, batch)
+                batch.clear()
+                closed.clear()
+            
+            for name, columns, rows in lists:
+                positions = self.key_positions(columns, name)
+                if positions is None:
+                    continue
+                current = dict(self.connection.execute(
+                    "SELECT chave, hash FROM registros WHERE lista = ?", (name,)))
+                seen = set()
+                batch, closed = [], []
+                
+                for key, digest, values in self.iter_records(positions, rows):
+                    seen.add(key)
+                    totals['registros'] += 1
+                    old_digest = current.get(key)
+                    if old_digest == digest:
+                        continue
+                    if old_digest is None:
+                        totals['inseridos'] += 1
+                    else:
+                        totals['alterados'] += 1
+                        closed.append((run_id, name, key))
+                    batch.append((name, key, digest, *self.record_fields(columns, values), run_id))
+                    if len(batch) >= self.batch_size:
+                        flush(batch, closed)
+                flush(batch, closed)
+                
+                removed = [(name, key) for key in current if key not in seen]
+                totals['removidos'] += len(removed)
+                self.connection.executemany("DELETE FROM registros WHERE lista = ? AND chave = ?", removed)
+                self.connection.executemany(close_sql, [(run_id, name, key) for name, key in removed])
+            
+            self.connection.execute(
+                "UPDATE execucoes SET registros = ?, inseridos = ?, alterados = ?, removidos = ? WHERE id = ?",
+                (totals['registros'], totals['inseridos'], totals['alterados'], totals['removidos'], run_id))
+        
+        logging.info(f"SQLite '{self.path}': execução {run_id} com {totals['inseridos']} inseridos, "
+                     f"{totals['alterados']} alterados e {totals['removidos']} removidos")
+        return run_id
+    
+    def run_as_of(self, as_of):
+        """Id da última execução até a data/hora indicada (AAAA-MM-DD inclui o dia inteiro)"""
+        if isinstance(as_of, datetime):
+            as_of = as_of.isoformat(timespec='seconds')
+        elif len(as_of) == 10:
+            as_of = f"{as_of}T23:59:59"
+        row = self.connection.execute("SELECT MAX(id) FROM execucoes WHERE executado_em <= ?", (as_of,)).fetchone()
+        return row[0]
+    
+    def lookup(self, registro=None, farmaco=None, detentor=None, lista=None, as_of=None):
+        """Busca registros pelos campos indexados, no estado atual ou como estavam em as_of"""
+        conditions = []
+        params = []
+        for field, value in (('registro', registro), ('farmaco', farmaco), ('detentor', detentor), ('lista', lista)):
+            if value is not None:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+        
+        if as_of is None:
+            table = 'registros'
+        else:
+            run_id = self.run_as_of(as_of)
+            if run_id is None:
+                return []
+            table = 'historico'
+            conditions.append("desde <= ? AND (ate IS NULL OR ate > ?)")
+            params.extend([run_id, run_id])
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(f"SELECT lista, {', '.join(self.FIELDS)} FROM {table}{where}", params)
+        return [dict(row) for row in rows]
+    
+    def runs(self):
+        """Histórico de execuções, da mais recente para a mais antiga"""
+        return [dict(row) for row in self.connection.execute("SELECT * FROM execucoes ORDER BY id DESC")]
+    
+    def close(self):
+        self.connection.close()
+
+
+class ReferenceLookup:
+    """Índice em memória das listas para consultas rápidas (registro, prefixo do fármaco, associações)"""
+    
+    FIELDS = ('SITUAÇÃO', 'FÁRMACO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO', 'CONCENTRAÇÃO',
+              'FORMA FARMACÊUTICA', 'DATA INCLUSÃO', 'DATA DE EXCLUSÃO', 'MOTIVO DA EXCLUSÃO')
+    SNAPSHOT_VERSION = 1
+    
+    def __init__(self, frames=None):
+        # Registros como tuplas na ordem de FIELDS; os índices guardam as posições na lista
+        self.records = []
+        # REGISTRO (só dígitos) -> posições
+        self.by_registro = {}
+        # FÁRMACO normalizado em ordem alfabética (busca por prefixo com bisect) e posições correspondentes
+        self.farmaco_names = []
+        self.farmaco_positions = []
+        # Componente da associação normalizado ("x + y" -> "x", "y") -> posições
+        self.components = {}
+        # Componentes em ordem alfabética unidos por " + " -> posições (associação exata)
+        self.associations = {}
+        if frames:
+            for name, df in frames.items():
+                self.add_rows(name, list(df.columns), df.itertuples(index=False, name=None))
+            self.build()
+    
+    def normalize_text(self, text):
+        """Minúsculas, sem acentos e com os espaços colapsados"""
+        text = unicodedata.normalize('NFKD', str(text))
+        return ' '.join(''.join(char for char in text if not unicodedata.combining(char)).lower().split())
+    
+    def normalize_registro(self, registro):
+        """Apenas os dígitos do número de registro"""
+        return re.sub(r'\D', '', str(registro))
+    
+    def split_components(self, farmaco):
+        """Componentes normalizados de um fármaco ou associação ("X + Y")"""
+        return frozenset(part for part in (self.normalize_text(part) for part in str(farmaco).split('+')) if part)
+    
+    def association_key(self, components):
+        """Chave da associação independente da ordem dos componentes"""
+        return ' + '.join(sorted(components))
+    
+    def add_rows(self, name, columns, rows, excluded=None):
+        """Acrescenta as linhas de uma lista; a situação vem do registro das fontes (chame build() depois)"""
+        if excluded is None:
+            excluded = is_excluded_list(name)
+        status = 'excluído' if excluded else 'incluído'
+        positions = [columns.index(field) if field in columns else None for field in self.FIELDS[1:]]
+        for row in rows:
+            values = ['' if position is None or pd.isna(row[position]) else str(row[position])
+                      for position in positions]
+            self.records.append((status, *values))
+    
+    def build(self):
+        """(Re)constrói os índices a partir de self.records"""
+        self.by_registro = {}
+        self.components = {}
+        self.associations = {}
+        farmaco_index = []
+        for position, record in enumerate(self.records):
+            self.by_registro.setdefault(self.normalize_registro(record[4]), []).append(position)
+            farmaco_index.append((self.normalize_text(record[1]), position))
+            components = self.split_components(record[1])
+            self.associations.setdefault(self.association_key(components), []).append(position)
+            for component in components:
+                self.components.setdefault(component, []).append(position)
+        farmaco_index.sort()
+        self.farmaco_names = [name for name, _ in farmaco_index]
+        self.farmaco_positions = [position for _, position in farmaco_index]
+    
+    def record(self, position):
+        """Registro como dicionário"""
+        return dict(zip(self.FIELDS, self.records[position]))
+    
+    def lookup(self, registro):
+        """Registros com o número de registro indicado (com ou sem pontuação)"""
+        return [self.record(position) for position in self.by_registro.get(self.normalize_registro(registro), ())]
+    
+    def status(self, registro):
+        """'incluído' se alguma apresentação do registro estiver na lista vigente, 'excluído' ou None"""
+        statuses = {self.records[position][0] for position in self.by_registro.get(self.normalize_registro(registro), ())}
+        if 'incluído' in statuses:
+            return 'incluído'
+        return 'excluído' if statuses else None
+    
+    def is_reference(self, registro):
+        """Verifica se o registro é de um medicamento de referência vigente"""
+        return self.status(registro) == 'incluído'
+    
+    def search_farmaco(self, prefix, limit=None):
+        """Registros cujo FÁRMACO normalizado começa com o prefixo, em ordem alfabética"""
+        prefix = self.normalize_text(prefix)
+        index = bisect.bisect_left(self.farmaco_names, prefix)
+        results = []
+        while index < len(self.farmaco_names) and self.farmaco_names[index].startswith(prefix):
+            if limit is not None and len(results) >= limit:
+                break
+            results.append(self.record(self.farmaco_positions[index]))
+            index += 1
+        return results
+    
+    def match_association(self, farmaco, partial=False):
+        """Registros com os mesmos componentes da associação em qualquer ordem
+        
+        Com partial=True, basta que o registro contenha todos os componentes informados.
+        """
+        components = self.split_components(farmaco)
+        if not components:
+            return []
+        if not partial:
+            return [self.record(position) for position in self.associations.get(self.association_key(components), ())]
+        
+        # Interseção das listas de posições do índice invertido, começando pela menor
+        postings = sorted((self.components.get(component, ()) for component in components), key=len)
+        positions = set(postings[0]).intersection(*postings[1:])
+        return [self.record(position) for position in sorted(positions)]
+    
+    def save(self, path):
+        """Grava um snapshot compacto (registros e índices prontos) em JSON"""
+        snapshot = {
+            'version': self.SNAPSHOT_VERSION,
+            'fields': self.FIELDS,
+            'records': self.records,
+            'by_registro': self.by_registro,
+            'farmaco_names': self.farmaco_names,
+            'farmaco_positions': self.farmaco_positions,
+            'components': self.components,
+            'associations': self.associations,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    
+    def load(self, path):
+        """Carrega um snapshot gravado por save(), sem reconstruir os índices"""
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != self.SNAPSHOT_VERSION or tuple(snapshot['fields']) != self.FIELDS:
+            raise ValueError(f"Snapshot incompatível: {path}")
+        # Registros ficam como listas: mesma leitura que as tuplas, sem o custo da conversão
+        self.records = snapshot['records']
+        self.by_registro = snapshot['by_registro']
+        self.farmaco_names = snapshot['farmaco_names']
+        self.farmaco_positions = snapshot['farmaco_positions']
+        self.components = snapshot['components']
+        self.associations = snapshot['associations']
+        return self
+
+
+class CatalogMatcher:
+    """Associa itens de um catálogo (fármaco, concentração, forma) aos registros das listas
+    
+    Fármacos são canonizados: sem acentos, sem sais, hidratos e contraíons, e com os
+    componentes da associação em ordem alfabética. Concentrações viram números em mg e mL.
+    Registros iguais nesses três campos formam um grupo, e cada item só é comparado aos
+    grupos com a mesma associação ou que compartilham um token do fármaco (blocagem).
+    Itens repetidos no catálogo são comparados uma única vez, em lotes que podem rodar
+    em vários processos.
+    """
+    
+    # Sais, hidratos e contraíons descartados na forma canônica (texto já sem acentos)
+    SALT_WORDS = frozenset("""
+        cloridrato dicloridrato bromidrato maleato dimaleato mesilato besilato succinato fumarato hemifumarato
+        tartarato bitartarato sulfato acetato citrato fosfato valerato propionato dipropionato furoato
+        pamoato embonato estearato lactato gluconato hiclato nitrato tosilato cipionato decanoato enantato
+        sodica sodico dissodica dissodico monossodica monossodico trissodica potassica potassico
+        calcica calcico magnesica magnesico sodio potassio calcio magnesio anidra anidro
+    """.split())
+    HYDRATE = re.compile(r'\b(?:mono|di|tri|tetra|penta|hexa|hemi|sesqui)?-?h?idratad[oa]s?\b')
+    STOPWORDS = frozenset(['de', 'da', 'do', 'das', 'dos', 'com', 'para', 'em'])
+    # Separadores dos componentes de uma associação
+    COMPONENT_SEPARATOR = re.compile(r'\s*[+/;]\s*|\s+e\s+')
+    # Abreviações comuns de formas farmacêuticas em catálogos
+    FORM_ABBREVIATIONS = {
+        'comp': 'comprimido', 'cpr': 'comprimido', 'cp': 'comprimido', 'rev': 'revestido',
+        'cap': 'capsula', 'caps': 'capsula', 'sol': 'solucao', 'susp': 'suspensao', 'inj': 'injetavel',
+        'xpe': 'xarope', 'pom': 'pomada', 'cr': 'creme', 'gts': 'gota', 'or': 'oral', 'liof': 'liofilizado',
+        'ef': 'efervescente', 'eferv': 'efervescente', 'mast': 'mastigavel', 'lib': 'liberacao',
+        'prol': 'prolongada', 'dur': 'dura', 'gel': 'gel',
+    }
+    # Concentração: número, unidade e, opcionalmente, /quantidade unidade (ex.: 250 mg/5 mL)
+    STRENGTH = re.compile(r'(\d+(?:[.,]\d+)*)\s*(mcg|ug|µg|μg|mg|g|ui|u|meq|mmol|%|ml|l)(?![a-z])'
+                          r'(?:\s*/\s*(\d+(?:[.,]\d+)*)?\s*(ml|l|g|mg|dose|gota|gotas|comprimido|h)(?![a-z]))?')
+    # Fator para a unidade comum (massa em mg, volume em mL)
+    UNIT_FACTORS = {'mcg': ('mg', 0.001), 'ug': ('mg', 0.001), 'µg': ('mg', 0.001), 'μg': ('mg', 0.001),
+                    'mg': ('mg', 1.0), 'g': ('mg', 1000.0), 'l': ('ml', 1000.0), 'ml': ('ml', 1.0),
+                    'u': ('ui', 1.0), 'gotas': ('gota', 1.0)}
+    # Pesos da pontuação (fármaco, concentração, forma)
+    WEIGHTS = (0.5, 0.3, 0.2)
+    # Tokens presentes em mais que esta fração dos grupos não servem para a blocagem
+    MAX_TOKEN_SHARE = 0.2
+    
+    def __init__(self, lookup, min_score=0.8):
+        # Registros das listas (ReferenceLookup já construído ou carregado de um snapshot)
+        self.lookup = lookup
+        self.min_score = min_score
+        # Caches das formas canônicas (catálogos repetem muito os mesmos textos)
+        self.ingredient_cache = {}
+        self.strength_cache = {}
+        self.form_cache = {}
+        self.build()
+    
+    def normalize(self, text):
+        """Minúsculas, sem acentos e com os espaços colapsados"""
+        return self.lookup.normalize_text(text)
+    
+    def canonical_component(self, component):
+        """(nome sem sais, palavras do nome completo em ordem alfabética) de um componente já normalizado"""
+        component = self.HYDRATE.sub(' ', component)
+        words = [word for word in re.split(r'[^a-z0-9]+', component) if word and word not in self.STOPWORDS]
+        base = [word for word in words if word not in self.SALT_WORDS]
+        # Componentes que são só sal (ex.: acetato de cálcio) ficam como estão
+        return ' '.join(base or words), ' '.join(sorted(words))
+    
+    def canonical_ingredients(self, farmaco):
+        """(componentes sem sais, componentes completos), ambos em ordem alfabética"""
+        result = self.ingredient_cache.get(farmaco)
+        if result is None:
+            components = [self.canonical_component(part)
+                          for part in self.COMPONENT_SEPARATOR.split(self.normalize(farmaco)) if part.strip()]
+            components = [component for component in components if component[0]]
+            result = (tuple(sorted(base for base, _ in components)), tuple(sorted(full for _, full in components)))
+            self.ingredient_cache[farmaco] = result
+        return result
+    
+    def parse_number(self, text):
+        """Número no formato brasileiro (1.000,5) ou com ponto decimal (2.5)"""
+        if ',' in text:
+            return float(text.replace('.', '').replace(',', '.'))
+        if re.fullmatch(r'[1-9]\d{0,2}(?:\.\d{3})+', text):
+            return float(text.replace('.', ''))
+        return float(text)
+    
+    def parse_strengths(self, concentracao):
+        """Concentrações como (valor, unidade) em unidades comuns, em ordem (ex.: 500 mg + 125 mg)"""
+        result = self.strength_cache.get(concentracao)
+        if result is None:
+            strengths = []
+            for number, unit, amount, per in self.STRENGTH.findall(self.normalize(concentracao)):
+                try:
+                    value = self.parse_number(number)
+                    unit, factor = self.UNIT_FACTORS.get(unit, (unit, 1.0))
+                    value *= factor
+                    if per:
+                        per, factor = self.UNIT_FACTORS.get(per, (per, 1.0))
+                        value /= (self.parse_number(amount) if amount else 1.0) * factor
+                        unit = f'{unit}/{per}'
+                except (ValueError, ZeroDivisionError):
+                    continue
+                strengths.append((float(f'{value:.6g}'), unit))
+            result = tuple(sorted(strengths))
+            self.strength_cache[concentracao] = result
+        return result
+    
+    def canonical_form(self, forma):
+        """Tokens da forma farmacêutica sem abreviações, plurais e preposições"""
+        result = self.form_cache.get(forma)
+        if result is None:
+            tokens = []
+            for word in re.split(r'[^a-z0-9]+', self.normalize(forma)):
+                if not word or word in self.STOPWORDS:
+                    continue
+                word = self.FORM_ABBREVIATIONS.get(word, word)
+                tokens.append(word[:-1] if len(word) > 4 and word.endswith('s') else word)
+            result = tuple(tokens)
+            self.form_cache[forma] = result
+        return result
+    
+    def build(self):
+        """Agrupa os registros por fármaco, concentração e forma canônicos e monta os índices"""
+        groups = {}
+        for position, record in enumerate(self.lookup.records):
+            key = (self.canonical_ingredients(record[1])[0], self.parse_strengths(record[5]),
+                   self.canonical_form(record[6]))
+            groups.setdefault(key, []).append(position)
+        
+        # Em cada grupo, o registro de referência preferido é o primeiro incluído
+        self.groups = list(groups)
+        self.group_records = [min(positions, key=lambda position: self.lookup.records[position][0] != 'incluído')
+                              for positions in groups.values()]
+        self.group_sizes = [len(positions) for positions in groups.values()]
+        self.group_full = [self.canonical_ingredients(self.lookup.records[position][1])[1]
+                           for position in self.group_records]
+        self.group_tokens = [frozenset(' '.join(ingredients).split()) for ingredients, _, _ in self.groups]
+        
+        # Blocagem: associação exata -> grupos e token do fármaco -> grupos
+        self.by_ingredients = {}
+        self.by_token = {}
+        for group, (ingredients, _, _) in enumerate(self.groups):
+            self.by_ingredients.setdefault(ingredients, []).append(group)
+            for token in self.group_tokens[group]:
+                self.by_token.setdefault(token, []).append(group)
+        self.max_token_groups = max(1, int(len(self.groups) * self.MAX_TOKEN_SHARE))
+    
+    def candidates(self, ingredients):
+        """Grupos comparáveis: mesma associação ou, sem ela, com tokens do fármaco em comum"""
+        groups = self.by_ingredients.get(ingredients)
+        if groups:
+            return groups
+        tokens = set(' '.join(ingredients).split())
+        postings = [self.by_token[token] for token in tokens if token in self.by_token]
+        # Tokens muito frequentes (ex.: acido) só contam se forem os únicos disponíveis
+        selective = [posting for posting in postings if len(posting) <= self.max_token_groups]
+        candidates = set()
+        for posting in selective or postings:
+            candidates.update(posting)
+        return candidates
+    
+    def score_form(self, form, group_form):
+        """1 para a mesma forma, 0,7+ para a mesma forma base (ex.: comprimido/comprimido revestido)"""
+        if form == group_form:
+            return 1.0
+        if not form or not group_form:
+            return 0.5
+        tokens, group_tokens = set(form), set(group_form)
+        overlap = len(tokens & group_tokens) / len(tokens | group_tokens)
+        if form[0] == group_form[0]:
+            return 0.7 + 0.3 * overlap
+        return 0.5 * overlap
+    
+    def match(self, farmaco, concentracao='', forma=''):
+        """Melhor grupo para um item: (registro, pontuação, nível) ou None abaixo de min_score"""
+        ingredients, full = self.canonical_ingredients(farmaco)
+        if not ingredients:
+            return None
+        strengths = self.parse_strengths(concentracao)
+        form = self.canonical_form(forma)
+        tokens = frozenset(' '.join(ingredients).split())
+        weight_ingredient, weight_strength, weight_form = self.WEIGHTS
+        
+        best = None
+        for group in self.candidates(ingredients):
+            group_ingredients, group_strengths, group_form = self.groups[group]
+            if group_ingredients == ingredients:
+                # Mesmo fármaco; o sal idêntico desempata
+                ingredient_score = 1.0 if self.group_full[group] == full else 0.95
+            else:
+                group_tokens = self.group_tokens[group]
+                ingredient_score = 0.9 * len(tokens & group_tokens) / len(tokens | group_tokens)
+            if not strengths or not group_strengths:
+                strength_score = 0.5
+            else:
+                strength_score = 1.0 if strengths == group_strengths else 0.0
+            form_score = self.score_form(form, group_form)
+            score = weight_ingredient * ingredient_score + weight_strength * strength_score + weight_form * form_score
+            if best is None or score > best[1]:
+                best = (group, score, ingredient_score >= 0.95 and strength_score == 1.0 and form_score == 1.0)
+        
+        if best is None or best[1] < self.min_score:
+            return None
+        group, score, exact = best
+        return self.group_records[group], round(score, 3), 'exato' if exact else 'aproximado'
+    
+    def match_batch(self, items):
+        """match() de cada (fármaco, concentração, forma) do lote"""
+        return [self.match(*item) for item in items]
+    
+    def match_frame(self, catalog, farmaco='FÁRMACO', concentracao='CONCENTRAÇÃO', forma='FORMA FARMACÊUTICA',
+                    workers=1, batch_size=5000):
+        """Acrescenta ao catálogo as colunas do registro correspondente, da pontuação e do nível
+        
+        Só as combinações distintas de fármaco, concentração e forma são comparadas; com
+        workers > 1 os lotes rodam em processos que recebem o índice uma única vez.
+        """
+        columns = [catalog[column].fillna('').astype(str) if column in catalog.columns
+                   else pd.Series('', index=catalog.index) for column in (farmaco, concentracao, forma)]
+        keys = list(zip(*columns))
+        unique = list(dict.fromkeys(keys))
+        batches = [unique[start:start + batch_size] for start in range(0, len(unique), batch_size)]
+        
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_matcher_worker,
+                                     initargs=(self,)) as executor:
+                results = [result for batch in executor.map(_match_batch, batches) for result in batch]
+        else:
+            results = [result for batch in batches for result in self.match_batch(batch)]
+        matches = dict(zip(unique, results))
+        
+        fields = ['FÁRMACO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO', 'CONCENTRAÇÃO', 'FORMA FARMACÊUTICA', 'SITUAÇÃO']
+        positions = [self.lookup.FIELDS.index(field) for field in fields]
+        output = {f'{field} REFERÊNCIA': [] for field in fields}
+        output['PONTUAÇÃO'] = []
+        output['NÍVEL'] = []
+        for key in keys:
+            found = matches[key]
+            record = self.lookup.records[found[0]] if found else None
+            for field, position in zip(fields, positions):
+                output[f'{field} REFERÊNCIA'].append(record[position] if record else '')
+            output['PONTUAÇÃO'].append(found[1] if found else None)
+            output['NÍVEL'].append(found[2] if found else '')
+        
+        result = catalog.copy()
+        for column, values in output.items():
+            result[column] = values
+        logging.info(f"Catálogo: {sum(1 for key in keys if matches[key])} de {len(keys)} itens associados "
+                     f"({len(unique)} combinações distintas, {len(self.groups)} grupos de referência)")
+        return result
+
+
+class HeaderDetector:
+    """Detecta linhas de cabeçalho pela quantidade de palavras-chave presentes no texto"""
+    
+    def __init__(self, keywords, min_matches=3, max_page_row=None, min_cells=None):
+        # Palavras-chave já em maiúsculas; a busca com `in` é feita em C e, com
+        # parada antecipada, é mais rápida que uma regex de alternação equivalente
+        self.keywords = tuple(keyword.upper() for keyword in keywords)
+        self.min_matches = min_matches
+        # Heurísticas opcionais: cabeçalhos só no topo da página e com várias células preenchidas
+        self.max_page_row = max_page_row
+        self.min_cells = min_cells
+    
+    def is_header(self, row, page_row=None):
+        """Verifica se a linha contém ao menos min_matches palavras-chave distintas"""
+        if not row:
+            return False
+        if self.max_page_row is not None and page_row is not None and page_row > self.max_page_row:
+            return False
+        if self.min_cells is not None and sum(1 for cell in row if cell) < self.min_cells:
+            return False
+        
+        row_text = ' '.join([str(cell) for cell in row if cell]).upper()
+        
+        found = 0
+        for keyword in self.keywords:
+            if keyword in row_text:
+                found += 1
+                if found >= self.min_matches:
+                    return True
+        return False
+
+
+class TableTemplate:
+    """Extrai as páginas de um PDF reaproveitando a grade de colunas da primeira tabela
+    
+    A grade (limites x das colunas) é aprendida na primeira página cuja tabela começa por um
+    cabeçalho. Nas páginas seguintes as bordas e os caracteres vêm direto dos objetos de
+    layout do pdfminer, sem a conversão completa do pdfplumber nem a busca de tabelas, e
+    cada caractere vai para a célula que contém seu centro, como em Table.extract. Páginas
+    fora do padrão (curvas, outras colunas, traços parciais, caractere sobre uma borda)
+    voltam para page.extract_table().
+    """
+    
+    # Configuração explícita da busca de tabelas (os padrões do pdfplumber)
+    TABLE_SETTINGS = {
+        'vertical_strategy': 'lines',
+        'horizontal_strategy': 'lines',
+        'snap_tolerance': 3,
+        'join_tolerance': 3,
+        'edge_min_length': 3,
+        'intersection_tolerance': 3,
+    }
+    # Diferença máxima entre as colunas da página e as aprendidas
+    COLUMN_TOLERANCE = 1.0
+    # Distância mínima entre o centro de um caractere e uma borda da grade
+    BORDER_MARGIN = 0.01
+    
+    def __init__(self, is_header):
+        self.is_header = is_header
+        self.columns = None
+        # Caminho usado na última página: 'aprendizado', 'modelo' ou 'fallback'
+        self.mode = None
+    
+    def extract_table(self, page):
+        """Extrai a tabela da página como page.extract_table()"""
+        if self.columns is None:
+            self.mode = 'aprendizado'
+            return self.learn(page)
+        
+        table = self.extract_fast(page) if page.pdf.laparams is None else None
+        if table is not None:
+            self.mode = 'modelo'
+            return table
+        self.mode = 'fallback'
+        return page.extract_table(self.TABLE_SETTINGS)
+    
+    def learn(self, page):
+        """Extrai a página pelo pdfplumber e guarda a grade se a tabela começar pelo cabeçalho"""
+        tables = page.find_tables(self.TABLE_SETTINGS)
+        if not tables:
+            return None
+        
+        # Mesma escolha de Page.find_table: a maior tabela, mais acima e mais à esquerda
+        table = sorted(tables, key=lambda t: (-len(t.cells), t.bbox[1], t.bbox[0]))[0]
+        rows = table.extract()
+        if rows and self.is_header(rows[0]) and all(None not in row.cells for row in table.rows):
+            self.columns = sorted({x for cell in table.cells for x in (cell[0], cell[2])})
+        return rows
+    
+    def layout_objects(self, page):
+        """Caracteres e bordas da página lidos do layout do pdfminer (None se houver curvas)"""
+        LTChar, LTContainer, LTCurve, LTLine, LTRect = (
+            pdfminer_layout.LTChar, pdfminer_layout.LTContainer, pdfminer_layout.LTCurve,
+            pdfminer_layout.LTLine, pdfminer_layout.LTRect)
+        height = page.height
+        initial_doctop = page.initial_doctop
+        chars = []
+        # Bordas como (posição, início, fim): verticais em x, horizontais em top
+        vertical = []
+        horizontal = []
+        
+        pending = [page.layout._objs]
+        while pending:
+            for obj in pending.pop():
+                if isinstance(obj, LTChar):
+                    top = height - obj.y1
+                    chars.append({'text': obj.get_text(), 'x0': obj.x0, 'x1': obj.x1, 'top': top,
+                                  'bottom': height - obj.y0, 'doctop': initial_doctop + top,
+                                  'upright': obj.upright})
+                elif isinstance(obj, LTRect):
+                    # Mesmas coordenadas das bordas de retângulo do pdfplumber (utils.rect_to_edges)
+                    top = height - obj.y1
+                    bottom = top + obj.height
+                    horizontal.append((top, obj.x0, obj.x1))
+                    horizontal.append((bottom, obj.x0, obj.x1))
+                    vertical.append((obj.x0, top, height - obj.y0))
+                    vertical.append((obj.x1, top, height - obj.y0))
+                elif isinstance(obj, LTLine):
+                    if obj.y0 == obj.y1:
+                        horizontal.append((height - obj.y1, obj.x0, obj.x1))
+                    elif obj.x0 == obj.x1:
+                        vertical.append((obj.x0, height - obj.y1, height - obj.y0))
+                    else:
+                        return None
+                elif isinstance(obj, LTCurve):
+                    return None
+                elif isinstance(obj, LTContainer):
+                    pending.append(obj._objs)
+        return chars, vertical, horizontal
+    
+    def grid_lines(self, edges, start, end):
+        """Encaixa as bordas como o pdfplumber e retorna a posição de cada linha da grade
+        
+        Retorna None se alguma linha não for um traço contínuo de start a end.
+        """
+        tolerance = self.TABLE_SETTINGS['snap_tolerance']
+        join = self.TABLE_SETTINGS['join_tolerance']
+        lines = []
+        group = []
+        for edge in sorted(edges) + [None]:
+            if group and (edge is None or edge[0] > group[-1][0] + tolerance):
+                # Traços da mesma linha unidos se a distância for até join_tolerance
+                segments = sorted((a, b) for _, a, b in group)
+                reach = segments[0][1]
+                for a, b in segments[1:]:
+                    if a > reach + join:
+                        return None
+                    reach = max(reach, b)
+                if segments[0][0] > start + tolerance or reach < end - tolerance:
+                    return None
+                lines.append(sum(position for position, _, _ in group) / len(group))
+                group = []
+            if edge is not None:
+                group.append(edge)
+        return lines
+    
+    def near_line(self, lines, value):
+        """Verifica se value está a menos de BORDER_MARGIN de alguma linha"""
+        index = bisect.bisect_left(lines, value)
+        return any(abs(lines[i] - value) < self.BORDER_MARGIN
+                   for i in (index - 1, index) if 0 <= i < len(lines))
+    
+    def extract_fast(self, page):
+        """Extrai a tabela pela grade aprendida ou retorna None se a página não seguir o modelo"""
+        objects = self.layout_objects(page)
+        if objects is None:
+            return None
+        chars, vertical, horizontal = objects
+        if not vertical or not horizontal:
+            return None
+        
+        # Todas as bordas da página precisam formar uma única grade completa
+        top = min(position for position, _, _ in horizontal)
+        bottom = max(position for position, _, _ in horizontal)
+        xs = self.grid_lines(vertical, top, bottom)
+        if xs is None or len(xs) != len(self.columns):
+            return None
+        if any(abs(x - column) > self.COLUMN_TOLERANCE for x, column in zip(xs, self.columns)):
+            return None
+        ys = self.grid_lines(horizontal, xs[0], xs[-1])
+        if ys is None or len(ys) < 2:
+            return None
+        
+        n_rows = len(ys) - 1
+        n_columns = len(xs) - 1
+        cells = [[[] for _ in range(n_columns)] for _ in range(n_rows)]
+        for char in chars:
+            h_mid = (char['x0'] + char['x1']) / 2
+            v_mid = (char['top'] + char['bottom']) / 2
+            # Caracteres sobre uma borda dependem do arredondamento do pdfplumber
+            if self.near_line(xs, h_mid) or self.near_line(ys, v_mid):
+                return None
+            column = bisect.bisect_right(xs, h_mid) - 1
+            row = bisect.bisect_right(ys, v_mid) - 1
+            if 0 <= column < n_columns and 0 <= row < n_rows:
+                cells[row][column].append(char)
+        
+        return [[pdfplumber.utils.extract_text(cell, x_shift=xs[column], y_shift=ys[row]) if cell else ''
+                 for column, cell in enumerate(row_cells)]
+                for row, row_cells in enumerate(cells)]
+
+
+class CSVOutput:
+    """Saída em CSV (formato original dos arquivos gerados)"""
+    extension = '.csv'
+    columnar = False
+    
+    def write(self, df, path):
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+class ParquetOutput:
+    """Saída em Parquet, com colunas categóricas e datas reais (requer pyarrow)"""
+    extension = '.parquet'
+    columnar = True
+    
+    def __init__(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("A saída Parquet/Arrow requer o pacote 'pyarrow' (pip install pyarrow)") from None
+    
+    def write(self, df, path):
+        df.to_parquet(path, index=False)
+
+
+class ArrowOutput(ParquetOutput):
+    """Saída em Arrow IPC (Feather v2), com colunas categóricas e datas reais (requer pyarrow)"""
+    extension = '.arrow'
+    
+    def write(self, df, path):
+        df.reset_index(drop=True).to_feather(path)
+
+
+# Formatos de saída disponíveis para output_formats
+OUTPUT_FORMATS = {
+    'csv': CSVOutput,
+    'parquet': ParquetOutput,
+    'arrow': ArrowOutput,
+}
+
+
+class ListSchema:
+    """Layout da tabela de uma família de listas em PDF
+    
+    columns completa ou trunca cada linha; o cabeçalho é a primeira linha com ao menos
+    três header_keywords. column_patterns dá, em ordem de prioridade, o nome padronizado
+    e os grupos de termos que o identificam: o título recebe o primeiro nome com algum
+    grupo inteiramente presente (os não reconhecidos ficam como estão).
+    """
+    
+    def __init__(self, name, columns, header_keywords, column_patterns, date_column=None,
+                 repeated_header_keywords=None, categorical_columns=()):
+        self.name = name
+        self.columns = columns
+        self.header_keywords = header_keywords
+        # Palavras-chave de um cabeçalho repetido como primeira linha de dados
+        self.repeated_header_keywords = repeated_header_keywords or header_keywords
+        self.column_patterns = column_patterns
+        # Coluna de datas normalizada em process_dataframe (None se não houver)
+        self.date_column = date_column
+        # Colunas com poucos valores distintos, gravadas como categóricas nos formatos colunares
+        self.categorical_columns = categorical_columns
+    
+    def standardize(self, title):
+        """Nome padronizado de um título de coluna (já limpo)"""
+        upper = title.upper()
+        for name, groups in self.column_patterns:
+            if any(all(term in upper for term in group) for group in groups):
+                return name
+        return title
+
+
+class SourceList:
+    """Uma lista de uma fonte: nome (dos arquivos gerados), texto do link e esquema da tabela"""
+    
+    def __init__(self, name, schema, link_terms, link_excludes=(), drop_repeated_header=False, label=None,
+                 excluded=False):
+        self.name = name
+        self.schema = schema
+        # Nome para os resumos e mensagens (ex.: 'Lista B excluídos')
+        self.label = label or name
+        # A lista reúne registros excluídos (situação no índice de consultas)
+        self.excluded = excluded
+        # O link é da lista se o texto (em minúsculas) tiver todos os link_terms e nenhum link_excludes
+        self.link_terms = link_terms
+        self.link_excludes = link_excludes
+        # Remove a primeira linha de dados quando ela repete o cabeçalho (ex.: Lista B)
+        self.drop_repeated_header = drop_repeated_header
+    
+    def matches(self, text):
+        return all(term in text for term in self.link_terms) and not any(term in text for term in self.link_excludes)
+
+
+class Source:
+    """Página da ANVISA com listas em PDF e os arquivos combinados a partir delas
+    
+    combined: (nome do arquivo sem extensão, primeira lista, segunda lista, é excluído)
+    """
+    
+    def __init__(self, name, url, lists, combined=()):
+        self.name = name
+        self.url = url
+        self.lists = {item.name: item for item in lists}
+        self.combined = list(combined)
+    
+    def classify(self, text):
+        """Lista a que pertence o texto de um link (None se nenhuma)"""
+        return next((item for item in self.lists.values() if item.matches(text)), None)
+
+
+# Fontes disponíveis (nome -> Source), na ordem de registro
+SOURCES = {}
+
+
+def register_source(source):
+    """Registra uma fonte; os nomes das listas viram nomes de arquivo e devem ser únicos"""
+    for other in SOURCES.values():
+        if other.name != source.name and set(other.lists) & set(source.lists):
+            raise ValueError(f"Listas já registradas pela fonte '{other.name}': "
+                             f"{', '.join(sorted(set(other.lists) & set(source.lists)))}")
+    SOURCES[source.name] = source
+    return source
+
+
+def find_list(name):
+    """Lista registrada com este nome (ex.: lista_b_excluidos)"""
+    for source in SOURCES.values():
+        if name in source.lists:
+            return source.lists[name]
+    raise KeyError(f"Lista desconhecida: {name}")
+
+
+def find_list_for_file(path):
+    """Lista registrada identificada pelo nome de um arquivo (ex.: Lista-B excluídos 2023.pdf), ou None
+    
+    O nome do arquivo deve ter as palavras do nome da lista, em ordem; vale a lista com mais palavras.
+    """
+    text = unicodedata.normalize('NFKD', os.path.basename(path).lower()).encode('ascii', 'ignore').decode('ascii')
+    words = re.findall(r'[a-z0-9]+', text)
+    best, best_size = None, 0
+    for source in SOURCES.values():
+        for item in source.lists.values():
+            list_words = item.name.split('_')
+            remaining = iter(words)
+            if len(list_words) > best_size and all(word in remaining for word in list_words):
+                best, best_size = item, len(list_words)
+    return best
+
+
+def is_excluded_list(name):
+    """Se a lista ou o arquivo combinado com este nome reúne registros excluídos (False se não registrado)"""
+    for source in SOURCES.values():
+        if name in source.lists:
+            return source.lists[name].excluded
+        for combined_name, _, _, excluded in source.combined:
+            if combined_name == name:
+                return excluded
+    return False
+
+
+# Listas de medicamentos de referência (A e B, incluídos e excluídos)
+REFERENCE_HEADER_KEYWORDS = [
+    'FÁRMACO', 'ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO',
+    'REGISTRO', 'CONCENTRAÇÃO', 'FORMA', 'FARMACÊUTICA',
+    'DATA', 'INCLUSÃO', 'EXCLUSÃO', 'MOTIVO'
+]
+REFERENCE_REPEATED_HEADER_KEYWORDS = ['FÁRMACO', 'ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO']
+REFERENCE_COLUMNS = [
+    ('FÁRMACO', [('FÁRMACO',), ('ASSOCIAÇÃO',)]),
+    ('DETENTOR', [('DETENTOR',)]),
+    ('MEDICAMENTO', [('MEDICAMENTO',)]),
+    ('REGISTRO', [('REGISTRO',)]),
+    ('CONCENTRAÇÃO', [('CONCENTRAÇÃO',), ('CONCENTRAÇAO',)]),
+    ('FORMA FARMACÊUTICA', [('FORMA FARMACÊUTICA',), ('FORMA FARMACEUTICA',)]),
+    ('DATA INCLUSÃO', [('DATA', 'INCLUSÃO')]),
+    ('DATA DE EXCLUSÃO', [('DATA', 'EXCLUSÃO')]),
+    ('MOTIVO DA EXCLUSÃO', [('MOTIVO',)]),
+]
+REFERENCE_INCLUDED = ListSchema('referencia_incluidos', 7, REFERENCE_HEADER_KEYWORDS, REFERENCE_COLUMNS,
+                                date_column='DATA INCLUSÃO',
+                                repeated_header_keywords=REFERENCE_REPEATED_HEADER_KEYWORDS,
+                                categorical_columns=('DETENTOR', 'FORMA FARMACÊUTICA'))
+REFERENCE_EXCLUDED = ListSchema('referencia_excluidos', 8, REFERENCE_HEADER_KEYWORDS, REFERENCE_COLUMNS,
+                                date_column='DATA DE EXCLUSÃO',
+                                repeated_header_keywords=REFERENCE_REPEATED_HEADER_KEYWORDS,
+                                categorical_columns=('DETENTOR', 'FORMA FARMACÊUTICA', 'MOTIVO DA EXCLUSÃO'))
+
+register_source(Source(
+    'referencia',
+    "https://www.gov.br/anvisa/pt-br/setorregulado/regularizacao/medicamentos/medicamentos-de-referencia/lista-de-medicamentos-de-referencia",
+    [
+        SourceList('lista_a', REFERENCE_INCLUDED, ('lista a',), ('excluído',), label='Lista A'),
+        SourceList('lista_a_excluidos', REFERENCE_EXCLUDED, ('lista a', 'excluído'), label='Lista A excluídos',
+                   excluded=True),
+        SourceList('lista_b', REFERENCE_INCLUDED, ('lista b',), ('excluído',), drop_repeated_header=True,
+                   label='Lista B'),
+        SourceList('lista_b_excluidos', REFERENCE_EXCLUDED, ('lista b', 'excluído'), drop_repeated_header=True,
+                   label='Lista B excluídos', excluded=True),
+    ],
+    combined=[
+        ('medicamentos_referencia_incluidos', 'lista_a', 'lista_b', False),
+        ('medicamentos_referencia_excluidos', 'lista_a_excluidos', 'lista_b_excluidos', True),
+    ],
+))
+
+# Listas individuais de todas as fontes registradas, na ordem das páginas da ANVISA
+LIST_NAMES = [name for source in SOURCES.values() for name in source.lists]
+
+
+# Estado dos processos de extração paralela (preenchido por _init_extraction_worker)
+_worker_scraper = None
+_worker_pdf = None
+_worker_template = None
+
+
+def _init_extraction_worker(scraper, source, schema):
+    """Abre o PDF uma única vez em cada processo do pool de extração"""
+    global _worker_scraper, _worker_pdf, _worker_template
+    _worker_scraper = scraper
+    _worker_pdf = pdfplumber.open(source if isinstance(source, str) else BytesIO(source))
+    # Cada processo aprende a grade na primeira tabela que extrair
+    _worker_template = scraper.table_template(schema)
+
+
+def _extract_pages(page_numbers):
+    """Extrai as linhas limpas (e o tempo de extração) das páginas indicadas no processo do pool"""
+    return [_worker_scraper.extract_page_rows_timed(_worker_pdf.pages[i], _worker_template) for i in page_numbers]
+
+
+# Estado dos processos do backfill (preenchido por _init_backfill_worker)
+_worker_backfill = None
+
+
+def _init_backfill_worker(backfill):
+    """Recria, em cada processo do backfill, o que não é enviado junto com o scraper"""
+    global _worker_backfill
+    _worker_backfill = backfill
+    backfill.scraper.setup_http()
+    backfill.scraper.metrics = RunMetrics()
+
+
+def _backfill_document(item):
+    """Processa um documento do backfill no processo do pool"""
+    return _worker_backfill.process_document(item)
+
+
+# Estado dos processos de associação do catálogo (preenchido por _init_matcher_worker)
+_worker_matcher = None
+
+
+def _init_matcher_worker(matcher):
+    """Recebe o índice de referência uma única vez em cada processo"""
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _match_batch(items):
+    """Associa um lote de itens do catálogo no processo do pool"""
+    return _worker_matcher.match_batch(items)
+
+
 class ANVISAReferenceDrugsScraper:
-    def __init__(self, base_url):
+    def __init__(self, base_url, extraction_workers=1, cache_dir=None, cache_max_bytes=512 * 1024 * 1024,
+                 page_cache_dir=None, page_cache_max_bytes=256 * 1024 * 1024, streaming=False,
+                 keep_line_breaks=(), header_heuristics=False, output_formats=('csv',), diff_dir=None,
+                 sqlite_path=None, lookup_path=None, metrics_json=None, metrics_textfile=None,
+                 profiler=None, profile_path=None, extraction_engine='extract_table', download_retries=4,
+                 download_backoff=1.0, rate_limit=0.0, http_pool_size=8, page_filter=True, sources=None):
+        # Fontes processadas por run() (nomes do registro ou objetos Source; padrão: todas as
+        # registradas); base_url, se informada, substitui a página da primeira
+        self.sources = [SOURCES[source] if isinstance(source, str) else source
+                        for source in (sources or list(SOURCES))]
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        # Modo de memória limitada: PDFs em arquivo temporário e linhas direto para o CSV
+        self.streaming = streaming
+        # Datas já normalizadas (valor original -> valor normalizado)
+        self.date_cache = {}
+        # Colunas (nomes padronizados) cujas células mantêm as quebras de linha, ex.: MOTIVO DA EXCLUSÃO
+        self.keep_line_breaks = set(keep_line_breaks)
+        # Com header_heuristics, só as primeiras linhas de cada página com 3+ células
+        # preenchidas são candidatas a cabeçalho (evita falsos positivos no MOTIVO)
+        self.header_heuristics = header_heuristics
+        # Detectores de cabeçalho de cada esquema (nome -> (cabeçalho, cabeçalho repetido))
+        self.header_detectors = {}
+        # Formatos gravados por run() (no modo streaming apenas CSV)
+        self.outputs = [OUTPUT_FORMATS[name]() for name in output_formats]
+        # DataFrames combinados da última execução (nome do arquivo -> DataFrame)
+        self.combined_frames = {}
+        # Arquivos combinados de todas as fontes e colunas tratadas nos formatos colunares
+        self.combined_outputs = [output for source in self.sources for output in source.combined]
+        schemas = [item.schema for source in self.sources for item in source.lists.values()]
+        self.categorical_columns = list(dict.fromkeys(col for schema in schemas for col in schema.categorical_columns))
+        self.date_columns = list(dict.fromkeys(schema.date_column for schema in schemas if schema.date_column))
+        # Índice da execução anterior e changesets (desativado sem diff_dir)
+        self.diff_dir = diff_dir
+        # Banco SQLite atualizado a cada execução (desativado sem sqlite_path)
+        self.sqlite_path = sqlite_path
+        # Snapshot do índice de consultas (ReferenceLookup) gravado a cada execução
+        self.lookup_path = lookup_path
+        # Medidas da execução, exportadas em JSON e/ou no textfile do Prometheus ao final de run()
+        self.metrics = RunMetrics()
+        self.metrics_json = metrics_json
+        self.metrics_textfile = metrics_textfile
+        # Profiler opcional do laço de extração: 'cprofile' ou 'pyinstrument'
+        if profiler not in (None, 'cprofile', 'pyinstrument'):
+            raise ValueError(f"Profiler desconhecido: {profiler}")
+        self.profiler = profiler
+        self.profile_path = profile_path or ('perfil_extracao.html' if profiler == 'pyinstrument'
+                                             else 'perfil_extracao.prof')
+        self.profile_results = []
+        # Extração das páginas: 'extract_table' (pdfplumber) ou 'template' (grade aprendida, ver TableTemplate)
+        if extraction_engine not in ('extract_table', 'template'):
+            raise ValueError(f"Motor de extração desconhecido: {extraction_engine}")
+        self.extraction_engine = extraction_engine
+        # Número de processos para extrair páginas em paralelo (None = um por núcleo)
+        self.extraction_workers = extraction_workers or os.cpu_count() or 1
+        # Cache HTTP condicional da página e dos PDFs (desativado sem cache_dir)
+        self.http_cache = HTTPCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # Cache das linhas extraídas por página (desativado sem page_cache_dir)
+        self.page_cache = PageTableCache(page_cache_dir, page_cache_max_bytes) if page_cache_dir else None
+        # Pré-classificação que pula páginas sem texto ou sem bordas (capa, notas, páginas em branco)
+        self.page_classifier = PageClassifier() if page_filter else None
+        # Downloads: novas tentativas com backoff, intervalo mínimo por host (rate_limit, em
+        # segundos) e conexões mantidas abertas entre as requisições
+        self.download_retries = download_retries
+        self.download_backoff = download_backoff
+        self.rate_limit = rate_limit
+        self.http_pool_size = http_pool_size
+        self.setup_http()
+    
+    def create_session(self):
+        """Sessão HTTP com o User-Agent e o pool de conexões do scraper"""
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Connection': 'keep-alive',
         })
+        # Conexões suficientes para os downloads simultâneos dos PDFs; as novas tentativas
+        # ficam com o Downloader, que sabe retomar downloads parciais
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.http_pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def setup_http(self):
+        """Cria a sessão e o Downloader (também nos processos, que não os recebem)"""
+        self.session = self.create_session()
+        self.downloader = Downloader(self.session, retries=self.download_retries, backoff=self.download_backoff,
+                                     min_interval=self.rate_limit)
+
+    def __getstate__(self):
+        # A sessão HTTP não é enviada aos processos de extração
+        state = self.__dict__.copy()
+        state['session'] = None
+        state['downloader'] = None
+        state['http_cache'] = None
+        state['page_cache'] = None
+        state['metrics'] = None
+        state['profile_results'] = []
+        return state
+    
+    def get(self, url):
+        """Faz o GET da URL, reutilizando a cópia em cache quando o servidor responde 304"""
+        cached = self.http_cache.load(url) if self.http_cache else None
+        headers = self.http_cache.conditional_headers(cached[0]) if cached else {}
+        
+        start = time.perf_counter()
+        result = self.downloader.fetch(url, headers=headers)
+        self.metrics.increment('download_retries', result['attempts'] - 1)
+        if cached and result['status'] == 304:
+            logging.info(f"{url} não modificado, usando cópia em cache")
+            self.http_cache.touch(url, cached[0])
+            self.metrics.increment('http_cache_hits')
+            self.metrics.record_download(url, len(cached[1]), time.perf_counter() - start, cached=True)
+            return cached[1]
+        if result['status'] == 304:
+            raise RuntimeError(f"Resposta 304 para {url} sem cópia em cache")
+        self.metrics.record_download(url, result['size'], time.perf_counter() - start, sha256=result['sha256'])
+        
+        if self.http_cache:
+            self.http_cache.store(url, result['headers'], result['content'])
+        return result['content']
+    
+    def get_to_file(self, url, path):
+        """Faz o GET da URL gravando o corpo em blocos no arquivo, com o mesmo cache de get()"""
+        meta = self.http_cache.load_meta(url) if self.http_cache else None
+        headers = self.http_cache.conditional_headers(meta) if meta else {}
+        
+        start = time.perf_counter()
+        result = self.downloader.fetch(url, headers=headers, path=path)
+        self.metrics.increment('download_retries', result['attempts'] - 1)
+        if meta and result['status'] == 304:
+            if self.http_cache.copy_body(url, path, meta['size']):
+                logging.info(f"{url} não modificado, usando cópia em cache")
+                self.http_cache.touch(url, meta)
+                self.metrics.increment('http_cache_hits')
+                self.metrics.record_download(url, meta['size'], time.perf_counter() - start, cached=True)
+                return
+            # A cópia saiu do cache (evict de outra thread) depois da requisição condicional
+            logging.info(f"{url}: cópia em cache removida, baixando novamente")
+            result = self.downloader.fetch(url, path=path)
+            self.metrics.increment('download_retries', result['attempts'] - 1)
+        if result['status'] == 304:
+            raise RuntimeError(f"Resposta 304 para {url} sem cópia em cache")
+        self.metrics.record_download(url, result['size'], time.perf_counter() - start, sha256=result['sha256'])
         
+        if self.http_cache:
+            self.http_cache.store(url, result['headers'], path=path)
+    
     def fetch_page(self, url):
         """Busca conteúdo de uma página"""
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+            return self.get(url)
         except Exception as e:
             logging.error(f"Erro ao buscar {url}: {e}")
             return None
     
-    def extract_pdf_links(self, html_content):
-        """Extrai links para PDFs da página"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def source_url(self, source):
+        """Página de uma fonte (base_url substitui a da primeira fonte)"""
+        if self.base_url and source is self.sources[0]:
+            return self.base_url
+        return source.url
+    
+    def extract_pdf_links(self, html_content, source=None):
+        """Extrai links para PDFs da página de uma fonte (padrão: a primeira)"""
+        source = source or self.sources[0]
+        soup = bs4.BeautifulSoup(html_content, 'html.parser')
         
-        # Procurar por links que contenham 'lista' e 'pdf'
+        # Procurar por links para PDF cujo texto identifique uma das listas da fonte
         pdf_links = {}
         
         for link in soup.find_all('a', href=True):
@@ -42,157 +2020,362 @@ class ANVISAReferenceDrugsScraper:
             
             # Verificar se é um link para PDF
             if href.endswith('.pdf'):
-                # Classificar por tipo (A, B, excluídos)
-                if 'lista a' in text and 'excluído' not in text:
-                    pdf_links['lista_a'] = link['href'] if link['href'].startswith('http') else f"https://www.gov.br{link['href']}"
-                elif 'lista a' in text and 'excluído' in text:
-                    pdf_links['lista_a_excluidos'] = link['href'] if link['href'].startswith('http') else f"https://www.gov.br{link['href']}"
-                elif 'lista b' in text and 'excluído' not in text:
-                    pdf_links['lista_b'] = link['href'] if link['href'].startswith('http') else f"https://www.gov.br{link['href']}"
-                elif 'lista b' in text and 'excluído' in text:
-                    pdf_links['lista_b_excluidos'] = link['href'] if link['href'].startswith('http') else f"https://www.gov.br{link['href']}"
-        
-        logging.info(f"Links encontrados: {list(pdf_links.keys())}")
+                item = source.classify(text)
+                if item:
+                    pdf_links[item.name] = urljoin(self.source_url(source), link['href'])
+        
+        logging.info(f"Links encontrados ({source.name}): {list(pdf_links.keys())}")
         return pdf_links
     
+    def find_pdf_links(self):
+        """Links dos PDFs de todas as fontes (None se alguma página falhar)
+        
+        As páginas são buscadas em paralelo pela mesma sessão; fontes que compartilham
+        a página a buscam uma única vez.
+        """
+        urls = list(dict.fromkeys(self.source_url(source) for source in self.sources))
+        with self.metrics.timer('fetch_page'):
+            with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+                pages = dict(zip(urls, executor.map(self.fetch_page, urls)))
+        failed = [url for url, html_content in pages.items() if not html_content]
+        if failed:
+            logging.error(f"Falha ao acessar {', '.join(failed)}")
+            return None
+        
+        pdf_links = {}
+        with self.metrics.timer('extract_pdf_links'):
+            for source in self.sources:
+                pdf_links.update(self.extract_pdf_links(pages[self.source_url(source)], source))
+        return pdf_links
+    
+    def find_list(self, name):
+        """Lista (SourceList) com este nome, entre as fontes do scraper e as registradas"""
+        for source in self.sources:
+            if name in source.lists:
+                return source.lists[name]
+        return find_list(name)
+    
     def download_pdf(self, url):
         """Baixa o PDF e retorna o conteúdo"""
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            return BytesIO(response.content)
+            return BytesIO(self.get(url))
         except Exception as e:
             logging.error(f"Erro ao baixar PDF {url}: {e}")
             return None
     
-    def is_header_row(self, row):
-        """Verifica se uma linha é um cabeçalho"""
-        if not row:
-            return False
-        
-        row_text = ' '.join([str(cell) for cell in row if cell])
-        
-        # Palavras-chave que indicam um cabeçalho
-        header_keywords = [
-            'FÁRMACO', 'ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 
-            'REGISTRO', 'CONCENTRAÇÃO', 'FORMA', 'FARMACÊUTICA',
-            'DATA', 'INCLUSÃO', 'EXCLUSÃO', 'MOTIVO'
-        ]
-        
-        # Contar quantas palavras-chave estão presentes
-        keyword_count = sum(1 for keyword in header_keywords if keyword in row_text.upper())
-        
-        # Se mais de 3 palavras-chave estiverem presentes, provavelmente é um cabeçalho
-        return keyword_count >= 3
+    def download_pdf_to_file(self, url):
+        """Baixa o PDF em blocos para um arquivo temporário e retorna seu caminho"""
+        fd, path = tempfile.mkstemp(suffix='.pdf', prefix='anvisa_')
+        os.close(fd)
+        try:
+            self.get_to_file(url, path)
+            return path
+        except Exception as e:
+            logging.error(f"Erro ao baixar PDF {url}: {e}")
+            os.remove(path)
+            return None
+    
+    def detectors(self, schema):
+        """Detectores de cabeçalho e de cabeçalho repetido do esquema, criados uma única vez"""
+        detectors = self.header_detectors.get(schema.name)
+        if detectors is None:
+            detectors = (HeaderDetector(schema.header_keywords, 3,
+                                        max_page_row=2 if self.header_heuristics else None,
+                                        min_cells=3 if self.header_heuristics else None),
+                         HeaderDetector(schema.repeated_header_keywords, 3))
+            self.header_detectors[schema.name] = detectors
+        return detectors
+    
+    def is_header_row(self, row, schema, page_row=None):
+        """Verifica se uma linha é um cabeçalho (page_row: posição da linha na página, se conhecida)"""
+        return self.detectors(schema)[0].is_header(row, page_row)
+    
+    def has_header_keywords(self, values, schema):
+        """Verifica se os valores de uma linha de dados repetem o cabeçalho"""
+        return self.detectors(schema)[1].is_header([val for val in values if pd.notna(val)])
     
     def clean_header_text(self, text):
         """Limpa texto do cabeçalho removendo quebras de linha"""
         if not text:
             return text
         
-        # Remover quebras de linha e múltiplos espaços
-        text = str(text).replace('\n', ' ').replace('\r', ' ')
-        text = re.sub(r'\s+', ' ', text).strip()
+        # Remover quebras de linha e múltiplos espaços: split() sem argumento separa
+        # por qualquer sequência de espaços (inclusive \n e \r) e descarta as pontas
+        return ' '.join(str(text).split())
+    
+    def clean_multiline_text(self, text):
+        """Limpa o texto como clean_header_text, mas mantém as quebras entre linhas não vazias"""
+        if not text:
+            return text
+        
+        return '\n'.join(' '.join(line.split()) for line in str(text).splitlines() if line.strip())
+    
+    def table_template(self, schema):
+        """Modelo de tabela de um PDF (None se o motor for o extract_table do pdfplumber)"""
+        if self.extraction_engine == 'template':
+            return TableTemplate(lambda row: self.is_header_row(row, schema))
+        return None
+    
+    def extract_page_rows(self, page, template=None):
+        """Extrai as linhas não vazias da tabela de uma página (células limpas depois, em iter_table_rows)"""
+        rows = []
+        
+        # Extrair tabela da página
+        table = template.extract_table(page) if template else page.extract_table()
+        if table:
+            for row in table:
+                if row:
+                    raw_row = ['' if cell is None else cell for cell in row]
+                    
+                    # Verificar se a linha não está completamente vazia
+                    if any(str(cell).strip() for cell in raw_row):
+                        rows.append(raw_row)
+        
+        return rows
+    
+    def extract_page_rows_timed(self, page, template=None):
+        """extract_page_rows retornando também a duração e o caminho usado pelo modelo"""
+        start = time.perf_counter()
+        rows = self.extract_page_rows(page, template)
+        return rows, time.perf_counter() - start, template.mode if template else None
+    
+    @contextmanager
+    def profiled(self):
+        """Executa o bloco sob o profiler configurado (sem custo quando desativado)"""
+        if self.profiler is None:
+            yield
+            return
+        
+        # Um profiler por bloco, nunca dois ao mesmo tempo (run_pipeline processa uma lista por vez)
+        if self.profiler == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                with self.metrics.lock:
+                    self.profile_results.append(profiler)
+        else:
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("O profiler 'pyinstrument' requer o pacote pyinstrument (pip install pyinstrument)") from None
+            profiler = Profiler(async_mode='disabled')
+            profiler.start()
+            try:
+                yield
+            finally:
+                with self.metrics.lock:
+                    self.profile_results.append(profiler.stop())
+    
+    def write_profile(self):
+        """Combina os perfis coletados e grava em profile_path"""
+        if not self.profile_results:
+            return
+        if self.profiler == 'cprofile':
+            import pstats
+            stats = pstats.Stats(self.profile_results[0])
+            for profile in self.profile_results[1:]:
+                stats.add(profile)
+            stats.dump_stats(self.profile_path)
+        else:
+            from pyinstrument.renderers import HTMLRenderer
+            from pyinstrument.session import Session
+            session = self.profile_results[0]
+            for other in self.profile_results[1:]:
+                session = Session.combine(session, other)
+            with open(self.profile_path, 'w', encoding='utf-8') as f:
+                f.write(HTMLRenderer().render(session))
+        logging.info(f"Perfil da extração salvo em '{self.profile_path}'")
+        self.profile_results = []
+    
+    def pdf_source(self, pdf_file):
+        """Retorna o caminho ou os bytes do PDF para reabertura nos processos"""
+        if isinstance(pdf_file, (str, os.PathLike)):
+            return os.fspath(pdf_file)
+        pdf_file.seek(0)
+        return pdf_file.read()
+    
+    @contextmanager
+    def open_pdf(self, source):
+        """Abre o PDF a partir de bytes, arquivo aberto ou caminho (mapeado em memória)"""
+        if isinstance(source, bytes):
+            source = BytesIO(source)
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with pdfplumber.open(mapped) as pdf:
+                    yield pdf
+        else:
+            with pdfplumber.open(source) as pdf:
+                yield pdf
+    
+    def extraction_settings(self):
+        """Configurações que influenciam as linhas extraídas (parte da chave do cache de páginas)"""
+        return {'version': 3, 'engine': self.extraction_engine}
+    
+    def iter_page_rows(self, pdf_file, schema, workers=None):
+        """Gera, em ordem, as linhas limpas de cada página, usando o cache e o pool de processos"""
+        if workers is None:
+            workers = self.extraction_workers
+        
+        # Os processos de extração reabrem o PDF a partir do caminho ou dos bytes
+        source = self.pdf_source(pdf_file) if workers > 1 else pdf_file
+        executor = None
+        hits = extracted_count = skipped = 0
+        template = self.table_template(schema)
+        modes = {}
+        
+        with self.open_pdf(source) as pdf:
+            try:
+                if workers > 1 and len(pdf.pages) > 1:
+                    executor = ProcessPoolExecutor(max_workers=workers,
+                                                   initializer=_init_extraction_worker,
+                                                   initargs=(self, source, schema))
+                
+                # Páginas processadas em janelas para manter a memória limitada
+                window = workers * 4 if executor else 1
+                settings = self.extraction_settings()
+                for first in range(0, len(pdf.pages), window):
+                    numbers = list(range(first, min(first + window, len(pdf.pages))))
+                    page_rows = {}
+                    
+                    # Páginas que não podem ter linhas não passam pela extração
+                    if self.page_classifier:
+                        for i in numbers:
+                            reason = self.page_classifier.skip_reason(pdf.pages[i])
+                            if reason:
+                                logging.debug(f"Página {i + 1} pulada ({reason})")
+                                page_rows[i] = []
+                                skipped += 1
+                    
+                    # Reaproveitar as páginas cujo conteúdo já foi extraído antes
+                    keys = {}
+                    if self.page_cache:
+                        for i in numbers:
+                            if i in page_rows:
+                                continue
+                            keys[i] = self.page_cache.key(pdf.pages[i], settings)
+                            rows = self.page_cache.get(keys[i])
+                            if rows is not None:
+                                page_rows[i] = rows
+                    
+                    missing = [i for i in numbers if i not in page_rows]
+                    with self.profiled():
+                        if executor and len(missing) > 1:
+                            # map() devolve os resultados na ordem das páginas
+                            extracted = [result for pages in executor.map(_extract_pages, [[i] for i in missing])
+                                         for result in pages]
+                        else:
+                            extracted = [self.extract_page_rows_timed(pdf.pages[i], template) for i in missing]
+                    
+                    for i, (rows, seconds, mode) in zip(missing, extracted):
+                        self.metrics.record_page(i + 1, seconds)
+                        modes[mode] = modes.get(mode, 0) + 1
+                        page_rows[i] = rows
+                        if self.page_cache:
+                            self.page_cache.put(keys[i], rows)
+                    hits += len(keys) - len(missing) if self.page_cache else 0
+                    extracted_count += len(missing)
+                    
+                    for i in numbers:
+                        # Liberar os objetos de layout já usados da página
+                        pdf.pages[i].flush_cache()
+                        yield page_rows.pop(i)
+                    
+                    # Descartar os objetos PDF já resolvidos (streams de conteúdo decodificados)
+                    cached_objs = getattr(pdf.doc, '_cached_objs', None)
+                    if cached_objs is not None:
+                        cached_objs.clear()
+            finally:
+                if executor:
+                    executor.shutdown(cancel_futures=True)
         
-        return text
+        self.metrics.increment('page_cache_hits', hits)
+        self.metrics.increment('pages_extracted', extracted_count)
+        self.metrics.increment('pages_skipped', skipped)
+        if skipped:
+            logging.info(f"{skipped} páginas sem tabela puladas antes da extração")
+        if template:
+            self.metrics.increment('template_pages', modes.get('modelo', 0))
+            self.metrics.increment('template_fallbacks', modes.get('fallback', 0))
+            logging.info(f"Modelo de tabela: {modes.get('modelo', 0)} páginas pela grade aprendida, "
+                         f"{modes.get('fallback', 0)} pelo pdfplumber")
+        if self.page_cache:
+            logging.info(f"Cache de páginas: {hits} reaproveitadas, {extracted_count} extraídas")
     
-    def extract_table_from_pdf(self, pdf_file, is_excluded=False):
+    def extract_table_from_pdf(self, pdf_file, schema, workers=None):
         """Extrai tabela de um PDF usando pdfplumber"""
-        all_rows = []
-        
         try:
-            with pdfplumber.open(pdf_file) as pdf:
-                for page in pdf.pages:
-                    # Extrair tabela da página
-                    table = page.extract_table()
-                    if table:
-                        # Limpar cada célula e adicionar à lista
-                        for row in table:
-                            if row:
-                                cleaned_row = []
-                                for cell in row:
-                                    if cell is None:
-                                        cleaned_row.append('')
-                                    else:
-                                        # Limpar texto da célula
-                                        cleaned_cell = self.clean_header_text(cell)
-                                        cleaned_row.append(cleaned_cell)
-                                
-                                # Verificar se a linha não está completamente vazia
-                                if any(str(cell).strip() for cell in cleaned_row):
-                                    all_rows.append(cleaned_row)
+            pages = list(self.iter_page_rows(pdf_file, schema, workers))
         except Exception as e:
             logging.error(f"Erro ao extrair tabela do PDF: {e}")
             return None, []
         
-        # Encontrar o índice do cabeçalho
-        header_index = -1
-        for i, row in enumerate(all_rows):
-            if self.is_header_row(row):
-                header_index = i
-                break
+        return self.build_table(None, schema, pages=pages)
+    
+    def build_table(self, all_rows, schema, pages=None):
+        """Localiza o cabeçalho e filtra as linhas de dados extraídas do PDF"""
+        rows = self.iter_table_rows(all_rows, schema, pages=pages)
+        header_row = next(rows, None)
+        if header_row is None:
+            return None, []
+        return header_row, list(rows)
+    
+    def iter_table_rows(self, rows, schema, pages=None):
+        """Gera o cabeçalho padronizado e, em seguida, as linhas de dados filtradas
         
-        if header_index >= 0:
-            # Pegar o cabeçalho
-            header_row = all_rows[header_index]
-            
-            # Definir número esperado de colunas baseado no tipo
-            if is_excluded:
-                expected_cols = 8  # Incluídos têm 7, excluídos têm 8
-            else:
-                expected_cols = 7
-            
-            # Limpar e padronizar o cabeçalho
-            cleaned_header = []
-            for cell in header_row:
-                if cell:
-                    # Remover quebras de linha e espaços extras
-                    cell = str(cell).replace('\n', ' ').replace('\r', ' ').strip()
-                    cell = re.sub(r'\s+', ' ', cell)
-                    cleaned_header.append(cell)
-                else:
-                    cleaned_header.append('')
-            
-            # Se o cabeçalho tiver menos colunas que o esperado, preencher
-            if len(cleaned_header) < expected_cols:
-                for _ in range(expected_cols - len(cleaned_header)):
-                    cleaned_header.append('')
-            # Se tiver mais, truncar
-            elif len(cleaned_header) > expected_cols:
-                cleaned_header = cleaned_header[:expected_cols]
-            
-            # Coletar dados após o cabeçalho
-            data_rows = all_rows[header_index + 1:]
-            
-            # Filtrar linhas que não são cabeçalhos repetidos
-            filtered_data = []
-            for row in data_rows:
-                # Verificar se a linha não é um cabeçalho repetido
-                if not self.is_header_row(row):
-                    # Limpar e padronizar a linha
-                    cleaned_row = []
-                    for cell in row:
-                        if cell is None:
-                            cleaned_row.append('')
-                        else:
-                            cell = str(cell).replace('\n', ' ').replace('\r', ' ').strip()
-                            cell = re.sub(r'\s+', ' ', cell)
-                            cleaned_row.append(cell)
-                    
-                    # Garantir que tenha o número correto de colunas
-                    if len(cleaned_row) < expected_cols:
-                        cleaned_row.extend([''] * (expected_cols - len(cleaned_row)))
-                    elif len(cleaned_row) > expected_cols:
-                        cleaned_row = cleaned_row[:expected_cols]
-                    
-                    # Verificar se não é uma linha vazia
-                    if any(cell.strip() for cell in cleaned_row):
-                        filtered_data.append(cleaned_row)
-            
-            return cleaned_header, filtered_data
+        As linhas podem vir achatadas (rows) ou agrupadas por página (pages); no
+        segundo caso o detector de cabeçalho conhece a posição de cada linha na página.
+        """
+        if pages is not None:
+            numbered = ((index, row) for page in pages for index, row in enumerate(page))
         else:
+            numbered = ((None, row) for row in rows)
+        
+        # Encontrar o cabeçalho
+        header_row = next((row for index, row in numbered if self.is_header_row(row, schema, index)), None)
+        if header_row is None:
             logging.warning("Cabeçalho não encontrado no PDF")
-            return None, []
+            return
+        
+        # Número esperado de colunas vem do esquema (ex.: incluídos têm 7, excluídos têm 8)
+        expected_cols = schema.columns
+        
+        # Limpar e padronizar o cabeçalho (remover quebras de linha e espaços extras)
+        cleaned_header = [self.clean_header_text(cell) if cell else '' for cell in header_row]
+        
+        # Se o cabeçalho tiver menos colunas que o esperado, preencher
+        if len(cleaned_header) < expected_cols:
+            for _ in range(expected_cols - len(cleaned_header)):
+                cleaned_header.append('')
+        # Se tiver mais, truncar
+        elif len(cleaned_header) > expected_cols:
+            cleaned_header = cleaned_header[:expected_cols]
+        
+        yield cleaned_header
+        
+        # Limpeza de cada coluna, escolhida uma única vez pelo nome padronizado
+        cleaners = [self.clean_multiline_text if name in self.keep_line_breaks else self.clean_header_text
+                    for name in self.standardize_header(cleaned_header, schema)]
+        
+        # Filtrar as linhas após o cabeçalho que não são cabeçalhos repetidos
+        for index, row in numbered:
+            # Verificar se a linha não é um cabeçalho repetido
+            if self.is_header_row(row, schema, index):
+                self.metrics.increment('repeated_headers_dropped')
+            else:
+                # Limpar cada célula (uma única vez) já truncando no número de colunas
+                cleaned_row = [clean(cell) if cell else '' for clean, cell in zip(cleaners, row)]
+                
+                # Garantir que tenha o número correto de colunas
+                if len(cleaned_row) < expected_cols:
+                    cleaned_row.extend([''] * (expected_cols - len(cleaned_row)))
+
+                # Verificar se não é uma linha vazia
+                if any(cell.strip() for cell in cleaned_row):
+                    yield cleaned_row
     
     def normalize_date(self, date_str):
         """Normaliza datas: 12/11/2012 -> 12.11.2012, pega última data se múltiplas"""
@@ -262,57 +2445,114 @@ class ANVISAReferenceDrugsScraper:
         # Se não encontrou nenhum padrão, retornar original
         return date_str
     
-    def standardize_columns(self, df, is_excluded=False, is_lista_b=False):
-        """Padroniza os nomes das colunas"""
-        # Primeiro, limpar os nomes das colunas existentes
-        df.columns = [self.clean_header_text(col) for col in df.columns]
+    def normalize_date_cached(self, date_str):
+        """normalize_date com memorização dos valores já vistos"""
+        try:
+            return self.date_cache[date_str]
+        except (KeyError, TypeError):
+            pass
+        result = self.normalize_date(date_str)
+        if isinstance(date_str, str):
+            self.date_cache[date_str] = result
+        return result
+    
+    def normalize_dates(self, dates, as_datetime=False):
+        """Versão vetorizada de normalize_date para uma coluna inteira
         
-        # Mapear para nomes padrão baseado no conteúdo
-        column_mapping = {}
+        Cada valor distinto é normalizado uma única vez (com operações de string
+        do pandas) e guardado em cache. Com as_datetime=True retorna datetime64,
+        com NaT para valores que não são datas válidas.
+        """
+        # Valores nulos ou vazios viram '' e os demais são tratados como texto
+        if pd.api.types.infer_dtype(dates, skipna=False) == 'string':
+            keys = dates
+        else:
+            keys = dates.map(lambda value: '' if not value or pd.isna(value) else str(value))
         
-        for col in df.columns:
-            col_upper = col.upper()
-            
-            if 'FÁRMACO' in col_upper or 'ASSOCIAÇÃO' in col_upper:
-                column_mapping[col] = 'FÁRMACO'
-            elif 'DETENTOR' in col_upper:
-                column_mapping[col] = 'DETENTOR'
-            elif 'MEDICAMENTO' in col_upper:
-                column_mapping[col] = 'MEDICAMENTO'
-            elif 'REGISTRO' in col_upper:
-                column_mapping[col] = 'REGISTRO'
-            elif 'CONCENTRAÇÃO' in col_upper or 'CONCENTRAÇAO' in col_upper:
-                column_mapping[col] = 'CONCENTRAÇÃO'
-            elif 'FORMA FARMACÊUTICA' in col_upper or 'FORMA FARMACEUTICA' in col_upper:
-                column_mapping[col] = 'FORMA FARMACÊUTICA'
-            elif 'DATA INCLUSÃO' in col_upper or ('DATA' in col_upper and 'INCLUSÃO' in col_upper):
-                column_mapping[col] = 'DATA INCLUSÃO'
-            elif 'DATA DE INCLUSÃO' in col_upper:
-                column_mapping[col] = 'DATA INCLUSÃO'
-            elif 'DATA EXCLUSÃO' in col_upper or ('DATA' in col_upper and 'EXCLUSÃO' in col_upper):
-                column_mapping[col] = 'DATA DE EXCLUSÃO'
-            elif 'MOTIVO' in col_upper:
-                column_mapping[col] = 'MOTIVO DA EXCLUSÃO'
-            else:
-                # Manter o nome original se não for reconhecido
-                column_mapping[col] = col
+        missing = [value for value in keys.unique() if value not in self.date_cache]
+        if missing:
+            self.date_cache.update(zip(missing, self.normalize_date_values(missing)))
+        result = keys.map(self.date_cache)
+        
+        if as_datetime:
+            return pd.to_datetime(result, format='%d.%m.%Y', errors='coerce')
+        return result
+    
+    def normalize_date_values(self, values):
+        """Normaliza uma lista de textos de data com as mesmas regras de normalize_date"""
+        values = pd.Series(values, dtype=object).str.strip()
+        result = pd.Series('', index=values.index, dtype=object)
+        pending = values != ''
+        
+        # Se houver múltiplas datas separadas por ';', pegar a última
+        values = values.where(~values.str.contains(';', regex=False),
+                              values.str.rsplit(';', n=1).str[-1].str.strip())
         
-        # Aplicar o mapeamento
-        df = df.rename(columns=column_mapping)
+        # Já no formato com pontos (DD.MM.YYYY): apenas garantir os zeros à esquerda
+        dotted = pending & values.str.contains('.', regex=False) & ~values.str.contains('/', regex=False) \
+            & (values.str.count(r'\.') == 2)
+        parts = values[dotted].str.split('.', expand=True)
+        if dotted.any():
+            result[dotted] = parts[0].str.zfill(2) + '.' + parts[1].str.zfill(2) + '.' + parts[2]
+        pending &= ~dotted
         
+        # Remover qualquer caractere não numérico exceto / e .
+        cleaned = values.str.replace(r'[^\d/\.]', '', regex=True)
+        
+        # DD/MM/YYYY ou DD.MM.YYYY
+        match = cleaned[pending].str.extract(r'^(\d{1,2})[/\.](\d{1,2})[/\.](\d{2,4})')
+        found = match[0].notna().reindex(values.index, fill_value=False)
+        if found.any():
+            match = match[found[pending]]
+            year = match[2].where(match[2].str.len() != 2,
+                                  match[2].map(lambda y: f"20{y}" if int(y) < 50 else f"19{y}"))
+            result[found] = match[0].str.zfill(2) + '.' + match[1].str.zfill(2) + '.' + year
+        pending &= ~found
+        
+        # DDMMYYYY
+        match = cleaned[pending].str.extract(r'^(\d{8})')[0]
+        found = match.notna().reindex(values.index, fill_value=False)
+        if found.any():
+            match = match[found[pending]]
+            result[found] = match.str[:2] + '.' + match.str[2:4] + '.' + match.str[4:]
+        pending &= ~found
+        
+        # DDMMYY
+        match = cleaned[pending].str.extract(r'^(\d{6})')[0]
+        found = match.notna().reindex(values.index, fill_value=False)
+        if found.any():
+            match = match[found[pending]]
+            year = match.str[4:].map(lambda y: f"20{y}" if int(y) < 50 else f"19{y}")
+            result[found] = match.str[:2] + '.' + match.str[2:4] + '.' + year
+        pending &= ~found
+        
+        # Se não encontrou nenhum padrão, manter o valor limpo
+        result[pending] = cleaned[pending]
+        return result.tolist()
+    
+    def standardize_columns(self, df, schema):
+        """Padroniza os nomes das colunas"""
+        df.columns = self.standardize_header(df.columns, schema)
         return df
     
-    def process_dataframe(self, df, is_excluded=False, is_lista_b=False):
-        """Processa o DataFrame: normaliza datas, renomeia colunas, etc."""
+    def standardize_header(self, columns, schema):
+        """Retorna os nomes padronizados de uma lista de colunas, pelos padrões do esquema"""
+        # Limpar os nomes das colunas existentes e mapear cada um pelo conteúdo
+        return [schema.standardize(self.clean_header_text(col)) for col in columns]
+    
+    def process_dataframe(self, df, source_list):
+        """Processa o DataFrame de uma lista: normaliza datas, renomeia colunas, etc."""
+        schema = source_list.schema
         # Padronizar colunas primeiro
-        df = self.standardize_columns(df, is_excluded, is_lista_b)
+        df = self.standardize_columns(df, schema)
         
         # Normalizar datas
-        date_column = 'DATA DE EXCLUSÃO' if is_excluded else 'DATA INCLUSÃO'
+        date_column = schema.date_column
         if date_column in df.columns:
             # Aplicar a normalização e mostrar alguns exemplos para debug
             original_dates = df[date_column].head(5).tolist()
-            df[date_column] = df[date_column].apply(self.normalize_date)
+            with self.metrics.timer('normalize_dates'):
+                df[date_column] = self.normalize_dates(df[date_column])
             normalized_dates = df[date_column].head(5).tolist()
             
             # Log para verificar a conversão
@@ -323,22 +2563,17 @@ class ANVISAReferenceDrugsScraper:
         # Remover linhas completamente vazias
         df = df.dropna(how='all')
         
-        # Remover linhas que são duplicatas do cabeçalho (apenas se for Lista B)
-        if is_lista_b and not df.empty:
-            first_row = df.iloc[0]
-            first_row_text = ' '.join([str(val) for val in first_row.values if pd.notna(val)])
-            
-            header_keywords = ['FÁRMACO', 'ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO']
-            
+        # Remover linhas que são duplicatas do cabeçalho (apenas nas listas marcadas, ex.: Lista B)
+        if source_list.drop_repeated_header and not df.empty:
             # Se a primeira linha contém várias palavras-chave de cabeçalho, remover
-            keyword_count = sum(1 for keyword in header_keywords if keyword in first_row_text.upper())
-            if keyword_count >= 3:
+            if self.has_header_keywords(df.iloc[0].values, schema):
                 df = df.iloc[1:].reset_index(drop=True)
-                logging.info(f"Removido cabeçalho duplicado do DataFrame Lista B")
+                self.metrics.increment('repeated_headers_dropped')
+                logging.info(f"Removido cabeçalho duplicado do DataFrame {source_list.name}")
         
         return df
     
-    def combine_dataframes(self, df_a, df_b, is_excluded=False):
+    def combine_dataframes(self, df_a, df_b, schema):
         """Combina DataFrames A e B, removendo cabeçalhos duplicados apenas do B"""
         if df_a is None or df_a.empty:
             return df_b if df_b is not None else pd.DataFrame()
@@ -348,16 +2583,10 @@ class ANVISAReferenceDrugsScraper:
         
         # Verificar se o DataFrame B tem cabeçalho duplicado na primeira linha
         if not df_b.empty:
-            first_row_b = df_b.iloc[0]
-            first_row_text = ' '.join([str(val) for val in first_row_b.values if pd.notna(val)])
-            
-            # Palavras-chave que indicam um cabeçalho
-            header_keywords = ['FÁRMACO', 'ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO']
-            
             # Se a primeira linha do B contém várias palavras-chave de cabeçalho, remover
-            keyword_count = sum(1 for keyword in header_keywords if keyword in first_row_text.upper())
-            if keyword_count >= 3:
+            if self.has_header_keywords(df_b.iloc[0].values, schema):
                 df_b = df_b.iloc[1:].reset_index(drop=True)
+                self.metrics.increment('repeated_headers_dropped')
                 logging.info("Removido cabeçalho duplicado do DataFrame B antes da combinação")
         
         # Combinar os DataFrames
@@ -365,138 +2594,768 @@ class ANVISAReferenceDrugsScraper:
         
         return combined_df
     
+    def process_pdf(self, pdf_type, pdf_url, workers=None):
+        """Baixa, extrai e processa um PDF, retornando seu DataFrame"""
+        with self.metrics.source(pdf_type):
+            return self.process_pdf_measured(pdf_type, pdf_url, workers)
+    
+    def process_pdf_measured(self, pdf_type, pdf_url, workers=None):
+        """Corpo de process_pdf, com as medidas atribuídas ao pdf_type"""
+        logging.info(f"Processando {pdf_type}: {pdf_url}")
+        
+        # Baixar PDF
+        with self.metrics.timer('download_pdf'):
+            pdf_content = self.download_pdf(pdf_url)
+        if not pdf_content:
+            return None
+        
+        # Extrair tabela
+        source_list = self.find_list(pdf_type)
+        with self.metrics.timer('extract_table_from_pdf'):
+            header_row, data = self.extract_table_from_pdf(pdf_content, source_list.schema, workers)
+
+        if header_row and data:
+            # Definir colunas baseadas no cabeçalho extraído
+            columns = header_row
+            
+            # Criar DataFrame
+            df = pd.DataFrame(data, columns=columns)
+            
+            # Processar DataFrame
+            with self.metrics.timer('process_dataframe'):
+                df = self.process_dataframe(df, source_list)
+            
+            self.metrics.increment('rows', len(df))
+            logging.info(f"{pdf_type}: {len(df)} registros extraídos")
+            return df
+        else:
+            logging.warning(f"Nenhum dado extraído de {pdf_type}")
+            return None
+    
+    def iter_processed_rows(self, columns, rows, source_list):
+        """Equivalente de process_dataframe linha a linha, para o modo streaming"""
+        schema = source_list.schema
+        date_column = schema.date_column
+        date_index = columns.index(date_column) if date_column in columns else None
+        date_seconds = 0.0
+        
+        for position, row in enumerate(rows):
+            if date_index is not None:
+                start = time.perf_counter()
+                row[date_index] = self.normalize_date_cached(row[date_index])
+                date_seconds += time.perf_counter() - start
+            # Remover cabeçalho duplicado na primeira linha (apenas nas listas marcadas, ex.: Lista B)
+            if position == 0 and source_list.drop_repeated_header and self.has_header_keywords(row, schema):
+                self.metrics.increment('repeated_headers_dropped')
+                logging.info(f"Removido cabeçalho duplicado do DataFrame {source_list.name}")
+                continue
+            yield row
+        
+        if date_index is not None:
+            self.metrics.observe('normalize_dates', date_seconds)
+    
+    def write_csv_rows(self, filename, columns, rows):
+        """Grava as linhas no CSV à medida que chegam e retorna quantas foram gravadas"""
+        count = 0
+        # Mesmo formato de DataFrame.to_csv(index=False, encoding='utf-8-sig')
+        with open(filename, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+    
+    def stream_pdf(self, pdf_type, pdf_url, workers=None):
+        """Baixa o PDF para disco e grava suas linhas direto no CSV, retornando o número de registros"""
+        with self.metrics.source(pdf_type):
+            return self.stream_pdf_measured(pdf_type, pdf_url, workers)
+    
+    def stream_pdf_measured(self, pdf_type, pdf_url, workers=None):
+        """Corpo de stream_pdf, com as medidas atribuídas ao pdf_type"""
+        logging.info(f"Processando {pdf_type}: {pdf_url}")
+        
+        with self.metrics.timer('download_pdf'):
+            path = self.download_pdf_to_file(pdf_url)
+        if not path:
+            return None
+        
+        source_list = self.find_list(pdf_type)
+        # As linhas vão para um arquivo temporário, que só substitui o CSV anterior no final
+        filename = f'{pdf_type}.csv'
+        tmp_path = f'{filename}.tmp'
+        try:
+            pages = self.iter_page_rows(path, source_list.schema, workers)
+            rows = self.iter_table_rows(None, source_list.schema, pages=pages)
+            header_row = next(rows, None)
+            if header_row is None:
+                logging.warning(f"Nenhum dado extraído de {pdf_type}")
+                return None
+            
+            columns = self.standardize_header(header_row, source_list.schema)
+            # Extração, processamento e gravação acontecem juntos, linha a linha
+            with self.metrics.timer('stream_extract_and_write'):
+                count = self.write_csv_rows(tmp_path, columns, self.iter_processed_rows(columns, rows, source_list))
+        except Exception as e:
+            logging.error(f"Erro ao extrair tabela do PDF: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        finally:
+            os.remove(path)
+        
+        if not count:
+            os.remove(tmp_path)
+            logging.warning(f"Nenhum dado extraído de {pdf_type}")
+            return None
+        
+        os.replace(tmp_path, filename)
+
+        self.metrics.increment('rows', count)
+        logging.info(f"{pdf_type}: {count} registros extraídos")
+        logging.info(f"Arquivo individual '{pdf_type}.csv' salvo")
+        return count
+    
+    def combine_csv_files(self, file_a, file_b, filename, schema):
+        """Equivalente de combine_dataframes sobre os CSVs individuais, sem carregá-los na memória"""
+        with open(file_a, encoding='utf-8-sig', newline='') as fa, \
+             open(file_b, encoding='utf-8-sig', newline='') as fb, \
+             open(filename, 'w', encoding='utf-8-sig', newline='') as out:
+            reader_a, reader_b = csv.reader(fa), csv.reader(fb)
+            columns_a, columns_b = next(reader_a), next(reader_b)
+            
+            # Colunas como em pd.concat: as de A seguidas das que só existem em B
+            columns = columns_a + [col for col in columns_b if col not in columns_a]
+            positions_b = [columns_b.index(col) if col in columns_b else None for col in columns]
+            width_a = len(columns) - len(columns_a)
+            
+            writer = csv.writer(out, lineterminator=os.linesep)
+            writer.writerow(columns)
+            count = 0
+            for row in reader_a:
+                writer.writerow(row + [''] * width_a)
+                count += 1
+            for position, row in enumerate(reader_b):
+                # Remover cabeçalho duplicado na primeira linha do B
+                if position == 0 and self.has_header_keywords(row, schema):
+                    logging.info("Removido cabeçalho duplicado do DataFrame B antes da combinação")
+                    continue
+                writer.writerow(['' if i is None else row[i] for i in positions_b])
+                count += 1
+        return count
+    
+    def to_columnar(self, df):
+        """Prepara o DataFrame para formatos colunares: categorias e datas reais"""
+        df = df.copy()
+        
+        # Formatos colunares exigem nomes de coluna únicos
+        if df.columns.duplicated().any():
+            seen = {}
+            columns = []
+            for col in df.columns:
+                columns.append(f"{col}.{seen[col]}" if col in seen else col)
+                seen[col] = seen.get(col, 0) + 1
+            df.columns = columns
+        
+        for col in self.categorical_columns:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        for col in self.date_columns:
+            if col in df.columns:
+                df[col] = self.normalize_dates(df[col], as_datetime=True)
+        return df
+    
+    def write_outputs(self, df, name):
+        """Grava o DataFrame em cada formato de saída configurado e retorna os caminhos"""
+        paths = []
+        columnar_df = None
+        for output in self.outputs:
+            if output.columnar and columnar_df is None:
+                columnar_df = self.to_columnar(df)
+            path = f'{name}{output.extension}'
+            output.write(columnar_df if output.columnar else df, path)
+            paths.append(path)
+        return paths
+    
+    def save_combined_csv(self, counts, lista_a, lista_b, filename):
+        """Combina os CSVs individuais das duas listas disponíveis no arquivo final"""
+        if lista_a in counts and lista_b in counts:
+            count = self.combine_csv_files(f'{lista_a}.csv', f'{lista_b}.csv', filename,
+                                           self.find_list(lista_b).schema)
+            suffix = ""
+        elif lista_a in counts:
+            shutil.copyfile(f'{lista_a}.csv', filename)
+            count, suffix = counts[lista_a], f" (apenas {self.find_list(lista_a).label})"
+        elif lista_b in counts:
+            shutil.copyfile(f'{lista_b}.csv', filename)
+            count, suffix = counts[lista_b], f" (apenas {self.find_list(lista_b).label})"
+        else:
+            return None
+        
+        logging.info(f"Arquivo '{filename}' salvo com {count} registros{suffix}")
+        return count
+    
+    def iter_combined(self, streamed=()):
+        """Gera (nome, colunas, linhas) de cada arquivo combinado desta execução"""
+        for name, _, _, _ in self.combined_outputs:
+            if name in self.combined_frames:
+                df = self.combined_frames[name]
+                yield name, list(df.columns), df.itertuples(index=False, name=None)
+            elif name in streamed:
+                # No modo streaming o CSV combinado é relido linha a linha
+                with open(f'{name}.csv', newline='', encoding='utf-8-sig') as f:
+                    reader = csv.reader(f)
+                    columns = next(reader, None)
+                    if columns:
+                        yield name, columns, reader
+    
+    def diff_snapshots(self, streamed=()):
+        """Compara os arquivos combinados com a execução anterior e grava o changeset"""
+        diff = SnapshotDiff(self.diff_dir)
+        for name, columns, rows in self.iter_combined(streamed):
+            diff.compare(name, columns, rows)
+        
+        # Saídas de registros para os excluídos são procuradas entre o primeiro par incluídos/excluídos
+        included = next((name for name, _, _, is_excluded in self.combined_outputs if not is_excluded), None)
+        excluded = next((name for name, _, _, is_excluded in self.combined_outputs if is_excluded), None)
+        return diff.save(included, excluded)
+    
+    def store_snapshots(self, streamed=()):
+        """Aplica os arquivos combinados desta execução no banco SQLite"""
+        store = SQLiteStore(self.sqlite_path)
+        try:
+            return store.save_run(self.iter_combined(streamed))
+        finally:
+            store.close()
+
+    def save_lookup(self, streamed=()):
+        """Constrói o índice de consultas com os arquivos combinados e grava o snapshot"""
+        lookup = ReferenceLookup()
+        for name, columns, rows in self.iter_combined(streamed):
+            lookup.add_rows(name, columns, rows)
+        lookup.build()
+        lookup.save(self.lookup_path)
+        logging.info(f"Índice de consultas '{self.lookup_path}' salvo com {len(lookup.records)} registros")
+        return lookup
+    
+    def save_combined(self, dataframes, lista_a, lista_b, name):
+        """Combina as duas listas disponíveis e salva o resultado nos formatos de saída"""
+        if lista_a in dataframes and lista_b in dataframes:
+            with self.metrics.timer('combine_dataframes'):
+                df = self.combine_dataframes(dataframes[lista_a], dataframes[lista_b], self.find_list(lista_b).schema)
+            suffix = ""
+        elif lista_a in dataframes:
+            df = dataframes[lista_a]
+            suffix = f" (apenas {self.find_list(lista_a).label})"
+        elif lista_b in dataframes:
+            df = dataframes[lista_b]
+            suffix = f" (apenas {self.find_list(lista_b).label})"
+        else:
+            return None
+        
+        with self.metrics.source(name), self.metrics.timer('write_outputs'):
+            filenames = self.write_outputs(df, name)
+        for filename in filenames:
+            logging.info(f"Arquivo '{filename}' salvo com {len(df)} registros{suffix}")
+        self.combined_frames[name] = df
+        return df
+    
+    def export_metrics(self):
+        """Grava o relatório JSON, o textfile do Prometheus e o perfil, conforme configurado"""
+        if self.metrics_json:
+            self.metrics.write_json(self.metrics_json)
+            logging.info(f"Relatório de medidas salvo em '{self.metrics_json}'")
+        if self.metrics_textfile:
+            self.metrics.write_prometheus(self.metrics_textfile)
+            logging.info(f"Métricas Prometheus salvas em '{self.metrics_textfile}'")
+        self.write_profile()
+    
     def run(self):
-        """Executa o processo completo"""
+        """Executa o processo completo, medindo cada etapa"""
+        self.metrics.reset()
+        try:
+            return self.run_pipeline()
+        finally:
+            # As medidas são exportadas também quando a execução falha
+            self.metrics.finish()
+            self.export_metrics()
+    
+    def run_pipeline(self):
+        """Etapas de run(): página, links, PDFs, arquivos combinados e saídas opcionais"""
         logging.info("Iniciando scraping da ANVISA...")
         
-        # 1. Acessar página principal
-        html_content = self.fetch_page(self.base_url)
-        if not html_content:
+        # 1 e 2. Acessar a página de cada fonte e extrair os links dos PDFs
+        pdf_links = self.find_pdf_links()
+        if pdf_links is None:
             logging.error("Falha ao acessar a página principal")
             return
         
-        # 2. Extrair links dos PDFs
-        pdf_links = self.extract_pdf_links(html_content)
-        
         if not pdf_links:
             logging.error("Nenhum link de PDF encontrado")
             return
         
-        # 3. Processar cada PDF
+        # 3. Processar os PDFs de todas as fontes em paralelo (mesma sessão e caches): cada
+        #    thread baixa seu PDF e já extrai a tabela, sobrepondo a rede com o processamento
         dataframes = {}
+        self.combined_frames = {}
+        pending = list(self.combined_outputs)
+        process = self.stream_pdf if self.streaming else self.process_pdf
+        if self.streaming and any(not isinstance(output, CSVOutput) for output in self.outputs):
+            logging.warning("O modo streaming grava apenas CSV; demais formatos ignorados")
         
-        for pdf_type, pdf_url in pdf_links.items():
-            logging.info(f"Processando {pdf_type}: {pdf_url}")
-            
-            # Baixar PDF
-            pdf_content = self.download_pdf(pdf_url)
-            if not pdf_content:
-                continue
-            
-            # Extrair tabela
-            is_excluded = 'excluidos' in pdf_type
-            header_row, data = self.extract_table_from_pdf(pdf_content, is_excluded)
+        # Os PDFs são extraídos ao mesmo tempo: os processos de extração são divididos entre
+        # eles para que o total não passe de extraction_workers (no mínimo um por lista). Com
+        # profiler, uma lista por vez: a partir do Python 3.12 o cProfile (sys.monitoring) não
+        # aceita dois perfis ativos ao mesmo tempo, mesmo em threads diferentes
+        concurrent = 1 if self.profiler else len(pdf_links)
+        share, extra = divmod(self.extraction_workers, concurrent)
+        workers = {pdf_type: max(1, share + (i < extra)) for i, pdf_type in enumerate(pdf_links)}
+        
+        with ThreadPoolExecutor(max_workers=concurrent) as executor:
+            futures = {executor.submit(process, pdf_type, pdf_url, workers[pdf_type]): pdf_type
+                       for pdf_type, pdf_url in pdf_links.items()}
+            done = set()
+            streamed = set()
+            # Listas encontradas na página cujo processamento falhou
+            failed = set()
             
-            if header_row and data:
-                # Definir colunas baseadas no cabeçalho extraído
-                columns = header_row
-                
-                # Criar DataFrame
-                df = pd.DataFrame(data, columns=columns)
-                
-                # Processar DataFrame
-                is_lista_b = 'lista_b' in pdf_type
-                df = self.process_dataframe(df, is_excluded, is_lista_b)
+            for future in as_completed(futures):
+                pdf_type = futures[future]
+                done.add(pdf_type)
+                df = future.result()
+                if df is not None:
+                    dataframes[pdf_type] = df
+                else:
+                    failed.add(pdf_type)
                 
-                dataframes[pdf_type] = df
-                logging.info(f"{pdf_type}: {len(df)} registros extraídos")
-            else:
-                logging.warning(f"Nenhum dado extraído de {pdf_type}")
+                # 4. Combinar cada par assim que as duas metades estiverem prontas
+                for output in list(pending):
+                    name, lista_a, lista_b, _ = output
+                    if all(name in done or name not in pdf_links for name in (lista_a, lista_b)):
+                        missing = [part for part in (lista_a, lista_b) if part in failed]
+                        if missing:
+                            # Um combinado sem uma das metades pareceria completo para quem o lê
+                            logging.error(f"'{name}' não gravado: falha em {', '.join(missing)} "
+                                          f"(o arquivo anterior, se houver, foi mantido)")
+                        elif self.streaming:
+                            with self.metrics.source(name), self.metrics.timer('write_outputs'):
+                                count = self.save_combined_csv(dataframes, lista_a, lista_b, f'{name}.csv')
+                            if count is not None:
+                                streamed.add(name)
+                        else:
+                            self.save_combined(dataframes, lista_a, lista_b, name)
+                        pending.remove(output)
+        
+        # Manter a ordem dos links encontrados na página
+        dataframes = {name: dataframes[name] for name in pdf_links if name in dataframes}
+        
+        # 5. Registrar apenas o que mudou desde a execução anterior (com listas faltando,
+        #    os registros delas apareceriam como removidos)
+        if failed:
+            logging.error(f"Falha ao processar {', '.join(sorted(failed))}; alterações, banco e índice "
+                          f"de consultas não foram atualizados")
+        else:
+            if self.diff_dir:
+                with self.metrics.timer('diff_snapshots'):
+                    self.diff_snapshots(streamed)
+            if self.sqlite_path:
+                with self.metrics.timer('store_snapshots'):
+                    self.store_snapshots(streamed)
+            if self.lookup_path:
+                with self.metrics.timer('save_lookup'):
+                    self.save_lookup(streamed)
         
-        # 4. Combinar DataFrames
-        # Combinar incluídos
-        if 'lista_a' in dataframes and 'lista_b' in dataframes:
-            df_incluidos = self.combine_dataframes(dataframes['lista_a'], dataframes['lista_b'], is_excluded=False)
-            df_incluidos.to_csv('medicamentos_referencia_incluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_incluidos.csv' salvo com {len(df_incluidos)} registros")
-        elif 'lista_a' in dataframes:
-            df_incluidos = dataframes['lista_a']
-            df_incluidos.to_csv('medicamentos_referencia_incluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_incluidos.csv' salvo com {len(df_incluidos)} registros (apenas Lista A)")
-        elif 'lista_b' in dataframes:
-            df_incluidos = dataframes['lista_b']
-            df_incluidos.to_csv('medicamentos_referencia_incluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_incluidos.csv' salvo com {len(df_incluidos)} registros (apenas Lista B)")
-        
-        # Combinar excluídos
-        if 'lista_a_excluidos' in dataframes and 'lista_b_excluidos' in dataframes:
-            df_excluidos = self.combine_dataframes(dataframes['lista_a_excluidos'], dataframes['lista_b_excluidos'], is_excluded=True)
-            df_excluidos.to_csv('medicamentos_referencia_excluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_excluidos.csv' salvo com {len(df_excluidos)} registros")
-        elif 'lista_a_excluidos' in dataframes:
-            df_excluidos = dataframes['lista_a_excluidos']
-            df_excluidos.to_csv('medicamentos_referencia_excluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_excluidos.csv' salvo com {len(df_excluidos)} registros (apenas Lista A)")
-        elif 'lista_b_excluidos' in dataframes:
-            df_excluidos = dataframes['lista_b_excluidos']
-            df_excluidos.to_csv('medicamentos_referencia_excluidos.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo 'medicamentos_referencia_excluidos.csv' salvo com {len(df_excluidos)} registros (apenas Lista B)")
+        # No modo streaming os CSVs já foram gravados e o retorno traz o número de registros
+        if self.streaming:
+            if failed:
+                logging.error("Processo concluído com falhas")
+                return None
+            logging.info("Processo concluído!")
+            return dataframes
         
         # Salvar também os DataFrames individuais para referência
         for name, df in dataframes.items():
-            df.to_csv(f'{name}.csv', index=False, encoding='utf-8-sig')
-            logging.info(f"Arquivo individual '{name}.csv' salvo")
+            with self.metrics.source(name), self.metrics.timer('write_outputs'):
+                filenames = self.write_outputs(df, name)
+            for filename in filenames:
+                logging.info(f"Arquivo individual '{filename}' salvo")
+        
+        # Uma execução com listas faltando conta como falha (ex.: o modo contínuo tenta de novo)
+        if failed:
+            logging.error("Processo concluído com falhas")
+            return None
         
         logging.info("Processo concluído!")
         
         # Retornar DataFrames para possível uso adicional
         return dataframes
 
-# Versão alternativa da função normalize_date para testar separadamente
-def normalize_date_alt(date_str):
-    """Função alternativa para normalização de datas"""
-    if not date_str or pd.isna(date_str):
-        return ''
-    
-    date_str = str(date_str).strip()
-    
-    # Se já tem pontos, apenas formatar
-    if '.' in date_str and '/' not in date_str:
-        parts = date_str.split('.')
-        if len(parts) == 3:
-            return f"{parts[0].zfill(2)}.{parts[1].zfill(2)}.{parts[2]}"
-    
-    # Se tem múltiplas datas, pegar a última
-    if ';' in date_str:
-        dates = date_str.split(';')
-        date_str = dates[-1].strip()
-    
-    # Remover qualquer coisa que não seja número, / ou .
-    date_str = re.sub(r'[^\d/\.]', '', date_str)
-    
-    # Se é apenas números (ex: 12112012)
-    if date_str.isdigit():
-        if len(date_str) == 8:  # DDMMYYYY
-            return f"{date_str[:2]}.{date_str[2:4]}.{date_str[4:]}"
-        elif len(date_str) == 6:  # DDMMYY
-            day = date_str[:2]
-            month = date_str[2:4]
-            year = date_str[4:]
-            year = f"20{year}" if int(year) < 50 else f"19{year}"
-            return f"{day}.{month}.{year}"
-    
-    # Se tem formato com /
-    if '/' in date_str:
-        parts = date_str.split('/')
-        if len(parts) == 3:
-            day = parts[0].zfill(2)
-            month = parts[1].zfill(2)
-            year = parts[2]
-            if len(year) == 2:
-                year = f"20{year}" if int(year) < 50 else f"19{year}"
-            return f"{day}.{month}.{year}"
-    
-    return date_str
+
+class PipelineWatcher:
+    """Modo contínuo: consulta a página da ANVISA periodicamente e só executa o pipeline se algo mudou
+    
+    A impressão digital de cada lista combina a URL encontrada por extract_pdf_links com
+    os metadados do HEAD do PDF (ETag, Last-Modified e tamanho). As consultas seguem o
+    intervalo com jitter; falhas repetem com backoff exponencial. SIGINT/SIGTERM encerram
+    o laço depois da etapa em andamento, e um endpoint /health em localhost informa o estado.
+    """
+    
+    # Cabeçalhos do HEAD que identificam uma versão do PDF
+    FINGERPRINT_HEADERS = ('ETag', 'Last-Modified', 'Content-Length')
+    
+    def __init__(self, scraper, interval=3600, jitter=0.1, retry_interval=60, max_backoff=6 * 3600,
+                 state_path=None, health_port=None):
+        self.scraper = scraper
+        self.interval = interval
+        # Fração aleatória (±) aplicada a cada espera, para não consultar sempre no mesmo instante
+        self.jitter = jitter
+        self.retry_interval = retry_interval
+        self.max_backoff = max_backoff
+        # Impressões digitais da última execução bem-sucedida (só em memória sem state_path)
+        self.state_path = state_path
+        self.health_port = health_port
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.fingerprints = self.load_state()
+        self.health_server = None
+        self.status = {'started_at': datetime.now().isoformat(timespec='seconds'), 'checks': 0, 'runs': 0,
+                       'failures': 0, 'last_check': None, 'last_change': None, 'last_run': None,
+                       'last_error': None, 'next_check': None, 'running': False}
+    
+    def load_state(self):
+        """Lê as impressões digitais gravadas pela execução anterior do modo contínuo"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding='utf-8') as f:
+            return json.load(f).get('lists', {})
+    
+    def save_state(self):
+        """Grava as impressões digitais atuais (substituição atômica)"""
+        if not self.state_path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': datetime.now().isoformat(timespec='seconds'), 'lists': self.fingerprints},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+    
+    def head_metadata(self, url):
+        """Metadados do PDF sem baixar o corpo (GET sem leitura se o servidor recusar o HEAD)"""
+        session = self.scraper.session
+        response = self.scraper.downloader.head(url)
+        if response.status_code in (405, 501):
+            with session.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                headers = response.headers
+        else:
+            response.raise_for_status()
+            headers = response.headers
+        return {name: headers.get(name) for name in self.FINGERPRINT_HEADERS}
+    
+    def fingerprint(self):
+        """Impressão digital de cada lista: URL do PDF e metadados do HEAD"""
+        pdf_links = self.scraper.find_pdf_links()
+        if pdf_links is None:
+            raise RuntimeError("Falha ao acessar a página principal")
+        if not pdf_links:
+            raise RuntimeError("Nenhum link de PDF encontrado")
+        
+        fingerprints = {}
+        for name, url in pdf_links.items():
+            entry = {'url': url, **self.head_metadata(url)}
+            entry['hash'] = hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
+            fingerprints[name] = entry
+        return fingerprints
+    
+    def changed_lists(self, fingerprints):
+        """Listas novas, removidas ou com impressão digital diferente da última execução"""
+        names = set(fingerprints) | set(self.fingerprints)
+        return sorted(name for name in names
+                      if (fingerprints.get(name) or {}).get('hash') != (self.fingerprints.get(name) or {}).get('hash'))
+    
+    def check(self):
+        """Uma consulta: compara as impressões digitais e executa o pipeline se alguma lista mudou"""
+        fingerprints = self.fingerprint()
+        changed = self.changed_lists(fingerprints)
+        with self.lock:
+            self.status['checks'] += 1
+            self.status['last_check'] = datetime.now().isoformat(timespec='seconds')
+        if not changed:
+            logging.info("Nenhuma lista mudou desde a última execução")
+            return False
+        
+        logging.info(f"Listas alteradas: {', '.join(changed)}; executando o pipeline")
+        with self.lock:
+            self.status['last_change'] = self.status['last_check']
+            self.status['running'] = True
+        try:
+            results = self.scraper.run()
+        finally:
+            with self.lock:
+                self.status['running'] = False
+        if not results:
+            raise RuntimeError("A execução do pipeline falhou")
+        
+        # Só uma execução bem-sucedida atualiza o estado; em caso de falha a próxima consulta tenta de novo
+        self.fingerprints = fingerprints
+        self.save_state()
+        with self.lock:
+            self.status['runs'] += 1
+            self.status['last_run'] = datetime.now().isoformat(timespec='seconds')
+        return True
+    
+    def next_delay(self, failures):
+        """Espera até a próxima consulta: intervalo normal ou backoff exponencial, com jitter"""
+        if failures:
+            delay = min(self.max_backoff, self.retry_interval * 2 ** (failures - 1))
+        else:
+            delay = self.interval
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def stop(self, *args):
+        """Pede o encerramento do laço (também usado como tratador de sinal)"""
+        logging.info("Encerrando o modo contínuo...")
+        self.stop_event.set()
+    
+    def start_health_server(self):
+        """Sobe o endpoint /health em 127.0.0.1:health_port numa thread em segundo plano"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        watcher = self
+        
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/health'):
+                    self.send_error(404)
+                    return
+                with watcher.lock:
+                    status = dict(watcher.status)
+                # 503 enquanto a última consulta estiver falhando
+                body = json.dumps({'status': 'error' if status['failures'] else 'ok', **status}).encode('utf-8')
+                self.send_response(503 if status['failures'] else 200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                logging.debug(f"health: {format % args}")
+        
+        self.health_server = ThreadingHTTPServer(('127.0.0.1', self.health_port), HealthHandler)
+        threading.Thread(target=self.health_server.serve_forever, daemon=True).start()
+        logging.info(f"Endpoint de saúde em http://127.0.0.1:{self.health_server.server_address[1]}/health")
+    
+    def run_forever(self):
+        """Laço do modo contínuo, até SIGINT/SIGTERM ou stop()"""
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                handlers[signum] = signal.signal(signum, self.stop)
+        if self.health_port is not None:
+            self.start_health_server()
+        
+        failures = 0
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.check()
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    logging.error(f"Falha na consulta ({failures} seguida(s)): {e}")
+                    with self.lock:
+                        self.status['last_error'] = f"{datetime.now().isoformat(timespec='seconds')}: {e}"
+                
+                delay = self.next_delay(failures)
+                with self.lock:
+                    self.status['failures'] = failures
+                    self.status['next_check'] = datetime.fromtimestamp(time.time() + delay).isoformat(timespec='seconds')
+                logging.info(f"Próxima consulta em {delay:.0f}s")
+                self.stop_event.wait(delay)
+        finally:
+            if self.health_server:
+                self.health_server.shutdown()
+                self.health_server.server_close()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+class Backfill:
+    """Processa versões históricas das listas a partir de um manifesto de URLs ou de um diretório de PDFs
+    
+    Cada documento vira um arquivo próprio ({lista}_{AAAA-MM-DD}_{hash}), com a coluna DATA DA VERSÃO.
+    Os documentos são processados em até `workers` processos, um documento por vez em cada
+    um, e o checkpoint é gravado a cada documento concluído: uma nova execução pula o
+    que já foi feito e tenta de novo o que falhou.
+    """
+    
+    VERSION_COLUMN = 'DATA DA VERSÃO'
+    MONTHS = {'janeiro': 1, 'fevereiro': 2, 'marco': 3, 'abril': 4, 'maio': 5, 'junho': 6, 'julho': 7,
+              'agosto': 8, 'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12}
+    # Datas no nome do arquivo/URL: 2023-05-12, 12-05-2023, 20230512 ou maio-2023
+    DATE_PATTERNS = [
+        (re.compile(r'(?<!\d)(\d{4})[-_.](\d{1,2})[-_.](\d{1,2})(?!\d)'), ('year', 'month', 'day')),
+        (re.compile(r'(?<!\d)(\d{1,2})[-_.](\d{1,2})[-_.](\d{4})(?!\d)'), ('day', 'month', 'year')),
+        (re.compile(r'(?<!\d)(20\d{2})(\d{2})(\d{2})(?!\d)'), ('year', 'month', 'day')),
+    ]
+    MONTH_PATTERN = re.compile(r'(janeiro|fevereiro|marco|abril|maio|junho|julho|agosto|setembro|outubro|'
+                               r'novembro|dezembro)[-_. ]*(?:de[-_. ]*)?(\d{4})')
+    
+    def __init__(self, scraper, output_dir, workers=1):
+        self.scraper = scraper
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_path = os.path.join(output_dir, 'checkpoint.json')
+        os.makedirs(output_dir, exist_ok=True)
+    
+    def load_manifest(self, path):
+        """Lê o manifesto: uma URL ou caminho por linha, seguido opcionalmente da lista e da data"""
+        items = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                item = {'source': fields[0], 'lista': None, 'versao': None}
+                for field in fields[1:]:
+                    if field in LIST_NAMES:
+                        item['lista'] = field
+                    else:
+                        item['versao'] = self.parse_version(field)
+                items.append(item)
+        return items
+    
+    def scan_directory(self, directory):
+        """Documentos de um diretório local (todos os PDFs, em ordem de nome)"""
+        return [{'source': os.path.abspath(os.path.join(directory, name)), 'lista': None, 'versao': None}
+                for name in sorted(os.listdir(directory)) if name.lower().endswith('.pdf')]
+    
+    def parse_version(self, text):
+        """Data da versão (AAAA-MM-DD) encontrada no texto, ou None"""
+        text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+        for pattern, order in self.DATE_PATTERNS:
+            for match in pattern.finditer(text):
+                parts = dict(zip(order, map(int, match.groups())))
+                try:
+                    return datetime(parts['year'], parts['month'], parts['day']).strftime('%Y-%m-%d')
+                except ValueError:
+                    continue
+        match = self.MONTH_PATTERN.search(text)
+        if match:
+            return f"{int(match.group(2)):04d}-{self.MONTHS[match.group(1)]:02d}-01"
+        return None
+    
+    def list_name(self, source):
+        """Lista (ex.: lista_b_excluidos) identificada pelo nome do arquivo, ou None"""
+        source_list = find_list_for_file(source)
+        return source_list.name if source_list else None
+    
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            return json.load(f)
+    
+    def save_checkpoint(self, checkpoint):
+        """Grava o checkpoint (substituição atômica, seguro contra interrupções)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def is_done(self, entry):
+        """Documento concluído em execução anterior e com as saídas ainda no disco"""
+        return bool(entry) and entry.get('status') == 'ok' and all(os.path.exists(path) for path in entry['arquivos'])
+    
+    def file_sha256(self, path, chunk_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def process_document(self, item):
+        """Baixa (se for URL), extrai, normaliza e grava um documento; retorna a entrada do checkpoint"""
+        source = item['source']
+        is_url = source.startswith(('http://', 'https://'))
+        path = None
+        try:
+            lista = item['lista'] or self.list_name(source)
+            if lista is None:
+                raise ValueError("lista não identificada pelo nome; informe-a no manifesto")
+            
+            path = self.scraper.download_pdf_to_file(source) if is_url else source
+            if path is None:
+                raise RuntimeError("falha no download")
+            
+            # Sem data no manifesto nem no nome, vale o Last-Modified (URL) ou a data do arquivo
+            versao = item['versao'] or self.parse_version(source)
+            if versao is None and is_url:
+                last_modified = self.scraper.downloader.head(source).headers.get('Last-Modified')
+                if last_modified:
+                    from email.utils import parsedate_to_datetime
+                    versao = parsedate_to_datetime(last_modified).strftime('%Y-%m-%d')
+            if versao is None:
+                versao = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d')
+            
+            source_list = self.scraper.find_list(lista)
+            header_row, data = self.scraper.extract_table_from_pdf(path, source_list.schema, workers=1)
+            if header_row is None:
+                raise ValueError("tabela não encontrada no PDF")
+            df = self.scraper.process_dataframe(pd.DataFrame(data, columns=header_row), source_list)
+            df[self.VERSION_COLUMN] = datetime.strptime(versao, '%Y-%m-%d').strftime('%d.%m.%Y')
+            
+            # O hash do PDF no nome separa documentos diferentes com a mesma lista e data; o mesmo
+            # documento reprocessado (ex.: interrompido antes do checkpoint) sobrescreve sua saída
+            digest = self.file_sha256(path)
+            files = self.scraper.write_outputs(df, os.path.join(self.output_dir, f'{lista}_{versao}_{digest[:8]}'))
+            return {'status': 'ok', 'lista': lista, 'versao': versao, 'registros': len(df), 'sha256': digest,
+                    'arquivos': files, 'concluido_em': datetime.now().isoformat(timespec='seconds')}
+        except Exception as e:
+            return {'status': 'erro', 'erro': str(e), 'concluido_em': datetime.now().isoformat(timespec='seconds')}
+        finally:
+            if is_url and path:
+                os.remove(path)
+    
+    def run(self, items):
+        """Processa os documentos pendentes com no máximo `workers` em andamento; retorna o checkpoint"""
+        checkpoint = self.load_checkpoint()
+        pending = [item for item in items if not self.is_done(checkpoint.get(item['source']))]
+        logging.info(f"Backfill: {len(items) - len(pending)} documentos já concluídos, {len(pending)} pendentes")
+        
+        def record(item, entry):
+            checkpoint[item['source']] = entry
+            self.save_checkpoint(checkpoint)
+            if entry['status'] == 'ok':
+                logging.info(f"{item['source']}: {entry['registros']} registros ({entry['lista']}, {entry['versao']})")
+            else:
+                logging.error(f"{item['source']}: {entry['erro']}")
+        
+        if self.workers == 1 or len(pending) <= 1:
+            for item in pending:
+                record(item, self.process_document(item))
+            return checkpoint
+        
+        # Poucos documentos em andamento por vez: a memória não cresce com o tamanho do manifesto
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_backfill_worker,
+                                 initargs=(self,)) as executor:
+            queue = iter(pending)
+            running = {}
+            try:
+                while True:
+                    for item in queue:
+                        running[executor.submit(_backfill_document, item)] = item
+                        if len(running) >= self.workers * 2:
+                            break
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(running.pop(future), future.result())
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+        return checkpoint
+
 
 # Teste da função de normalização
 def test_date_normalization():
@@ -511,57 +3370,394 @@ def test_date_normalization():
         ("", ""),
         (None, ""),
         ("12012023", "12.01.2023"),
-        ("10115", "10.01.2015"),
+        # Cinco dígitos são ambíguos (01.01.2015 ou 10.01.2015?) e ficam como estão
+        ("10115", "10115"),
     ]
     
+    scraper = ANVISAReferenceDrugsScraper(None)
+    inputs = pd.Series([input_date for input_date, _ in test_cases], dtype=object)
+    results = scraper.normalize_dates(inputs).tolist()
+    
     print("Testando normalização de datas:")
-    for input_date, expected in test_cases:
-        result = normalize_date_alt(input_date)
-        status = "✓" if result == expected else "✗"
+    passed = True
+    for (input_date, expected), result in zip(test_cases, results):
+        ok = result == expected
+        status = "✓" if ok else "✗"
+        # A versão vetorizada deve coincidir com normalize_date valor a valor
+        if result != scraper.normalize_date(input_date):
+            ok = False
+            status += " (difere de normalize_date)"
+        passed = passed and ok
         print(f"  {status} '{input_date}' -> '{result}' (esperado: '{expected}')")
+    return passed
 
-# Executar o scraper
-if __name__ == "__main__":
-    # Primeiro testar a normalização de datas
-    test_date_normalization()
-    print("\n" + "="*50 + "\n")
+# Resumo da execução a partir dos DataFrames em memória
+def print_summary(results, combined):
+    """Imprime o resumo dos arquivos gerados, sem reler os arquivos do disco"""
+    # Arquivos combinados das fontes registradas, com os nomes das listas que os compõem
+    outputs = [output for source in SOURCES.values() for output in source.combined if output[0] in combined]
+    print("\nResumo dos arquivos gerados:")
+    for name, first, second, _ in outputs:
+        print(f"- {name}.csv ({find_list(first).label} + {find_list(second).label})")
+    print("\nArquivos individuais:")
+    for name, df in results.items():
+        print(f"- {name}.csv: {len(df)} registros")
+    
+    for name, first, _, _ in outputs:
+        df = combined[name]
+        date_column = find_list(first).schema.date_column
+        print(f"\nTotal {name}: {len(df)} registros")
+        print(f"Colunas: {', '.join(df.columns)}")
+        
+        # Verificar algumas datas para ver se foram normalizadas
+        if date_column in df.columns:
+            dates_sample = df[date_column].head(10).tolist()
+            print("\nAmostra de datas (primeiras 10):")
+            for i, date in enumerate(dates_sample, 1):
+                print(f"  {i:2}. {date}")
+
+# Micro-benchmark da detecção de cabeçalho
+def benchmark_header_detection(rows=100000):
+    """Compara a detecção de cabeçalho com a varredura ingênua de palavras-chave"""
+    import timeit
+    
+    scraper = ANVISAReferenceDrugsScraper(None)
+    data_row = ['amoxicilina + clavulanato de potássio', 'EMPRESA LTDA', 'MEDICAMENTO X', '100000000',
+                '500 mg + 125 mg', 'COMPRIMIDO REVESTIDO', '12.11.2012', 'Cancelamento do registro']
+    header_row = ['FÁRMACO/ ASSOCIAÇÃO', 'DETENTOR', 'MEDICAMENTO', 'REGISTRO', 'CONCENTRAÇÃO',
+                  'FORMA FARMACÊUTICA', 'DATA DE EXCLUSÃO', 'MOTIVO DA EXCLUSÃO']
+    
+    def naive(row):
+        # Implementação anterior: junta, converte e procura cada palavra-chave sem parada antecipada
+        row_text = ' '.join([str(cell) for cell in row if cell])
+        return sum(1 for keyword in REFERENCE_HEADER_KEYWORDS if keyword in row_text.upper()) >= 3
+    
+    heuristic = HeaderDetector(REFERENCE_HEADER_KEYWORDS, 3, max_page_row=2, min_cells=3)
+    candidates = {
+        'ingênuo': lambda row, page_row: naive(row),
+        'HeaderDetector': lambda row, page_row: scraper.is_header_row(row, REFERENCE_EXCLUDED, page_row),
+        'HeaderDetector + heurísticas': heuristic.is_header,
+    }
+    
+    print("Detecção de cabeçalho (linhas/s):")
+    for name, detect in candidates.items():
+        # Uma página típica: cabeçalho na primeira linha e ~25 linhas de dados
+        results = []
+        for label, row, page_row in (('dados', data_row, 10), ('cabeçalho', header_row, 0)):
+            seconds = timeit.timeit(lambda: detect(row, page_row), number=rows)
+            results.append(f"{label}: {rows / seconds:,.0f}")
+        print(f"  {name:30} {' | '.join(results)}")
+
+
+def output_formats(value):
+    """Tipo de --formats: lista de formatos de saída separados por vírgula"""
+    formats = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"formatos inválidos: '{value}' "
+                                         f"(disponíveis: {', '.join(OUTPUT_FORMATS)})")
+    return formats
+
+
+def source_options(args):
+    """Fontes, downloads (novas tentativas, limite por host) e caches (desativados com --no-cache)"""
+    options = {'download_retries': args.retries, 'rate_limit': args.rate_limit, 'sources': args.sources}
+    if not args.no_cache:
+        options.update(cache_dir=os.path.join(args.cache_dir, 'http'),
+                       page_cache_dir=os.path.join(args.cache_dir, 'pages'))
+    return options
+
+
+def fetch_links(scraper):
+    """Links dos PDFs das páginas das fontes (vazio em caso de falha)"""
+    return scraper.find_pdf_links() or {}
+
+
+def command_links(args):
+    """Lista os links dos PDFs encontrados na página"""
+    scraper = ANVISAReferenceDrugsScraper(args.url, **source_options(args))
+    pdf_links = fetch_links(scraper)
+    if args.json:
+        print(json.dumps(pdf_links, ensure_ascii=False, indent=2))
+    else:
+        for name, url in pdf_links.items():
+            print(f"{name}\t{url}")
+    return 0 if pdf_links else 1
+
+
+def command_fetch(args):
+    """Baixa os PDFs das listas para o diretório indicado"""
+    scraper = ANVISAReferenceDrugsScraper(args.url, **source_options(args))
+    pdf_links = fetch_links(scraper)
+    if not pdf_links:
+        return 1
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    failed = False
+    for name, url in pdf_links.items():
+        if args.lists and name not in args.lists:
+            continue
+        path = os.path.join(args.output_dir, f'{name}.pdf')
+        try:
+            scraper.get_to_file(url, path)
+        except Exception as e:
+            logging.error(f"Erro ao baixar PDF {url}: {e}")
+            failed = True
+            continue
+        print(path)
+    return 1 if failed else 0
+
+
+def command_extract(args):
+    """Extrai a tabela de um PDF local e grava nos formatos pedidos"""
+    scraper = ANVISAReferenceDrugsScraper(None, extraction_workers=args.workers, output_formats=args.formats,
+                                          extraction_engine=args.engine)
+    # Sem --list, a lista vem do nome do arquivo (ex.: lista_b_excluidos.pdf)
+    source_list = find_list(args.list) if args.list else find_list_for_file(args.pdf)
+    if source_list is None:
+        logging.error(f"Lista não identificada pelo nome de '{args.pdf}'; informe --list")
+        return 1
     
-    # Depois executar o scraper
-    url = "https://www.gov.br/anvisa/pt-br/setorregulado/regularizacao/medicamentos/medicamentos-de-referencia/lista-de-medicamentos-de-referencia"
+    header_row, data = scraper.extract_table_from_pdf(args.pdf, source_list.schema)
+    if header_row is None:
+        logging.error(f"Nenhuma tabela encontrada em '{args.pdf}'")
+        return 1
+    
+    df = scraper.process_dataframe(pd.DataFrame(data, columns=header_row), source_list)
+    name = args.output or os.path.splitext(args.pdf)[0]
+    for path in scraper.write_outputs(df, name):
+        logging.info(f"Arquivo '{path}' salvo com {len(df)} registros")
+    return 0
+
+
+def command_run(args):
+    """Executa o pipeline completo (ou o modo contínuo, com --watch)"""
+    # Um processo de extração por núcleo disponível, com o motor escolhido em --engine;
+    # as alterações em relação à execução anterior ficam em alteracoes/changeset_*.json
+    scraper = ANVISAReferenceDrugsScraper(args.url, extraction_workers=args.workers, streaming=args.streaming,
+                                          output_formats=args.formats, diff_dir=args.diff_dir or None,
+                                          sqlite_path=args.sqlite, lookup_path=args.lookup,
+                                          metrics_json=args.metrics_json, metrics_textfile=args.metrics_textfile,
+                                          extraction_engine=args.engine, **source_options(args))
+    if args.watch:
+        # Consulta periódica; o pipeline só roda quando uma lista muda
+        watcher = PipelineWatcher(scraper, interval=args.interval,
+                                  state_path=os.path.join(args.cache_dir, 'watch.json'),
+                                  health_port=args.health_port)
+        watcher.run_forever()
+        return 0
     
-    scraper = ANVISAReferenceDrugsScraper(url)
     results = scraper.run()
+    if not results:
+        return 1
+    if args.streaming:
+        # No modo streaming só as contagens ficam em memória; o resumo relê os CSVs
+        summarize_directory('.')
+    else:
+        print_summary(results, scraper.combined_frames)
+    return 0
+
+
+def command_backfill(args):
+    """Processa versões históricas das listas (manifesto ou diretório), retomando do checkpoint"""
+    scraper = ANVISAReferenceDrugsScraper(None, output_formats=args.formats, extraction_engine=args.engine)
+    backfill = Backfill(scraper, args.output_dir, args.workers)
+    items = backfill.load_manifest(args.manifest) if args.manifest else backfill.scan_directory(args.dir)
+    checkpoint = backfill.run(items)
     
-    if results:
-        print("\nResumo dos arquivos gerados:")
-        print("- medicamentos_referencia_incluidos.csv (Lista A + Lista B)")
-        print("- medicamentos_referencia_excluidos.csv (Lista A excluídos + Lista B excluídos)")
-        print("\nArquivos individuais:")
-        for name, df in results.items():
-            print(f"- {name}.csv: {len(df)} registros")
-        
-        # Verificar arquivos finais
-        import os
-        if os.path.exists('medicamentos_referencia_incluidos.csv'):
-            df_incluidos = pd.read_csv('medicamentos_referencia_incluidos.csv')
-            print(f"\nTotal incluídos: {len(df_incluidos)} registros")
-            print(f"Colunas: {', '.join(df_incluidos.columns)}")
-            
-            # Verificar algumas datas para ver se foram normalizadas
-            if 'DATA INCLUSÃO' in df_incluidos.columns:
-                dates_sample = df_incluidos['DATA INCLUSÃO'].head(10).tolist()
-                print("\nAmostra de datas (primeiras 10):")
-                for i, date in enumerate(dates_sample, 1):
-                    print(f"  {i:2}. {date}")
-        
-        if os.path.exists('medicamentos_referencia_excluidos.csv'):
-            df_excluidos = pd.read_csv('medicamentos_referencia_excluidos.csv')
-            print(f"\nTotal excluídos: {len(df_excluidos)} registros")
-            print(f"Colunas: {', '.join(df_excluidos.columns)}")
-            
-            # Verificar algumas datas para ver se foram normalizadas
-            if 'DATA DE EXCLUSÃO' in df_excluidos.columns:
-                dates_sample = df_excluidos['DATA DE EXCLUSÃO'].head(10).tolist()
-                print("\nAmostra de datas (primeiras 10):")
-                for i, date in enumerate(dates_sample, 1):
-                    print(f"  {i:2}. {date}")
\ No newline at end of file
+    failed = [item['source'] for item in items if checkpoint.get(item['source'], {}).get('status') != 'ok']
+    print(f"{len(items) - len(failed)} de {len(items)} documentos concluídos; checkpoint em {backfill.checkpoint_path}")
+    return 1 if failed else 0
+
+
+def command_match(args):
+    """Associa os itens de um catálogo CSV aos registros das listas"""
+    if args.lookup:
+        lookup = ReferenceLookup().load(args.lookup)
+    else:
+        # Arquivos combinados gravados por `run` no diretório indicado
+        frames = {}
+        for source in SOURCES.values():
+            for name, _, _, _ in source.combined:
+                path = os.path.join(args.dir, f'{name}.csv')
+                if os.path.exists(path):
+                    frames[name] = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        if not frames:
+            logging.error(f"Nenhum arquivo combinado encontrado em '{args.dir}'")
+            return 1
+        lookup = ReferenceLookup(frames)
+    
+    catalog = pd.read_csv(args.catalog, dtype=str, keep_default_na=False, sep=args.sep, encoding='utf-8-sig')
+    missing = [column for column in (args.farmaco_column,) if column not in catalog.columns]
+    if missing:
+        logging.error(f"Coluna {', '.join(missing)} ausente em '{args.catalog}'")
+        return 1
+    
+    matcher = CatalogMatcher(lookup, min_score=args.min_score)
+    result = matcher.match_frame(catalog, args.farmaco_column, args.concentracao_column, args.forma_column,
+                                 workers=args.workers)
+    output = args.output or f"{os.path.splitext(args.catalog)[0]}_referencia.csv"
+    result.to_csv(output, index=False, encoding='utf-8-sig')
+    logging.info(f"Arquivo '{output}' salvo com {len(result)} itens")
+    return 0
+
+
+def summarize_directory(directory):
+    """Imprime o resumo a partir dos CSVs gravados em directory"""
+    def read(name):
+        path = os.path.join(directory, f'{name}.csv')
+        if not os.path.exists(path):
+            return None
+        return pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    
+    results = {name: df for name, df in ((name, read(name)) for name in LIST_NAMES) if df is not None}
+    combined = {name: df for name, df in ((name, read(name)) for source in SOURCES.values()
+                                          for name, _, _, _ in source.combined) if df is not None}
+    if not results and not combined:
+        logging.error(f"Nenhum arquivo gerado encontrado em '{directory}'")
+        return False
+    print_summary(results, combined)
+    return True
+
+
+def command_summary(args):
+    """Resume os arquivos gerados por uma execução anterior"""
+    return 0 if summarize_directory(args.dir) else 1
+
+
+def check_page_classifier(pdf_paths):
+    """Confere, página a página, que o PageClassifier só pula páginas sem linhas de tabela"""
+    scraper = ANVISAReferenceDrugsScraper(None)
+    classifier = PageClassifier()
+    passed = True
+    for path in pdf_paths:
+        skipped = 0
+        with scraper.open_pdf(path) as pdf:
+            for number, page in enumerate(pdf.pages, 1):
+                reason = classifier.skip_reason(page)
+                if reason is None:
+                    continue
+                skipped += 1
+                rows = scraper.extract_page_rows(page)
+                if rows:
+                    passed = False
+                    print(f"✗ {path}, página {number}: pulada ({reason}) mas tem {len(rows)} linhas")
+            print(f"{'✓' if passed else '✗'} {path}: {skipped} de {len(pdf.pages)} páginas puladas")
+    return passed
+
+
+def command_selftest(args):
+    """Testa a normalização de datas (e, opcionalmente, mede a detecção de cabeçalho)"""
+    passed = test_date_normalization()
+    if args.pages:
+        print()
+        passed = check_page_classifier(args.pages) and passed
+    if args.benchmark:
+        print()
+        benchmark_header_detection()
+    return 0 if passed else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='webscraping-anvisa.py',
+                                     description="Lista de medicamentos de referência da ANVISA")
+    subparsers = parser.add_subparsers(dest='command', metavar='comando')
+    
+    def add_source(subparser):
+        subparser.add_argument('--url', help='página da primeira fonte (padrão: a do registro)')
+        subparser.add_argument('--source', dest='sources', action='append', choices=list(SOURCES),
+                               help='processa só esta fonte (pode ser repetido; padrão: todas as registradas)')
+        subparser.add_argument('--cache-dir', default='.anvisa_cache', help='diretório dos caches (padrão: .anvisa_cache)')
+        subparser.add_argument('--no-cache', action='store_true', help='não usa os caches HTTP e de páginas')
+        subparser.add_argument('--retries', type=int, default=4, help='novas tentativas por download (padrão: 4)')
+        subparser.add_argument('--rate-limit', type=float, default=0.0,
+                               help='intervalo mínimo em segundos entre requisições ao mesmo host')
+    
+    def add_extraction(subparser, workers):
+        subparser.add_argument('--workers', type=int, default=workers,
+                               help='processos de extração (0 = um por núcleo)')
+        subparser.add_argument('--engine', choices=['extract_table', 'template'], default='extract_table',
+                               help='motor de extração das páginas (padrão: extract_table)')
+        subparser.add_argument('--formats', type=output_formats, default=['csv'],
+                               help=f"formatos de saída separados por vírgula: {', '.join(OUTPUT_FORMATS)}")
+    
+    links = subparsers.add_parser('links', help='mostra os links dos PDFs encontrados na página')
+    add_source(links)
+    links.add_argument('--json', action='store_true', help='saída em JSON')
+    links.set_defaults(handler=command_links)
+    
+    fetch = subparsers.add_parser('fetch', help='baixa os PDFs das listas')
+    add_source(fetch)
+    fetch.add_argument('--output-dir', default='.', help='diretório dos PDFs (padrão: atual)')
+    fetch.add_argument('--list', dest='lists', action='append', choices=LIST_NAMES,
+                       help='baixa só esta lista (pode ser repetido)')
+    fetch.set_defaults(handler=command_fetch)
+    
+    extract = subparsers.add_parser('extract', help='extrai a tabela de um PDF local')
+    extract.add_argument('--pdf', required=True, help='arquivo PDF de uma das listas')
+    extract.add_argument('--output', help='arquivo de saída sem extensão (padrão: nome do PDF)')
+    extract.add_argument('--list', choices=LIST_NAMES, help='lista registrada do PDF (padrão: pelo nome do arquivo)')
+    add_extraction(extract, 1)
+    extract.set_defaults(handler=command_extract)
+    
+    run = subparsers.add_parser('run', help='executa o pipeline completo (padrão)')
+    add_source(run)
+    add_extraction(run, 0)
+    run.add_argument('--streaming', action='store_true', help='memória limitada: PDFs em arquivo e linhas direto no CSV')
+    run.add_argument('--diff-dir', default='alteracoes', help="changesets entre execuções ('' desativa)")
+    run.add_argument('--sqlite', help='banco SQLite atualizado a cada execução')
+    run.add_argument('--lookup', help='snapshot JSON do índice de consultas')
+    run.add_argument('--metrics-json', help='relatório de medidas em JSON')
+    run.add_argument('--metrics-textfile', help='métricas no formato textfile do Prometheus')
+    run.add_argument('--watch', action='store_true', help='modo contínuo: executa só quando uma lista muda')
+    run.add_argument('--interval', type=float, default=3600, help='segundos entre consultas no modo contínuo')
+    run.add_argument('--health-port', type=int, default=8787, help='porta do /health em 127.0.0.1 no modo contínuo')
+    run.set_defaults(handler=command_run)
+    
+    backfill = subparsers.add_parser('backfill', help='processa versões históricas das listas')
+    inputs = backfill.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('--manifest', help='arquivo com uma URL ou caminho por linha (lista e data opcionais)')
+    inputs.add_argument('--dir', help='diretório local de PDFs')
+    backfill.add_argument('--output-dir', default='backfill', help='saídas e checkpoint (padrão: backfill)')
+    add_extraction(backfill, 0)
+    backfill.set_defaults(handler=command_backfill)
+    
+    match = subparsers.add_parser('match', help='associa os itens de um catálogo CSV aos registros das listas')
+    match.add_argument('--catalog', required=True, help='CSV do catálogo')
+    references = match.add_mutually_exclusive_group()
+    references.add_argument('--lookup', help='snapshot do índice de consultas gravado por run --lookup')
+    references.add_argument('--dir', default='.', help='diretório dos CSVs combinados (padrão: atual)')
+    match.add_argument('--output', help='CSV de saída (padrão: <catálogo>_referencia.csv)')
+    match.add_argument('--sep', default=',', help='separador do CSV do catálogo (padrão: vírgula)')
+    match.add_argument('--farmaco-column', default='FÁRMACO', help='coluna do fármaco no catálogo')
+    match.add_argument('--concentracao-column', default='CONCENTRAÇÃO', help='coluna da concentração no catálogo')
+    match.add_argument('--forma-column', default='FORMA FARMACÊUTICA', help='coluna da forma farmacêutica no catálogo')
+    match.add_argument('--min-score', type=float, default=0.8, help='pontuação mínima para associar (padrão: 0,8)')
+    match.add_argument('--workers', type=int, default=0, help='processos de associação (0 = um por núcleo)')
+    match.set_defaults(handler=command_match)
+    
+    summary = subparsers.add_parser('summary', help='resume os arquivos gerados por uma execução')
+    summary.add_argument('--dir', default='.', help='diretório dos CSVs (padrão: atual)')
+    summary.set_defaults(handler=command_summary)
+    
+    selftest = subparsers.add_parser('selftest', help='testa a normalização de datas')
+    selftest.add_argument('--benchmark', action='store_true', help='mede também a detecção de cabeçalho')
+    selftest.add_argument('--pages', nargs='+', metavar='PDF',
+                          help='confere que as páginas puladas destes PDFs não têm linhas de tabela')
+    selftest.set_defaults(handler=command_selftest)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Sem subcomando (ou só com opções, ex.: --watch) vale `run`, como nas versões anteriores
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'workers', 1) == 0:
+        args.workers = None
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())